@@ -0,0 +1,65 @@
+"""
+Writes the manifest of a blacklist file, which the scheduler, the scrapers and the processors load the blacklist
+through, so all of them filter with the same, verified list.
+
+Usage (from the Blacklist directory):
+
+    python create_manifest.py blacklist_<version>.txt --version <version>
+
+The blacklist file contains the hex digests of the MD5 hashes of the blacklisted URLs and first level domains,
+separated by spaces. The manifest (`manifest.json`, next to the file) records the version of the list, the name of the
+file, the number of hashes and the SHA-256 checksum of the file, which is verified whenever the list is loaded.
+
+"""
+import hashlib
+import json
+import os
+import sys
+from argparse import ArgumentParser
+
+# name of the manifest, in the directory of the blacklist file
+MANIFEST_FILE_NAME = "manifest.json"
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Writes the manifest of a blacklist file.")
+    parser.add_argument("blacklist_file", help="File containing the MD5 hashes separated by spaces")
+    parser.add_argument("--version", required=True, help="Version of the blacklist, e.g. the date it was created")
+    args = parser.parse_args()
+
+    try:
+        with open(args.blacklist_file, "rb") as file:
+            file_contents = file.read()
+    except OSError as e:
+        print(f"Couldn't read blacklist file: {e}", file=sys.stderr)
+        return 2
+
+    elements = set(file_contents.decode("ascii").split())
+    if len(elements) == 0:
+        print("The blacklist file contents is empty!", file=sys.stderr)
+        return 2
+
+    if len(invalid := [element for element in elements if len(element) != 32]) > 0:
+        print(f"{len(invalid)} elements aren't MD5 hashes, e.g. '{invalid[0]}'!", file=sys.stderr)
+        return 2
+
+    manifest = {
+        "version": args.version,
+        "file": os.path.basename(args.blacklist_file),
+        "hash_algorithm": "md5",
+        "entries": len(elements),
+        "sha256": hashlib.sha256(file_contents).hexdigest()
+    }
+
+    manifest_path = os.path.join(os.path.dirname(os.path.abspath(args.blacklist_file)), MANIFEST_FILE_NAME)
+    with open(manifest_path, "w", encoding="UTF-8") as file:
+        json.dump(manifest, file, indent=4)
+        file.write("\n")
+
+    print(f"Manifest of version '{args.version}' written to '{manifest_path}' ({len(elements)} hashes).")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,9 +6,41 @@ CREATE TABLE pages (
     meta_tags json,
     parent_url text,
     new_url bool NOT NULL,
-    date_added timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL
+    date_added timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL,
+    etag text,
+    last_modified text,
+    content_hash varchar(64),
+    text_hash varchar(64),
+    -- host of the page (without the port and the credentials), the way the scrapers identify the hosts
+    host text GENERATED ALWAYS AS (lower(substring(url, '^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]+)'))) STORED
 );
 
+CREATE INDEX pages_text_hash ON pages (text_hash);
+
+-- the pages of a host: the scheduler skips the pages of the hosts which are down through it, and the processors count
+-- the pages of a host waiting to be scraped with it
+CREATE INDEX pages_host ON pages (host, new_url);
+
+-- the frontier of the scheduler: the new pages in the order of the hash of their URL (a random order which the
+-- scheduler samples from), and the scraped pages in the order they are due to be scraped again
+CREATE INDEX pages_new_url_sample ON pages (md5(url)) WHERE new_url;
+CREATE INDEX pages_stale ON pages (date_accessed, url) WHERE NOT new_url;
+
+CREATE TABLE hosts (
+    host text PRIMARY KEY,
+    down_until timestamp,
+    consecutive_failures integer DEFAULT 0 NOT NULL,
+    last_status_change timestamp,
+    discovered_urls integer DEFAULT 0 NOT NULL,
+    scraped_urls integer DEFAULT 0 NOT NULL,
+    new_content_pages integer DEFAULT 0 NOT NULL,
+    rejected_urls integer DEFAULT 0 NOT NULL,
+    throttled_schedules integer DEFAULT 0 NOT NULL,
+    counters_since timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL
+);
+
+CREATE INDEX hosts_down_until ON hosts (down_until);
+
 INSERT INTO pages (url, new_url) VALUES
 ('http://3bbad7fauom4d6sgppalyqddsqbf5u5p56b5k5uk2zxsy3d6ey2jobad.onion/discover', true),
 ('http://liberalhf5hjefibussfn2mvqauks7pkfrmsaaymnamx7rrcstsrdpyd.onion/', true),
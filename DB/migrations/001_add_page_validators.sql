@@ -0,0 +1,5 @@
+-- Validators used for conditional re-crawls: the ETag and Last-Modified headers of the last response and the SHA-256
+-- hash of its body. Needed for databases created with an init.sql older than these columns.
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS etag text;
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS last_modified text;
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS content_hash varchar(64);
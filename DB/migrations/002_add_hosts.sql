@@ -0,0 +1,10 @@
+-- Onion hosts the scrapers found to be down; the scheduler doesn't schedule their pages until down_until.
+-- Needed for databases created with an init.sql older than this table.
+CREATE TABLE IF NOT EXISTS hosts (
+    host text PRIMARY KEY,
+    down_until timestamp,
+    consecutive_failures integer DEFAULT 0 NOT NULL,
+    last_status_change timestamp
+);
+
+CREATE INDEX IF NOT EXISTS hosts_down_until ON hosts (down_until);
@@ -0,0 +1,12 @@
+-- Counters of the hosts the processors base the crawler-trap detection and the per-host budgets on, and the SHA-256
+-- hash of the extracted text of the pages, for telling whether a page brought new content.
+-- Needed for databases created with an init.sql older than these columns.
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS text_hash varchar(64);
+
+CREATE INDEX IF NOT EXISTS pages_text_hash ON pages (text_hash);
+
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS discovered_urls integer DEFAULT 0 NOT NULL;
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS scraped_urls integer DEFAULT 0 NOT NULL;
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS new_content_pages integer DEFAULT 0 NOT NULL;
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS rejected_urls integer DEFAULT 0 NOT NULL;
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS throttled_schedules integer DEFAULT 0 NOT NULL;
@@ -0,0 +1,8 @@
+-- Partial indexes the scheduler selects the pages to be scraped with, reading only as many pages as it schedules: the
+-- new pages in the order of the MD5 hash of their URL (a random order which the scheduler samples from), and the
+-- scraped pages in the order they are due to be scraped again.
+-- The indexes are built without locking the table, so the processors can keep saving pages in the meantime; run the
+-- script with psql outside of a transaction.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pages_new_url_sample ON pages (md5(url)) WHERE new_url;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pages_stale ON pages (date_accessed, url) WHERE NOT new_url;
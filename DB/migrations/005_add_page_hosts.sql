@@ -0,0 +1,8 @@
+-- Host of the pages, computed by the database from their URL, so the pages can be matched with the records of their
+-- hosts through an index instead of running a regular expression on the URL of every page read.
+-- Adding the column rewrites the table, which is locked in the meantime: stop the scheduler and the processors first.
+-- The index is built without locking the table; run the script with psql outside of a transaction.
+ALTER TABLE pages ADD COLUMN IF NOT EXISTS host text
+    GENERATED ALWAYS AS (lower(substring(url, '^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]+)'))) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS pages_host ON pages (host, new_url);
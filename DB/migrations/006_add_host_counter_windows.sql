@@ -0,0 +1,4 @@
+-- Start of the window of the counters the crawler-trap detection is based on (discovered, scraped and new-content
+-- pages); the processors reset the counters once the window is older than `host_counter_window` days. The existing
+-- counters start their window now.
+ALTER TABLE hosts ADD COLUMN IF NOT EXISTS counters_since timestamp DEFAULT CURRENT_TIMESTAMP NOT NULL;
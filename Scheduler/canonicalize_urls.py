@@ -0,0 +1,71 @@
+"""
+Rewrites the URLs of the pages saved before the URLs were canonicalized (see `src/utils/url_canonicalizer.py`) into
+their canonical form, merging the pages which turn out to be the same page.
+
+Usage (from the Scheduler directory, with the scheduler and the processors stopped):
+
+    python canonicalize_urls.py [--dry-run]
+
+Of the pages with the same canonical URL, the most recently scraped one is kept (or the one added first, if none of
+them was scraped) under the canonical URL, the rest are deleted. The parent URLs pointing to the renamed pages are
+rewritten as well. The rules are read from the `CANONICALIZATION` section of the config file, which has to be the same
+as the one of the scrapers. With `--dry-run`, only the statistics are printed and the database isn't changed.
+
+"""
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+
+from src.db.database import session_scope
+from src.db.db_operations import get_all_page_urls_is_database, merge_duplicate_pages
+from src.utils.logger import get_logger
+from src.utils.url_canonicalizer import get_url_canonicalizer
+
+# get logger
+logger = get_logger()
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Rewrites the URLs of the pages into their canonical form and merges the "
+                                        "duplicate pages.")
+    parser.add_argument("--dry-run", action="store_true", help="Only print the statistics, don't change the database")
+    args = parser.parse_args()
+
+    url_canonicalizer = get_url_canonicalizer()
+    started_at = time.monotonic()
+
+    with session_scope() as session:
+        if (urls := get_all_page_urls_is_database(session=session)) is None:
+            return 3
+
+        url_mapping = {url: canonical_url for url in urls
+                       if (canonical_url := url_canonicalizer.canonicalize(url=url)) != url}
+
+        # every canonical URL ends up as a single page, whether or not it was saved in its canonical form already
+        group_sizes = Counter(url_mapping.values())
+        for canonical_url in group_sizes:
+            if canonical_url in urls:
+                group_sizes[canonical_url] += 1
+
+        merged_groups = sum(1 for size in group_sizes.values() if size > 1)
+        duplicate_pages = sum(size - 1 for size in group_sizes.values())
+
+        logger.info(f"{len(urls)} pages scanned, {len(url_mapping)} URLs aren't canonical, {merged_groups} groups of "
+                    f"duplicate pages, {duplicate_pages} pages to be eliminated ({len(urls) - duplicate_pages} pages "
+                    f"left).")
+
+        if args.dry_run or len(url_mapping) == 0:
+            return 0
+
+        stats = merge_duplicate_pages(session=session, url_mapping=url_mapping)
+
+    logger.info(f"{stats['deleted_pages']} duplicate pages deleted, {stats['renamed_pages']} pages renamed, "
+                f"{stats['rewritten_parent_urls']} parent URLs rewritten, in {time.monotonic() - started_at:.1f} "
+                f"seconds.")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
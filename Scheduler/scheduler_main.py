@@ -4,9 +4,15 @@ import sys
 from src.db.database import session_scope
 from src.db.db_operations import get_page_urls_to_scrape
 from src.mq.MessageQueue import MessageQueue
+from src.mq.work_message import create_work_messages
+from src.utils.Blacklist import Blacklist, get_blacklist_manifest_location
 from src.utils.Sleeper import Sleeper
 from src.utils.signal_handler import get_signal_handler_method
-from src.utils.general import read_config_file, get_config_file_location, get_number_of_urls
+from src.utils.general import read_config_file, get_config_file_location, get_number_of_urls, get_config_value
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
 
 if __name__ == '__main__':
 
@@ -21,6 +27,23 @@ if __name__ == '__main__':
     signal.signal(signal.SIGINT, get_signal_handler_method(mq=message_queue))
     signal.signal(signal.SIGTERM, get_signal_handler_method(mq=message_queue))
 
+    # load the blacklist before anything is scheduled, so no blacklisted page is ever sent to the scrapers
+    blacklist = Blacklist(manifest_path=get_blacklist_manifest_location())
+
+    crawl_budget_params = read_config_file(config_file=get_config_file_location(), section="CRAWL_BUDGET")
+
+    # a single host can't take more than this many of the URLs of a run
+    max_urls_per_host = get_config_value(param_dict=crawl_budget_params, key="max_urls_per_host_per_run",
+                                         default_value=500, value_type=int)
+
+    # the pages of the frontier read in a run, for every URL scheduled
+    frontier_read_factor = get_config_value(param_dict=crawl_budget_params, key="frontier_read_factor",
+                                            default_value=4, value_type=int)
+
+    # the URLs of the same host can be packed into a message, so a scraper fetches them over the same warm connection
+    max_urls_per_message = get_config_value(param_dict=mq_params, key="max_urls_per_message", default_value=1,
+                                            value_type=int)
+
     # sleep if necessary
     Sleeper()(hours=1)
 
@@ -30,10 +53,22 @@ if __name__ == '__main__':
         # get all the urls that need to be scraped on this run
         if(list_of_urls_to_scrape := get_page_urls_to_scrape(session=session,
                                                              access_day_difference=30,
-                                                             number_of_urls=get_number_of_urls(8000))) is not None:
-            # send each url on their way through the MQ
-            for url in list_of_urls_to_scrape:
+                                                             number_of_urls=get_number_of_urls(8000),
+                                                             max_urls_per_host=max_urls_per_host,
+                                                             read_factor=frontier_read_factor)) is not None:
+            # blacklisted pages are neither fetched nor sent anywhere
+            pages_to_scrape = [(url, validators) for url, validators in list_of_urls_to_scrape
+                               if not blacklist.is_url_blacklisted(url=url)]
+
+            messages = create_work_messages(pages=pages_to_scrape, max_urls_per_message=max_urls_per_message)
+
+            # send each url on their way through the MQ, together with the validators of already scraped pages
+            for message in messages:
                 # if we cannot send a message, we stop the whole process -> most likely MQ is down
                 # we will retry on the next run
-                if not message_queue.send_message(data=url):
+                if not message_queue.send_message(data=message):
                     break
+
+            logger.info(f"{len(list_of_urls_to_scrape) - len(pages_to_scrape)} of {len(list_of_urls_to_scrape)} URLs "
+                        f"to be scraped are blacklisted, they weren't scheduled. {len(pages_to_scrape)} URLs are sent "
+                        f"in {len(messages)} messages.")
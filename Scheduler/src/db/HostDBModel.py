@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from sqlalchemy import Column, String, DateTime, Integer
+
+from src.db.database import Base
+
+
+class Host(Base):
+    __tablename__ = "hosts"
+
+    host = Column(String, primary_key=True, index=True, unique=True)
+    down_until = Column(DateTime, nullable=True, index=True)
+    consecutive_failures = Column(Integer, nullable=False, default=0)
+    last_status_change = Column(DateTime, nullable=True)
+    discovered_urls = Column(Integer, nullable=False, default=0)
+    scraped_urls = Column(Integer, nullable=False, default=0)
+    new_content_pages = Column(Integer, nullable=False, default=0)
+    rejected_urls = Column(Integer, nullable=False, default=0)
+    throttled_schedules = Column(Integer, nullable=False, default=0)
+    # start of the window of the counters of the crawler-trap detection (see `add_host_counters`)
+    counters_since = Column(DateTime, nullable=False, default=datetime.now)
+
+    def __repr__(self):
+        return f"<Host: host: {self.host}; down_until: {self.down_until}; " \
+               f"consecutive_failures: {self.consecutive_failures}; discovered_urls: {self.discovered_urls}; " \
+               f"scraped_urls: {self.scraped_urls}>"
@@ -1,9 +1,13 @@
 from typing import List
 
-from sqlalchemy import Column, String, DateTime, Boolean, Text, JSON
+from sqlalchemy import Column, String, DateTime, Boolean, Text, JSON, Computed
 
 from src.db.database import Base
 
+# regular expression capturing the host part of a URL (without the port and the credentials), matching the way the
+# scrapers identify the hosts
+HOST_PATTERN = r"^[a-zA-Z][a-zA-Z0-9+.-]*://(?:[^@/?#]*@)?([^:/?#]+)"
+
 
 class Page(Base):
     # although in the sql script it is defined the capital P, postgres creates it with lowercase P
@@ -17,6 +21,12 @@ class Page(Base):
     parent_url = Column(String, nullable=True, index=True)
     new_url = Column(Boolean, nullable=False)
     date_added = Column(DateTime, nullable=True, index=True)
+    etag = Column(Text, nullable=True)
+    last_modified = Column(Text, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    text_hash = Column(String(64), nullable=True, index=True)
+    # computed by the database from the url, so the pages can be matched with their hosts through an index
+    host = Column(Text, Computed(f"lower(substring(url, '{HOST_PATTERN}'))", persisted=True), nullable=True)
 
     def __repr__(self):
         return f"<Page: url: {self.url}; date_added: {self.date_added}; " \
@@ -1,25 +1,55 @@
-from random import shuffle
+import hashlib
+from itertools import islice
+from random import shuffle, choices, getrandbits
 from datetime import datetime, timedelta
-from typing import List, Optional, Dict, Set
+from typing import List, Optional, Dict, Set, Tuple, Iterator, Iterable, TypeVar
 
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, func, exists, text, tuple_, case
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
+from src.db.HostDBModel import Host
 from src.db.PageDBModel import Page
+from src.mq.work_message import PageValidators
+from src.utils.general import get_url_host
 from src.utils.logger import get_logger
 
 # get logger
 logger = get_logger()
 
+# type of the elements of the iterators interleaved by `interleave_randomly`
+T = TypeVar("T")
 
-def get_page_urls_to_scrape(session: Session, access_day_difference: int, number_of_urls: int) -> Optional[List[str]]:
+# counters of the hosts the crawler-trap detection is based on; they only cover a window of time
+WINDOWED_HOST_COUNTERS = ("discovered_urls", "scraped_urls", "new_content_pages")
+
+
+def get_page_urls_to_scrape(session: Session, access_day_difference: int, number_of_urls: int,
+                            max_urls_per_host: int = 0, read_factor: int = 4, batch_size: int = 1000) \
+        -> Optional[List[Tuple[str, PageValidators]]]:
     """
-    Function which returns the list of urls for which scraping has to be done.
+    Function which returns the list of urls for which scraping has to be done, together with the validators of the
+    pages, so the scrapers can tell whether the pages changed since they were last scraped. The pages of the hosts the
+    scrapers found to be down are skipped until the hosts are due to be checked again.
+
+    The pages are selected by the database, reading only as many of them as needed (see `iterate_new_pages` and
+    `iterate_stale_pages`), so the size of the frontier affects neither the memory nor the run time of the scheduler.
+    The new pages and the pages due to be scraped again are mixed in proportion to their numbers (counted up to the
+    number of pages read in a run, see `interleave_randomly`): every page of the frontier has the same chance to be
+    scheduled, whether it is a new one or a stale one, and neither of them can crowd out the other.
+
+    A single host can't take more than `max_urls_per_host` of the URLs of a run, so a site full of generated URLs can't
+    use up the whole budget; the URLs left out are counted in the `throttled_schedules` counter of the host. At most
+    `read_factor` times `number_of_urls` pages are read, so the hosts over their budget can't make the scheduler read
+    the whole frontier; if that many pages don't yield enough URLs, fewer URLs are scheduled.
 
     :param session: Session object for database.
     :param access_day_difference: How long ago should have been updated to be reconsidered.
     :param number_of_urls: Number of URLs to be returned.
-    :return: List of URL strings for the pages that need to be scraped.
+    :param max_urls_per_host: Maximum number of URLs of the same host to be returned; 0 means no limit.
+    :param read_factor: Maximum number of pages read for every URL to be returned.
+    :param batch_size: Number of pages read from the database at once.
+    :return: List of tuples of the URL string and the validators for the pages that need to be scraped.
 
     """
     # check the number
@@ -31,40 +61,211 @@ def get_page_urls_to_scrape(session: Session, access_day_difference: int, number
     current_time = datetime.now()
     date_to_check_against = current_time - timedelta(days=access_day_difference)
 
+    # the host of the page is computed by the database from its url, matching the way the scrapers report the hosts
+    host_is_down = exists().where(
+        and_(
+            Host.host == Page.host,
+            Host.down_until > current_time
+        )
+    )
+
+    new_page_conditions = [Page.new_url, ~host_is_down]
+    # the pages which were never accessed don't satisfy the comparison, so they are left out of the stale pages
+    stale_page_conditions = [~Page.new_url, Page.date_accessed < date_to_check_against, ~host_is_down]
+
+    max_pages_read = number_of_urls * max(read_factor, 1)
+    batch_size = min(batch_size, max_pages_read)
+
     try:
-        pages = session.query(Page.url) \
-            .filter(
-            or_(
-                Page.new_url == "true",  # because it is a string in the database...
-                and_(
-                    Page.date_accessed is not None,
-                    Page.date_accessed < date_to_check_against
-                )
-            )
-        ) \
-            .order_by(
-            Page.date_added.asc()
-        ) \
-            .all()
+        # no more pages are read than this, so no more of them are counted either
+        sizes = [count_pages(session=session, conditions=conditions, limit=max_pages_read)
+                 for conditions in (new_page_conditions, stale_page_conditions)]
+
+        pages = interleave_randomly(iterators=[
+            iterate_new_pages(session=session, conditions=new_page_conditions, batch_size=batch_size),
+            iterate_stale_pages(session=session, conditions=stale_page_conditions, batch_size=batch_size)
+        ], sizes=sizes)
+
+        # the pages are read only until enough of them are selected, or the limit of the pages read is reached
+        list_of_pages, throttled = apply_host_budget(pages=islice(pages, max_pages_read), number_of_urls=number_of_urls,
+                                                     max_urls_per_host=max_urls_per_host)
     except Exception as e:
         logger.warning(f"Exception when querying new page urls: {e}")
         return None
 
-    # the elements in the "pages" list are of type Row(tuple), thus we need to extract the first element, the url
-    list_of_pages = [row[0] for row in pages] if len(pages) > 0 else []
-
-    # shuffle elements in the list
+    # the stale pages are read oldest first, they are mixed with the rest for the scrapers
     shuffle(list_of_pages)
 
-    # we enforce the limit here instead of limiting the query because after the designated day diff period we would
-    # only receive already scraped URLs, and we couldn't schedule new URLs
-    list_of_pages = list_of_pages[:number_of_urls]
+    if len(throttled) > 0:
+        most_throttled = ", ".join(f"{host}: {count}" for host, count in
+                                   sorted(throttled.items(), key=lambda item: item[1], reverse=True)[:10])
+        logger.info(f"URLs of {len(throttled)} hosts over their budget of {max_urls_per_host} URLs weren't scheduled "
+                    f"({sum(throttled.values())} URLs, most throttled hosts: {most_throttled}).")
+        add_host_counters(session=session, counters={host: {"throttled_schedules": count}
+                                                     for host, count in throttled.items()})
 
     logger.info(f"Number of URLs scheduled for this run: {len(list_of_pages)}")
 
     return list_of_pages
 
 
+def count_pages(session: Session, conditions: List, limit: int) -> int:
+    """
+    Function which counts the pages satisfying the conditions, but only up to a limit, so counting them doesn't cost
+    more than reading that many of them.
+
+    :param session: Session object for the database.
+    :param conditions: Conditions of the pages to be counted.
+    :param limit: Maximum number of pages counted.
+    :return: Number of pages, at most `limit`.
+
+    """
+
+    return session.query(func.count()) \
+        .select_from(session.query(Page.url).filter(*conditions).limit(limit).subquery()) \
+        .scalar()
+
+
+def iterate_new_pages(session: Session, conditions: List, batch_size: int) -> Iterator[Tuple[str, PageValidators]]:
+    """
+    Function which reads the pages which haven't been scraped yet in a random order, a batch at a time.
+
+    The pages are read in the order of the MD5 hash of their URL (`pages_new_url_sample` index), starting at a random
+    hash and wrapping around at the end, so every run starts somewhere else and the pages of a host are spread over the
+    whole order. Reading a batch only costs as much as the size of the batch, however many new pages there are.
+
+    :param session: Session object for the database.
+    :param conditions: Conditions of the new pages to be read.
+    :param batch_size: Number of pages read at once.
+    :return: Iterator of tuples of the URL string and the validators of the pages.
+
+    """
+
+    sample_key = func.md5(Page.url)
+    pivot = f"{getrandbits(128):032x}"
+
+    # the hashes after the pivot first, then the ones up to it
+    for lower_bound, upper_bound in ((pivot, None), (None, pivot)):
+        while True:
+            bounds = []
+            if lower_bound is not None:
+                bounds.append(sample_key > lower_bound)
+            if upper_bound is not None:
+                bounds.append(sample_key <= upper_bound)
+
+            rows = session.query(Page.url, Page.etag, Page.last_modified, Page.content_hash, sample_key) \
+                .filter(*conditions, *bounds) \
+                .order_by(sample_key) \
+                .limit(batch_size) \
+                .all()
+
+            yield from ((row[0], PageValidators(etag=row[1], last_modified=row[2], content_hash=row[3]))
+                        for row in rows)
+
+            if len(rows) < batch_size:
+                break
+
+            # keyset pagination: the next batch continues after the last hash read
+            lower_bound = rows[-1][4]
+
+
+def iterate_stale_pages(session: Session, conditions: List, batch_size: int) -> Iterator[Tuple[str, PageValidators]]:
+    """
+    Function which reads the scraped pages which are due to be scraped again, the ones accessed the longest ago first,
+    a batch at a time (`pages_stale` index).
+
+    :param session: Session object for the database.
+    :param conditions: Conditions of the stale pages to be read.
+    :param batch_size: Number of pages read at once.
+    :return: Iterator of tuples of the URL string and the validators of the pages.
+
+    """
+
+    last_key = None
+
+    while True:
+        bounds = [tuple_(Page.date_accessed, Page.url) > tuple_(*last_key)] if last_key is not None else []
+
+        rows = session.query(Page.url, Page.etag, Page.last_modified, Page.content_hash, Page.date_accessed) \
+            .filter(*conditions, *bounds) \
+            .order_by(Page.date_accessed.asc(), Page.url.asc()) \
+            .limit(batch_size) \
+            .all()
+
+        yield from ((row[0], PageValidators(etag=row[1], last_modified=row[2], content_hash=row[3])) for row in rows)
+
+        if len(rows) < batch_size:
+            return
+
+        # keyset pagination: the next batch continues after the last page read
+        last_key = rows[-1][4], rows[-1][0]
+
+
+def interleave_randomly(iterators: List[Iterator[T]], sizes: List[int]) -> Iterator[T]:
+    """
+    Function which takes the elements of several iterators, choosing the iterator of each element randomly, until all
+    of them are exhausted. Every iterator is only advanced when its next element is needed.
+
+    The chance of an iterator to be chosen is proportional to the number of its elements estimated to be left, as if
+    the elements were drawn from all the iterators together: an iterator with ten times as many elements gives ten
+    times as many of the first elements. An iterator yielding more elements than estimated is still chosen, with the
+    weight of a single element, until it is exhausted.
+
+    :param iterators: List of iterators.
+    :param sizes: Estimated number of elements of the iterators, in the same order.
+    :return: Iterator of the elements.
+
+    """
+
+    # the iterators with the number of their elements left
+    entries = [[iterator, size] for iterator, size in zip(iterators, sizes)]
+
+    while len(entries) > 0:
+        entry = choices(entries, weights=[max(size, 1) for _, size in entries])[0]
+        try:
+            yield next(entry[0])
+        except StopIteration:
+            entries.remove(entry)
+            continue
+
+        entry[1] -= 1
+
+
+def apply_host_budget(pages: Iterable[Tuple[str, PageValidators]], number_of_urls: int, max_urls_per_host: int) \
+        -> Tuple[List[Tuple[str, PageValidators]], Dict[str, int]]:
+    """
+    Function which selects the first URLs of a list, taking at most a given number of URLs of the same host. The pages
+    are only read until enough of them are selected.
+
+    :param pages: Iterable of tuples of the URL string and the validators of the pages, in the order they are selected.
+    :param number_of_urls: Number of URLs to be selected.
+    :param max_urls_per_host: Maximum number of URLs of the same host to be selected; 0 means no limit.
+    :return: Tuple of the selected pages and the number of URLs left out because of the limit, by host.
+
+    """
+
+    if max_urls_per_host < 1:
+        return list(islice(pages, number_of_urls)), {}
+
+    selected = []
+    selected_by_host: Dict[str, int] = {}
+    throttled: Dict[str, int] = {}
+
+    for page in pages:
+        if len(selected) >= number_of_urls:
+            break
+
+        host = get_url_host(url=page[0])
+        if (count := selected_by_host.get(host, 0)) >= max_urls_per_host:
+            throttled[host] = throttled.get(host, 0) + 1
+            continue
+
+        selected.append(page)
+        selected_by_host[host] = count + 1
+
+    return selected, throttled
+
+
 def get_all_page_urls_is_database(session: Session) -> Optional[Set[str]]:
     """
     Function which returns the set of page URLs present in the database.
@@ -102,6 +303,44 @@ def update_page(session: Session, existing_page: Page, new_page_data: Dict) -> O
     existing_page.meta_tags = new_page_data[keys[3]]        # key for meta tags
     existing_page.date_accessed = datetime.now()            # update with the current time
     existing_page.new_url = False                           # specify that this is no more a new url
+    existing_page.text_hash = get_text_hash(text=new_page_data[keys[2]])
+
+    # results of older scrapers don't contain validators
+    set_page_validators(page=existing_page, validators=PageValidators.from_dict(data=new_page_data))
+
+    # try to save and commit
+    try:
+        session.add(existing_page)
+        session.commit()
+    except Exception as e:
+        logger.warning(f"Exception while trying to update record in the database {e}")
+        return None
+
+    return existing_page
+
+
+def mark_page_unchanged(session: Session, existing_page: Page, validators: PageValidators) -> Optional[Page]:
+    """
+    Function which records that a page was scraped again, but it didn't change since the last time: only the access
+    date and the validators are updated.
+
+    :param session: Session object for the database.
+    :param existing_page: The existing Page data we want to update.
+    :param validators: Validators received with the unchanged page.
+    :return: The updated Page object if the update was successful, otherwise None.
+
+    """
+
+    existing_page.date_accessed = datetime.now()            # update with the current time
+    existing_page.new_url = False                           # specify that this is no more a new url
+
+    # a 304 response doesn't necessarily repeat every validator, the missing ones are kept
+    if validators.etag is not None:
+        existing_page.etag = validators.etag
+    if validators.last_modified is not None:
+        existing_page.last_modified = validators.last_modified
+    if validators.content_hash is not None:
+        existing_page.content_hash = validators.content_hash
 
     # try to save and commit
     try:
@@ -114,6 +353,51 @@ def update_page(session: Session, existing_page: Page, new_page_data: Dict) -> O
     return existing_page
 
 
+def set_page_validators(page: Page, validators: PageValidators):
+    """
+    Function which sets the validators of a page. The object is not saved.
+
+    :param page: The Page object to be updated.
+    :param validators: The validators of the page.
+
+    """
+
+    page.etag = validators.etag
+    page.last_modified = validators.last_modified
+    page.content_hash = validators.content_hash
+
+
+def update_host_status(session: Session, host: str, down_until: Optional[datetime], consecutive_failures: int) \
+        -> Optional[Host]:
+    """
+    Function which saves the status of a host reported by the scrapers, creating the record of the host if necessary.
+
+    :param session: Session object for the database.
+    :param host: The host ('domain.onion').
+    :param down_until: The time until which the host is considered down, None if it is up.
+    :param consecutive_failures: Number of requests to the host that failed in a row.
+    :return: The saved Host object if the update was successful, otherwise None.
+
+    """
+
+    if (existing_host := session.query(Host).filter(Host.host == host).first()) is None:
+        existing_host = Host(host=host)
+
+    existing_host.down_until = down_until
+    existing_host.consecutive_failures = consecutive_failures
+    existing_host.last_status_change = datetime.now()
+
+    # try to save and commit
+    try:
+        session.add(existing_host)
+        session.commit()
+    except Exception as e:
+        logger.warning(f"Exception while trying to save host status into the database {e}")
+        return None
+
+    return existing_host
+
+
 def get_existing_page(session: Session, url: str) -> Optional[Page]:
     """
     Function which returns a Page object from the database if it exists.
@@ -152,7 +436,10 @@ def add_page(session: Session, new_page_data: Dict, is_new_url: bool) -> Optiona
                     meta_tags=new_page_data[keys[3]],
                     parent_url=new_page_data["parent_url"] if "parent_url" in new_page_data else None,
                     new_url=is_new_url,
-                    date_added=datetime.now())
+                    date_added=datetime.now(),
+                    text_hash=get_text_hash(text=content))
+
+    set_page_validators(page=new_page, validators=PageValidators.from_dict(data=new_page_data))
 
     # try to save and commit
     try:
@@ -163,3 +450,154 @@ def add_page(session: Session, new_page_data: Dict, is_new_url: bool) -> Optiona
         return None
 
     return new_page
+
+
+def get_text_hash(text: Optional[str]) -> Optional[str]:
+    """
+    Function which hashes the extracted text of a page, for recognizing the pages with the same content under different
+    URLs.
+
+    :param text: Extracted text of the page.
+    :return: Hex digest of the SHA-256 hash of the text, or None if the page has no text.
+
+    """
+
+    if text is None or len(text) == 0:
+        return None
+
+    return hashlib.sha256(text.encode("UTF-8")).hexdigest()
+
+
+def is_text_hash_known(session: Session, text_hash: str, url: str) -> bool:
+    """
+    Function which checks whether a page other than the given one has the same text.
+
+    :param session: Session object for the database.
+    :param text_hash: Hash of the text of the page (see `get_text_hash`).
+    :param url: URL of the page.
+    :return: True if another page has the same text, otherwise False.
+
+    """
+
+    return session.query(exists().where(and_(Page.text_hash == text_hash, Page.url != url))).scalar()
+
+
+def get_hosts(session: Session, hosts: Set[str]) -> Dict[str, Host]:
+    """
+    Function which returns the Host objects of the given hosts which are present in the database.
+
+    :param session: Session object for the database.
+    :param hosts: Host names ('domain.onion').
+    :return: Dictionary of the Host objects by host name.
+
+    """
+
+    if len(hosts) == 0:
+        return {}
+
+    return {host.host: host for host in session.query(Host).filter(Host.host.in_(hosts)).all()}
+
+
+def add_host_counters(session: Session, counters: Dict[str, Dict[str, int]],
+                      reset_before: Optional[datetime] = None) -> bool:
+    """
+    Function which adds to the counters of hosts, creating the records of the hosts if necessary. The counters are
+    incremented in the database, so the processors can update the same host at the same time.
+
+    The counters the crawler-trap detection is based on (`WINDOWED_HOST_COUNTERS`) start again from zero once their
+    window started before `reset_before`, so a verdict on a host (e.g. a low content yield) is reconsidered on the pages
+    scraped since.
+
+    :param session: Session object for the database.
+    :param counters: Dictionary of the increments of the counters (by the names of the columns), by host name.
+    :param reset_before: The windowed counters started before this time are reset; None keeps them forever.
+    :return: True if the counters were saved, otherwise False.
+
+    """
+
+    columns = Host.__table__.c
+    current_time = datetime.now()
+
+    try:
+        # always in the same order, so two transactions can't wait for each other's rows
+        for host in sorted(counters):
+            if len(increments := counters[host]) == 0:
+                continue
+
+            statement = insert(Host).values(host=host, counters_since=current_time, **increments)
+            updates = {name: columns[name] + statement.excluded[name] for name in increments}
+
+            if reset_before is not None:
+                expired = columns.counters_since < reset_before
+                for name in WINDOWED_HOST_COUNTERS:
+                    updates[name] = case((expired, statement.excluded[name] if name in increments else 0),
+                                         else_=updates.get(name, columns[name]))
+                updates["counters_since"] = case((expired, current_time), else_=columns.counters_since)
+
+            statement = statement.on_conflict_do_update(index_elements=[Host.host], set_=updates)
+            session.execute(statement)
+
+        session.commit()
+    except Exception as e:
+        logger.warning(f"Exception while trying to save host counters into the database {e}")
+        session.rollback()
+        return False
+
+    return True
+
+
+def count_pending_pages(session: Session, hosts: Set[str], limit: int) -> Dict[str, int]:
+    """
+    Function which counts the pages of hosts which haven't been scraped yet, i.e. the pages of the hosts in the
+    frontier, through the `pages_host` index. Only up to `limit` pages are counted for a host.
+
+    :param session: Session object for the database.
+    :param hosts: Host names ('domain.onion').
+    :param limit: Maximum number of pages counted for a host.
+    :return: Dictionary of the number of pages, by host name.
+
+    """
+
+    return {host: count_pages(session=session, conditions=[Page.host == host, Page.new_url], limit=limit)
+            for host in hosts}
+
+
+def merge_duplicate_pages(session: Session, url_mapping: Dict[str, str], batch_size: int = 10000) -> Dict[str, int]:
+    """
+    Function which renames pages to their canonical URL, merging the pages which have the same canonical URL into one:
+    the most recently scraped one is kept (or the one added first, if none of them was scraped), the rest are deleted.
+    The parent URLs pointing to the renamed pages are rewritten as well. Everything happens in a single transaction.
+
+    :param session: Session object for the database.
+    :param url_mapping: Dictionary of the canonical URLs by the URLs of the pages which aren't canonical.
+    :param batch_size: Number of URLs sent to the database at once.
+    :return: Dictionary containing the number of deleted duplicate pages, renamed pages and rewritten parent URLs.
+
+    """
+
+    # the pages already saved with a canonical URL take part in the merge as well
+    rows = [{"url": url, "canonical_url": canonical_url} for url, canonical_url in url_mapping.items()]
+    rows.extend({"url": canonical_url, "canonical_url": canonical_url} for canonical_url in set(url_mapping.values()))
+
+    session.execute(text("CREATE TEMPORARY TABLE url_mapping (url text PRIMARY KEY, canonical_url text NOT NULL) "
+                         "ON COMMIT DROP"))
+    for batch_start in range(0, len(rows), batch_size):
+        session.execute(text("INSERT INTO url_mapping (url, canonical_url) VALUES (:url, :canonical_url)"),
+                        rows[batch_start:batch_start + batch_size])
+
+    session.execute(text("CREATE TEMPORARY TABLE surviving_pages ON COMMIT DROP AS "
+                         "SELECT DISTINCT ON (m.canonical_url) m.canonical_url, p.url "
+                         "FROM url_mapping m JOIN pages p ON p.url = m.url "
+                         "ORDER BY m.canonical_url, p.date_accessed DESC NULLS LAST, p.date_added ASC"))
+
+    deleted = session.execute(text("DELETE FROM pages p USING url_mapping m, surviving_pages s "
+                                   "WHERE p.url = m.url AND s.canonical_url = m.canonical_url AND p.url <> s.url")) \
+        .rowcount
+    renamed = session.execute(text("UPDATE pages p SET url = s.canonical_url FROM surviving_pages s "
+                                   "WHERE p.url = s.url AND s.url <> s.canonical_url")).rowcount
+    parents = session.execute(text("UPDATE pages p SET parent_url = m.canonical_url FROM url_mapping m "
+                                   "WHERE p.parent_url = m.url AND m.url <> m.canonical_url")).rowcount
+
+    session.commit()
+
+    return {"deleted_pages": deleted, "renamed_pages": renamed, "rewritten_parent_urls": parents}
@@ -5,6 +5,7 @@ from typing import Dict, Optional, List, Callable
 from pika import BlockingConnection, ConnectionParameters, BasicProperties
 from pika.spec import PERSISTENT_DELIVERY_MODE
 
+from src.mq.message_codec import MessageCodec
 from src.utils.enums import ProcessingResult
 from src.utils.general import dict_has_necessary_keys
 from src.utils.logger import get_logger
@@ -17,7 +18,7 @@ class MessageQueue:
     # keys to look for on the connection parameter dictionary
     __connection_keys = ["mq_host", "mq_port", "mq_worker_queue", "mq_processor_queue"]
 
-    def __init__(self, param_dict: Dict, function_to_execute: Optional[Callable[[str], ProcessingResult]]):
+    def __init__(self, param_dict: Dict, function_to_execute: Optional[Callable[[Dict], ProcessingResult]]):
         """
         Initializer method.
 
@@ -32,6 +33,9 @@ class MessageQueue:
         # save the function for later
         self.function_to_execute = function_to_execute
 
+        # codec used for decoding the results sent by the scrapers
+        self.message_codec = MessageCodec()
+
         # trying to establish connection to the MQ
         if not self._connect(param_dict=self.param_dict):
             logger.error(f"Couldn't connect to the MQ!")
@@ -155,7 +159,15 @@ class MessageQueue:
             # the "start_processing_worker_responses" method!!!
             if self.function_to_execute is not None:
                 # get the returned data
-                data = body.decode()
+                # both the compressed messages and the plain JSON ones sent by older scrapers are accepted
+                if (data := self.message_codec.decode(body=body,
+                                                      content_type=properties.content_type,
+                                                      content_encoding=properties.content_encoding,
+                                                      headers=properties.headers)) is None:
+                    # the data is faulty, we ack the message as we don't want it to occupy space in the queue
+                    logger.warning(f"Couldn't decode message of {len(body)} bytes!")
+                    ch.basic_ack(delivery_tag=method.delivery_tag)
+                    return
 
                 logger.info(f'Data received. Processing data...')
 
@@ -0,0 +1,259 @@
+import gzip
+import json
+import zlib
+from typing import Dict, Optional
+
+from src.utils.enums import MessageSerialization, MessageCompression
+from src.utils.logger import get_logger
+
+# msgpack and zstandard are optional; without them the messages are serialized with JSON and compressed with gzip
+try:
+    import msgpack
+
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import zstandard
+
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# get logger
+logger = get_logger()
+
+# version of the message envelope; increment it when the layout of the messages changes in an incompatible way
+# this file is shared between the Scraper and the Scheduler/Processor, keep the two copies in sync!
+ENVELOPE_VERSION = 1
+
+# name of the message header carrying the version of the envelope
+ENVELOPE_VERSION_HEADER = "x-envelope-version"
+
+# upper limit for the size of a decompressed message, so a corrupt or malicious message can't exhaust the memory
+MAX_DECOMPRESSED_SIZE = 256 * 1024 * 1024
+
+
+class EncodedMessage:
+    """
+    Class holding the body of an encoded message together with the properties it has to be published with.
+
+    """
+
+    def __init__(self, body: bytes, content_type: str, content_encoding: str, headers: Dict):
+        """
+        Initializer method.
+
+        :param body: Serialized and compressed body of the message.
+        :param content_type: Content type of the message, see `MessageSerialization`.
+        :param content_encoding: Content encoding of the message, see `MessageCompression`.
+        :param headers: Headers of the message, containing the version of the envelope.
+
+        """
+
+        self.body = body
+        self.content_type = content_type
+        self.content_encoding = content_encoding
+        self.headers = headers
+
+
+class MessageCodec:
+    """
+    Class which serializes and compresses the messages sent from the scrapers to the processors, and reverses the
+    process on the receiving side.
+
+    The format of a message is described by its AMQP properties: the content type tells the serialization, the content
+    encoding the compression, and the `x-envelope-version` header the version of the envelope. Messages without a
+    content type are the plain JSON messages sent before the envelope was introduced.
+
+    The instances are not thread-safe, as the zstd (de)compressor objects are reused between the messages.
+
+    """
+
+    def __init__(self,
+                 serialization: MessageSerialization = MessageSerialization.MSGPACK,
+                 compression: MessageCompression = MessageCompression.ZSTD,
+                 compression_level: int = 3):
+        """
+        Initializer method.
+
+        :param serialization: Format the outgoing messages are serialized with.
+        :param compression: Algorithm the outgoing messages are compressed with.
+        :param compression_level: Compression level of the outgoing messages; the useful range depends on the
+                                  algorithm (zstd: 1-22, gzip: 1-9).
+
+        """
+
+        if serialization == MessageSerialization.MSGPACK and not MSGPACK_AVAILABLE:
+            logger.warning(f"msgpack is not installed! Falling back to '{MessageSerialization.JSON.value}'.")
+            serialization = MessageSerialization.JSON
+
+        if compression == MessageCompression.ZSTD and not ZSTD_AVAILABLE:
+            logger.warning(f"zstandard is not installed! Falling back to '{MessageCompression.GZIP.value}'.")
+            compression = MessageCompression.GZIP
+
+        self.serialization = serialization
+        self.compression = compression
+        self.compression_level = compression_level
+
+        self._zstd_compressor = None
+        self._zstd_decompressor = None
+
+    def encode(self, data: Dict) -> Optional[EncodedMessage]:
+        """
+        Method which serializes and compresses a message.
+
+        :param data: Data dictionary to be encoded.
+        :return: EncodedMessage object or None if the data couldn't be encoded.
+
+        """
+
+        try:
+            if self.serialization == MessageSerialization.MSGPACK:
+                body = msgpack.packb(data, use_bin_type=True)
+            else:
+                body = json.dumps(data, ensure_ascii=False).encode('UTF-8')
+
+            if self.compression == MessageCompression.ZSTD:
+                if self._zstd_compressor is None:
+                    self._zstd_compressor = zstandard.ZstdCompressor(level=self.compression_level)
+                body = self._zstd_compressor.compress(body)
+            elif self.compression == MessageCompression.GZIP:
+                body = gzip.compress(body, compresslevel=self.compression_level)
+        except Exception as e:
+            logger.warning(f"Couldn't encode message: {e}")
+            return None
+
+        return EncodedMessage(body=body,
+                              content_type=self.serialization.value,
+                              content_encoding=self.compression.value,
+                              headers={ENVELOPE_VERSION_HEADER: ENVELOPE_VERSION})
+
+    def decode(self,
+               body: bytes,
+               content_type: Optional[str],
+               content_encoding: Optional[str],
+               headers: Optional[Dict]) -> Optional[Dict]:
+        """
+        Method which decompresses and deserializes a message, based on the properties it was published with.
+
+        :param body: Body of the message.
+        :param content_type: Content type of the message.
+        :param content_encoding: Content encoding of the message.
+        :param headers: Headers of the message.
+        :return: Data dictionary or None if the message couldn't be decoded.
+
+        """
+
+        # messages from before the envelope was introduced are plain JSON strings
+        if content_type is None:
+            return MessageCodec._load_json(body=body)
+
+        version = (headers or {}).get(ENVELOPE_VERSION_HEADER, ENVELOPE_VERSION)
+        if not isinstance(version, int) or version > ENVELOPE_VERSION:
+            logger.warning(f"Unsupported message envelope version: {version}!")
+            return None
+
+        try:
+            compression = MessageCompression(content_encoding or MessageCompression.IDENTITY.value)
+            serialization = MessageSerialization(content_type)
+        except ValueError:
+            logger.warning(f"Unsupported message format: '{content_type}' with encoding '{content_encoding}'!")
+            return None
+
+        try:
+            if compression == MessageCompression.ZSTD:
+                if self._zstd_decompressor is None:
+                    self._zstd_decompressor = zstandard.ZstdDecompressor()
+                body = self._zstd_decompressor.decompress(body, max_output_size=MAX_DECOMPRESSED_SIZE)
+            elif compression == MessageCompression.GZIP:
+                body = MessageCodec._gunzip(body=body)
+
+            if serialization == MessageSerialization.MSGPACK:
+                data = msgpack.unpackb(body, raw=False)
+            else:
+                return MessageCodec._load_json(body=body)
+        except Exception as e:
+            logger.warning(f"Couldn't decode message: {e}")
+            return None
+
+        if not isinstance(data, dict):
+            logger.warning("Decoded message is not a dictionary!")
+            return None
+
+        return data
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def from_names(serialization: str, compression: str, compression_level: int) -> 'MessageCodec':
+        """
+        Function which creates a codec from the names of the serialization format and compression algorithm, as they
+        appear in the configuration files (e.g. 'msgpack' and 'zstd'), falling back to JSON without compression for
+        unknown names.
+
+        :param serialization: Name of the serialization format.
+        :param compression: Name of the compression algorithm.
+        :param compression_level: Compression level of the outgoing messages.
+        :return: MessageCodec object.
+
+        """
+
+        try:
+            serialization_format = MessageSerialization[serialization.strip().upper()]
+        except KeyError:
+            logger.warning(f"Unknown message serialization '{serialization}'! Falling back to 'json'.")
+            serialization_format = MessageSerialization.JSON
+
+        try:
+            compression_algorithm = MessageCompression[compression.strip().upper()]
+        except KeyError:
+            logger.warning(f"Unknown message compression '{compression}'! Falling back to 'identity'.")
+            compression_algorithm = MessageCompression.IDENTITY
+
+        return MessageCodec(serialization=serialization_format,
+                            compression=compression_algorithm,
+                            compression_level=compression_level)
+
+    @staticmethod
+    def _load_json(body: bytes) -> Optional[Dict]:
+        """
+        Function which deserializes a JSON message.
+
+        :param body: Body of the message.
+        :return: Data dictionary or None if the message couldn't be deserialized.
+
+        """
+
+        try:
+            data = json.loads(body.decode('UTF-8'))
+        except Exception as e:
+            logger.warning(f"Couldn't convert received message to JSON: {e}")
+            return None
+
+        if not isinstance(data, dict):
+            logger.warning("Decoded message is not a dictionary!")
+            return None
+
+        return data
+
+    @staticmethod
+    def _gunzip(body: bytes) -> bytes:
+        """
+        Function which decompresses a gzip compressed message, enforcing the size limit of the decompressed messages.
+
+        :param body: Body of the message.
+        :return: Decompressed body.
+
+        """
+
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        decompressed = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+
+        if decompressor.unconsumed_tail:
+            raise ValueError(f"decompressed message exceeds {MAX_DECOMPRESSED_SIZE} bytes")
+
+        return decompressed
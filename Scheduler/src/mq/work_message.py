@@ -0,0 +1,190 @@
+import json
+from typing import Optional, Dict, Tuple, List
+from urllib.parse import urlsplit
+
+from src.utils.general import strip_quotes
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+# this file is shared between the Scraper and the Scheduler/Processor, keep the two copies in sync!
+
+# key of the list of pages in the messages containing several URLs of the same host
+BATCH_KEY = "pages"
+
+
+class PageValidators:
+    """
+    Class holding the validators of a page, which tell whether the page changed since it was last scraped: the ETag
+    and Last-Modified headers of the response, and the SHA-256 hash of the body of the response.
+
+    """
+
+    def __init__(self, etag: Optional[str] = None, last_modified: Optional[str] = None,
+                 content_hash: Optional[str] = None):
+        """
+        Initializer method.
+
+        :param etag: Value of the ETag header.
+        :param last_modified: Value of the Last-Modified header.
+        :param content_hash: Hex digest of the SHA-256 hash of the body of the response.
+
+        """
+
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+
+    def is_empty(self) -> bool:
+        """
+        Method which checks whether none of the validators are known.
+
+        :return: True if there are no validators, otherwise False.
+
+        """
+
+        return self.etag is None and self.last_modified is None and self.content_hash is None
+
+    def to_dict(self) -> Dict:
+        """
+        Method which converts the validators into a dictionary.
+
+        :return: Dictionary containing the validators.
+
+        """
+
+        return {"etag": self.etag, "last_modified": self.last_modified, "content_hash": self.content_hash}
+
+    @staticmethod
+    def from_dict(data: Dict) -> 'PageValidators':
+        """
+        Function which creates the validators from a dictionary, ignoring the missing and invalid values.
+
+        :param data: Dictionary containing the validators.
+        :return: PageValidators object.
+
+        """
+
+        values = [data.get(key) for key in ("etag", "last_modified", "content_hash")]
+
+        return PageValidators(*[value if isinstance(value, str) and len(value) > 0 else None for value in values])
+
+
+def create_work_message(url: str, validators: Optional[PageValidators]) -> str:
+    """
+    Function which creates the message sent to the scrapers for a URL.
+
+    URLs without validators are sent as plain strings, the way they always have been; the rest are sent as JSON
+    objects, so the scrapers can send conditional requests.
+
+    :param url: URL to be scraped.
+    :param validators: Validators of the page, if it has been scraped before.
+    :return: Message string.
+
+    """
+
+    if validators is None or validators.is_empty():
+        return url
+
+    return json.dumps({"url": url, **validators.to_dict()}, ensure_ascii=False)
+
+
+def create_batch_work_message(pages: List[Tuple[str, Optional[PageValidators]]]) -> str:
+    """
+    Function which creates the message sent to the scrapers for several URLs, which are scraped one after the other.
+    A single URL is sent the same way as by `create_work_message`.
+
+    :param pages: List of the URLs to be scraped and the validators of their pages (None if there are none).
+    :return: Message string.
+
+    """
+
+    if len(pages) == 1:
+        return create_work_message(url=pages[0][0], validators=pages[0][1])
+
+    return json.dumps({BATCH_KEY: [{"url": url, **validators.to_dict()}
+                                   if validators is not None and not validators.is_empty() else {"url": url}
+                                   for url, validators in pages]}, ensure_ascii=False)
+
+
+def create_work_messages(pages: List[Tuple[str, Optional[PageValidators]]], max_urls_per_message: int) -> List[str]:
+    """
+    Function which creates the messages sent to the scrapers for a list of URLs, packing up to `max_urls_per_message`
+    URLs of the same host into a message, so the scraper fetches them over the same warm connection and circuit.
+
+    The messages keep the order in which the hosts first appear in the list.
+
+    :param pages: List of the URLs to be scraped and the validators of their pages (None if there are none).
+    :param max_urls_per_message: Maximum number of URLs in a message; 1 or less sends every URL in its own message.
+    :return: List of the message strings.
+
+    """
+
+    if max_urls_per_message <= 1:
+        return [create_work_message(url=url, validators=validators) for url, validators in pages]
+
+    batches: Dict[str, List[Tuple[str, Optional[PageValidators]]]] = {}
+    messages = []
+
+    for url, validators in pages:
+        try:
+            host = urlsplit(url).hostname or ""
+        except ValueError:
+            host = ""
+
+        (batch := batches.setdefault(host, [])).append((url, validators))
+
+        # a full batch is sent right away, the next URLs of the host start a new one
+        if len(batch) >= max_urls_per_message:
+            messages.append(create_batch_work_message(pages=batch))
+            del batches[host]
+
+    messages.extend(create_batch_work_message(pages=batch) for batch in batches.values())
+
+    return messages
+
+
+def parse_work_message(body: bytes) -> List[Tuple[str, Optional[PageValidators]]]:
+    """
+    Function which parses a message sent to the scrapers: a plain URL, a JSON object with a URL and its validators, or
+    a JSON object with a list of those (see `create_batch_work_message`).
+
+    :param body: Body of the message.
+    :return: List of the URLs and the validators of their pages (None if there are none); empty if the message couldn't
+             be parsed.
+
+    """
+
+    try:
+        data = body.decode('UTF-8').strip()
+    except UnicodeDecodeError as e:
+        logger.warning(f"Couldn't decode work message: {e}")
+        return []
+
+    # plain URL
+    if not data.startswith("{"):
+        return [(strip_quotes(string=data), None)]
+
+    try:
+        message = json.loads(data)
+    except ValueError as e:
+        logger.warning(f"Couldn't parse work message '{data}': {e}")
+        return []
+
+    if not isinstance(message, dict):
+        logger.warning(f"Work message '{data}' doesn't contain a URL!")
+        return []
+
+    items = message.get(BATCH_KEY) if BATCH_KEY in message else [message]
+    if not isinstance(items, list) \
+            or not all(isinstance(item, dict) and isinstance(item.get("url"), str) for item in items):
+        logger.warning(f"Work message '{data}' doesn't contain a URL!")
+        return []
+
+    pages = []
+    for item in items:
+        validators = PageValidators.from_dict(data=item)
+        pages.append((item["url"], None if validators.is_empty() else validators))
+
+    return pages
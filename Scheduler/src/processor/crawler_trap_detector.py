@@ -0,0 +1,150 @@
+from collections import Counter
+from typing import Optional, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from src.db.HostDBModel import Host
+from src.utils.enums import CrawlerTrap
+from src.utils.general import get_url_host
+
+
+class CrawlerTrapDetector:
+    """
+    Class which decides whether a link found on a page is added to the pages to be scraped, so sites generating URLs
+    without end (calendars, session IDs in the URLs, endlessly paginated search results) can't flood the database and
+    take up the scheduling budget.
+
+    A link is refused if its URL looks generated: its path is too deep, the same segment repeats in it, or its query
+    has too many parameters or is too long. It is also refused if its host is over its budget: too many of its pages
+    are still waiting to be scraped, or the host turned out to be a trap, as too few of its scraped pages brought
+    content which isn't on any other page (e.g. the same page under ever new session IDs).
+
+    The pages waiting to be scraped are counted in the frontier, so the pages which failed to be scraped count as long
+    as they are still to be scraped, and the merged ones don't count anymore. The yield of the hosts is read from the
+    counters of the `hosts` table, which are shared by the processors and only cover a window of time (see
+    `add_host_counters`), so a host found to be a trap gets another chance later.
+
+    """
+
+    def __init__(self,
+                 max_path_depth: int,
+                 max_segment_repeats: int,
+                 max_query_params: int,
+                 max_query_length: int,
+                 max_pending_urls_per_host: int,
+                 min_new_content_ratio: float,
+                 min_scraped_urls: int):
+        """
+        Initializer method.
+
+        :param max_path_depth: Maximum number of segments of the path of a link; 0 means no limit.
+        :param max_segment_repeats: Maximum number of times the same segment may appear in the path of a link; 0 means
+                                    no limit.
+        :param max_query_params: Maximum number of parameters of the query of a link; 0 means no limit.
+        :param max_query_length: Maximum length of the query of a link; 0 means no limit.
+        :param max_pending_urls_per_host: Maximum number of discovered URLs of a host waiting to be scraped; 0 means no
+                                          limit.
+        :param min_new_content_ratio: Share of the scraped URLs of a host which have to bring new content, below which
+                                      the host is considered a trap.
+        :param min_scraped_urls: Number of scraped URLs of a host needed before it can be considered a trap.
+
+        """
+
+        self.max_path_depth = max(max_path_depth, 0)
+        self.max_segment_repeats = max(max_segment_repeats, 0)
+        self.max_query_params = max(max_query_params, 0)
+        self.max_query_length = max(max_query_length, 0)
+        self.max_pending_urls_per_host = max(max_pending_urls_per_host, 0)
+        self.min_new_content_ratio = min(max(min_new_content_ratio, 0.0), 1.0)
+        self.min_scraped_urls = max(min_scraped_urls, 1)
+
+    def filter_links(self, links: List[str], hosts: Dict[str, Host], pending_urls: Dict[str, int]) \
+            -> Tuple[List[str], Dict[str, Counter]]:
+        """
+        Method which selects the new links of a page which can be added to the pages to be scraped.
+
+        :param links: New links of the page (the ones not in the database yet).
+        :param hosts: Host objects of the hosts of the links, by host name; hosts without an object have no counters
+                      yet.
+        :param pending_urls: Number of pages of the hosts of the links waiting to be scraped, by host name.
+        :return: Tuple of the admitted links and the reasons of the refused links (with the number of links refused for
+                 each) by host.
+
+        """
+
+        admitted_links = []
+        admitted: Dict[str, int] = {}
+        rejected: Dict[str, Counter] = {}
+
+        for link in links:
+            host = get_url_host(url=link)
+
+            if (trap := self.check_url(url=link)) is None:
+                trap = self.check_host(host=hosts.get(host), pending_urls=pending_urls.get(host, 0),
+                                       admitted=admitted.get(host, 0))
+
+            if trap is not None:
+                rejected.setdefault(host, Counter())[trap] += 1
+                continue
+
+            admitted_links.append(link)
+            admitted[host] = admitted.get(host, 0) + 1
+
+        return admitted_links, rejected
+
+    def check_url(self, url: str) -> Optional[CrawlerTrap]:
+        """
+        Method which checks whether a URL looks generated by a crawler trap.
+
+        :param url: URL to be checked.
+        :return: The reason the URL is refused, or None if it looks fine.
+
+        """
+
+        try:
+            split_url = urlsplit(url)
+        except ValueError:
+            # invalid URLs are not the business of this check
+            return None
+
+        segments = [segment for segment in split_url.path.split("/") if len(segment) > 0]
+
+        if 0 < self.max_path_depth < len(segments):
+            return CrawlerTrap.PATH_DEPTH
+
+        # e.g. relative links resolved against the wrong base again and again: /a/b/a/b/a/b/
+        if self.max_segment_repeats > 0 and len(segments) > self.max_segment_repeats \
+                and Counter(segments).most_common(1)[0][1] > self.max_segment_repeats:
+            return CrawlerTrap.REPEATING_SEGMENTS
+
+        if 0 < self.max_query_length < len(split_url.query):
+            return CrawlerTrap.QUERY_EXPLOSION
+
+        if self.max_query_params > 0 and len(split_url.query) > 0 \
+                and split_url.query.count("&") + split_url.query.count(";") + 1 > self.max_query_params:
+            return CrawlerTrap.QUERY_EXPLOSION
+
+        return None
+
+    def check_host(self, host: Optional[Host], pending_urls: int = 0, admitted: int = 0) -> Optional[CrawlerTrap]:
+        """
+        Method which checks whether a host can take another new URL.
+
+        :param host: Host object of the host, or None if the host has no counters yet.
+        :param pending_urls: Number of pages of the host waiting to be scraped.
+        :param admitted: Number of URLs of the host already admitted since its pages were counted.
+        :return: The reason the URL is refused, or None if the host is within its budget.
+
+        """
+
+        if host is None:
+            scraped_urls, new_content_pages = 0, 0
+        else:
+            scraped_urls, new_content_pages = host.scraped_urls or 0, host.new_content_pages or 0
+
+        if 0 < self.max_pending_urls_per_host <= pending_urls + admitted:
+            return CrawlerTrap.HOST_BUDGET
+
+        if scraped_urls >= self.min_scraped_urls and new_content_pages < self.min_new_content_ratio * scraped_urls:
+            return CrawlerTrap.LOW_CONTENT_YIELD
+
+        return None
@@ -1,35 +1,79 @@
-import json
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict
 
 from src.db.PageDBModel import Page
 from src.db.database import session_scope
-from src.db.db_operations import update_page, get_existing_page, add_page
-from src.utils.Blacklist import Blacklist
-from src.utils.enums import ProcessingResult
-from src.utils.general import dict_has_necessary_keys, strip_quotes
+from src.db.db_operations import update_page, get_existing_page, add_page, mark_page_unchanged, update_host_status, \
+    get_text_hash, is_text_hash_known, get_hosts, add_host_counters, count_pending_pages
+from src.mq.work_message import PageValidators
+from src.processor.crawler_trap_detector import CrawlerTrapDetector
+from src.utils.Blacklist import Blacklist, get_blacklist_manifest_location
+from src.utils.enums import ProcessingResult, MessageType
+from src.utils.general import dict_has_necessary_keys, strip_quotes, read_config_file, get_config_file_location, \
+    get_config_value, get_url_host
 from src.utils.logger import get_logger
+from src.utils.url_canonicalizer import get_url_canonicalizer
 
 # get logger
 logger = get_logger()
 
+# the links are saved in their canonical form, so the different spellings of a page are saved and scraped only once;
+# newer scrapers already send them canonicalized with the same rules
+url_canonicalizer = get_url_canonicalizer()
+
+# read the parameters of the crawler-trap detection; if they are missing, the defaults are used
+crawl_budget_params = read_config_file(config_file=get_config_file_location(), section="CRAWL_BUDGET")
+
+# the links looking like the ones of crawler traps, and the links of the hosts over their budget, are not saved
+crawler_trap_detector = CrawlerTrapDetector(
+    max_path_depth=get_config_value(param_dict=crawl_budget_params, key="max_path_depth", default_value=12,
+                                    value_type=int),
+    max_segment_repeats=get_config_value(param_dict=crawl_budget_params, key="max_segment_repeats", default_value=2,
+                                         value_type=int),
+    max_query_params=get_config_value(param_dict=crawl_budget_params, key="max_query_params", default_value=8,
+                                      value_type=int),
+    max_query_length=get_config_value(param_dict=crawl_budget_params, key="max_query_length", default_value=256,
+                                      value_type=int),
+    max_pending_urls_per_host=get_config_value(param_dict=crawl_budget_params, key="max_pending_urls_per_host",
+                                               default_value=2000, value_type=int),
+    min_new_content_ratio=get_config_value(param_dict=crawl_budget_params, key="min_new_content_ratio",
+                                           default_value=0.2, value_type=float),
+    min_scraped_urls=get_config_value(param_dict=crawl_budget_params, key="min_scraped_urls", default_value=20,
+                                      value_type=int))
+
+# the counters of the crawler-trap detection start again after this many days; 0 keeps them forever
+host_counter_window = get_config_value(param_dict=crawl_budget_params, key="host_counter_window", default_value=30,
+                                       value_type=int)
+
 # load the blacklist
-blacklist = Blacklist()
+blacklist = Blacklist(manifest_path=get_blacklist_manifest_location())
 
+# versions of the blacklist the scrapers filtered with which differ from the one of the processor, already reported
+reported_blacklist_versions = set()
 
-def process_scraped_result(received_data: str) -> ProcessingResult:
+
+def process_scraped_result(result_dictionary: Dict) -> ProcessingResult:
     """
     Function which processes a dictionary received from the scrapers through the MQ.
     This function is passed to the MessageQueue object at initialization.
 
-    :param received_data: Stringified dict received from the scraper.
+    :param result_dictionary: Dict received from the scraper, already decoded by the MessageQueue object.
     :return: Page object that was successfully saved into the database.
 
     """
 
-    try:
-        result_dictionary = json.loads(received_data)
-    except Exception as e:
-        logger.warning(f"Couldn't convert received string to JSON: {e}")
-        return ProcessingResult.PROCESSING_FAILED
+    # pages that didn't change since the last scraping only have their access date updated
+    if result_dictionary.get("message_type") == MessageType.UNCHANGED.value:
+        return process_unchanged_page(result_dictionary=result_dictionary)
+
+    # hosts that went down or came back up
+    if result_dictionary.get("message_type") == MessageType.HOST_STATUS.value:
+        return process_host_status(result_dictionary=result_dictionary)
+
+    # the pages of several URLs of the same host scraped one after the other
+    if result_dictionary.get("message_type") == MessageType.BATCH.value:
+        return process_batch(result_dictionary=result_dictionary)
 
     keys = Page.get_list_of_required_columns_for_update()
 
@@ -42,6 +86,14 @@ def process_scraped_result(received_data: str) -> ProcessingResult:
     # getting the url
     url = result_dictionary[keys[0]]
 
+    # the scraper already left out the blacklisted links with the list it was started with; they are checked again
+    # below anyway, a different version only means that the stages don't agree on the list
+    if (blacklist_version := result_dictionary.get("blacklist_version", blacklist.version)) != blacklist.version \
+            and blacklist_version not in reported_blacklist_versions:
+        logger.warning(f"Result filtered with blacklist version '{blacklist_version}' instead of "
+                       f"'{blacklist.version}' of the processor!")
+        reported_blacklist_versions.add(blacklist_version)
+
     # if the page url is blacklisted, don't save it
     if blacklist.is_url_blacklisted(url=url):
         logger.warning(f"URL: {url} is blacklisted! Skipping...")
@@ -51,45 +103,196 @@ def process_scraped_result(received_data: str) -> ProcessingResult:
     # getting the links
     links = result_dictionary[keys[4]]
 
+    # increments of the counters of the hosts of the page and of its links
+    host_counters = {}
+    text_hash = get_text_hash(text=result_dictionary[keys[2]])
+
     with session_scope() as session:
         try:
+            # the content is new if no other page has the same text
+            is_new_content = text_hash is not None and not is_text_hash_known(session=session, text_hash=text_hash,
+                                                                               url=url)
+
             # redundant check, the url should already be present in the database
             if (existing_page := get_existing_page(session=session, url=url)) is not None:
+                is_first_scraping = existing_page.new_url
                 update_page(session=session, existing_page=existing_page, new_page_data=result_dictionary)
 
             else:
+                is_first_scraping = True
+
                 # but if for some reason it isn't, we will add it, just to be sure
                 add_page(session=session, new_page_data=result_dictionary, is_new_url=False)
         except Exception as e:
             logger.error(f"Couldn't save page to database: {e}")
             return ProcessingResult.SAVE_FAILED
 
-        # go through all the links collected and create and save a new Page object into the database
+        # only the pages scraped for the first time count for the yield of their host
+        if is_first_scraping:
+            host_counters[get_url_host(url=url)] = {"scraped_urls": 1, "new_content_pages": int(is_new_content)}
+
+        # dictionaries keep the insertion order, and different spellings of a link from older scrapers become the same
+        new_links = {}
+
+        # go through all the links collected and keep the ones which are not in the database yet
         for link in links:
             # check if link is in the blacklist
             if blacklist.is_url_blacklisted(url=link):
                 logger.warning(f"Link: {link} is blacklisted! Skipping...")
                 continue
 
-            new_link = strip_quotes(string=link)
+            new_link = url_canonicalizer.canonicalize(url=strip_quotes(string=link))
+
+            # the blacklist has the URLs as they were found, so the canonical form is checked as well
+            if new_link != link and blacklist.is_url_blacklisted(url=new_link):
+                logger.warning(f"Link: {new_link} is blacklisted! Skipping...")
+                continue
 
             # check if link is already present in the database
             # this check is much faster than pulling out every page URL from the database and checking the link
             # against an entire list
-            if (_ := get_existing_page(session=session, url=new_link)) is None:
-
-                data_for_link = {
-                    keys[0]: new_link,                      # url
-                    keys[1]: None,                          # page title
-                    keys[2]: None,                          # page content
-                    keys[3]: None,                          # meta tags
-                    "parent_url": url                       # parent url
-                }
-
-                # adding new entry into the database for the new link
-                if (_ := add_page(session=session, new_page_data=data_for_link, is_new_url=True)) is None:
-                    # the only thing we do here is just printing about the issue
-                    # if this operation fails, we can fix the code and on the next run we will get the missed links
-                    logger.warning(f"Couldn't add Page object to database for new link: '{link}'!")
+            if new_link not in new_links and (_ := get_existing_page(session=session, url=new_link)) is None:
+                new_links[new_link] = None
+
+        # the links of crawler traps and of the hosts over their budget are left out; the pages waiting to be scraped
+        # are only counted as far as the budget goes
+        link_hosts = {get_url_host(url=link) for link in new_links}
+        hosts = get_hosts(session=session, hosts=link_hosts)
+        pending_urls = count_pending_pages(session=session, hosts=link_hosts,
+                                           limit=crawler_trap_detector.max_pending_urls_per_host) \
+            if crawler_trap_detector.max_pending_urls_per_host > 0 else {}
+        new_links, rejected = crawler_trap_detector.filter_links(links=list(new_links), hosts=hosts,
+                                                                 pending_urls=pending_urls)
+
+        if len(rejected) > 0:
+            reasons = sum(rejected.values(), Counter())
+            logger.info(f"{sum(reasons.values())} links of '{url}' refused: "
+                        f"{', '.join(f'{trap.value}: {count}' for trap, count in reasons.most_common())}.")
+
+        # create and save a new Page object into the database for the admitted links
+        for new_link in new_links:
+            data_for_link = {
+                keys[0]: new_link,                      # url
+                keys[1]: None,                          # page title
+                keys[2]: None,                          # page content
+                keys[3]: None,                          # meta tags
+                "parent_url": url                       # parent url
+            }
+
+            # adding new entry into the database for the new link
+            if (_ := add_page(session=session, new_page_data=data_for_link, is_new_url=True)) is None:
+                # the only thing we do here is just printing about the issue
+                # if this operation fails, we can fix the code and on the next run we will get the missed links
+                logger.warning(f"Couldn't add Page object to database for new link: '{new_link}'!")
+                continue
+
+            counters = host_counters.setdefault(get_url_host(url=new_link), {})
+            counters["discovered_urls"] = counters.get("discovered_urls", 0) + 1
+
+        for host, reasons in rejected.items():
+            host_counters.setdefault(host, {})["rejected_urls"] = sum(reasons.values())
+
+        # the budgets of the hosts are only approximate, a failure here doesn't fail the processing of the page
+        add_host_counters(session=session, counters=host_counters,
+                          reset_before=datetime.now() - timedelta(days=host_counter_window)
+                          if host_counter_window > 0 else None)
 
         return ProcessingResult.SUCCESS
+
+
+def process_batch(result_dictionary: Dict) -> ProcessingResult:
+    """
+    Function which processes the message of a batch of URLs: the messages of its pages are processed one by one, the
+    same way as if they had been sent separately, and the ones which fail don't affect the rest.
+
+    :param result_dictionary: Dict received from the scraper, containing the messages of the pages of the batch and the
+                              result of the URLs which didn't yield a page.
+    :return: ProcessingResult object; `SAVE_FAILED` if any of the pages couldn't be saved.
+
+    """
+
+    results = result_dictionary.get("results")
+    failed_urls = result_dictionary.get("failed_urls", {})
+
+    if not isinstance(results, list) or not isinstance(failed_urls, dict):
+        logger.error("Couldn't process batch message! Invalid fields!")
+        return ProcessingResult.PROCESSING_FAILED
+
+    processing_results = Counter()
+    for result in results:
+        # batches can't be nested
+        if not isinstance(result, dict) or result.get("message_type") == MessageType.BATCH.value:
+            logger.error(f"Couldn't process result of batch: '{result}'! Invalid message!")
+            processing_results[ProcessingResult.PROCESSING_FAILED] += 1
+            continue
+
+        processing_results[process_scraped_result(result_dictionary=result)] += 1
+
+    reasons = ", ".join(f"{name}: {count}" for name, count in Counter(failed_urls.values()).most_common())
+    logger.info(f"Batch of {len(results) + len(failed_urls)} URLs: "
+                f"{processing_results[ProcessingResult.SUCCESS]} pages processed, "
+                f"{processing_results[ProcessingResult.SAVE_FAILED]} couldn't be saved, "
+                f"{processing_results[ProcessingResult.PROCESSING_FAILED]} were invalid, "
+                f"{len(failed_urls)} URLs failed on the scraper{f' ({reasons})' if len(reasons) > 0 else ''}.")
+
+    # the invalid pages are already logged one by one, logging the whole batch again wouldn't help
+    if processing_results[ProcessingResult.SAVE_FAILED] > 0:
+        return ProcessingResult.SAVE_FAILED
+
+    return ProcessingResult.SUCCESS
+
+
+def process_unchanged_page(result_dictionary: Dict) -> ProcessingResult:
+    """
+    Function which processes the message of a page that didn't change since it was last scraped.
+
+    :param result_dictionary: Dict received from the scraper, containing the URL and the validators of the page.
+    :return: ProcessingResult object.
+
+    """
+
+    if not isinstance(url := result_dictionary.get("url"), str):
+        logger.error(f"Couldn't process unchanged page message: '{result_dictionary}'! Missing URL!")
+        return ProcessingResult.PROCESSING_FAILED
+
+    with session_scope() as session:
+        if (existing_page := get_existing_page(session=session, url=url)) is None:
+            # the page was deleted in the meantime, there is nothing to update
+            logger.warning(f"Unchanged page '{url}' is not in the database anymore!")
+            return ProcessingResult.SUCCESS
+
+        if mark_page_unchanged(session=session,
+                               existing_page=existing_page,
+                               validators=PageValidators.from_dict(data=result_dictionary)) is None:
+            return ProcessingResult.SAVE_FAILED
+
+    return ProcessingResult.SUCCESS
+
+
+def process_host_status(result_dictionary: Dict) -> ProcessingResult:
+    """
+    Function which processes the message of a host that went down or came back up.
+
+    :param result_dictionary: Dict received from the scraper, containing the host, the number of its failed requests
+                              in a row and the UNIX timestamp until which it is considered down (None if it is up).
+    :return: ProcessingResult object.
+
+    """
+
+    host = result_dictionary.get("host")
+    down_until = result_dictionary.get("down_until")
+    consecutive_failures = result_dictionary.get("consecutive_failures", 0)
+
+    if not isinstance(host, str) or not (down_until is None or isinstance(down_until, (int, float))) \
+            or not isinstance(consecutive_failures, int):
+        logger.error(f"Couldn't process host status message: '{result_dictionary}'! Invalid fields!")
+        return ProcessingResult.PROCESSING_FAILED
+
+    with session_scope() as session:
+        if update_host_status(session=session,
+                              host=host.lower(),
+                              down_until=datetime.fromtimestamp(down_until) if down_until is not None else None,
+                              consecutive_failures=consecutive_failures) is None:
+            return ProcessingResult.SAVE_FAILED
+
+    return ProcessingResult.SUCCESS
@@ -9,3 +9,51 @@ class ProcessingResult(int, Enum):
     SUCCESS = 0
     PROCESSING_FAILED = 1
     SAVE_FAILED = 2
+
+
+class MessageSerialization(str, Enum):
+    """
+    Class describing the formats the messages between the scrapers and the processors can be serialized with. The
+    values are the content types of the messages.
+
+    """
+
+    JSON = "application/json"
+    MSGPACK = "application/msgpack"
+
+
+class MessageCompression(str, Enum):
+    """
+    Class describing the algorithms the messages between the scrapers and the processors can be compressed with. The
+    values are the content encodings of the messages.
+
+    """
+
+    IDENTITY = "identity"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class MessageType(str, Enum):
+    """
+    Class describing the types of the messages sent from the scrapers to the processors.
+
+    """
+
+    PAGE = "page"
+    UNCHANGED = "unchanged"
+    HOST_STATUS = "host_status"
+    BATCH = "batch"
+
+
+class CrawlerTrap(str, Enum):
+    """
+    Class describing the reasons a link found on a page is not added to the pages to be scraped.
+
+    """
+
+    PATH_DEPTH = "path_depth"
+    REPEATING_SEGMENTS = "repeating_segments"
+    QUERY_EXPLOSION = "query_explosion"
+    LOW_CONTENT_YIELD = "low_content_yield"
+    HOST_BUDGET = "host_budget"
@@ -1,8 +1,9 @@
 import os
 import sys
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Any, Callable
 from argparse import ArgumentParser, Namespace
 from configparser import ConfigParser
+from urllib.parse import urlsplit
 
 import tld
 from environs import Env
@@ -138,6 +139,57 @@ def strip_url(url: str) -> str:
     return fld
 
 
+def get_url_host(url: str) -> str:
+    """
+    Function which returns the host of a URL, the same way the scrapers identify the hosts.
+
+    :param url: URL to get the host of.
+    :return: Lowercase host name of the URL, without the port and the credentials, or an empty string if it has none.
+
+    """
+
+    try:
+        return urlsplit(url).hostname or ""
+    except ValueError:
+        # e.g. an invalid IPv6 address
+        return ""
+
+
+def str_to_bool(string: str) -> bool:
+    """
+    Function which converts a string read from a configuration file to a boolean value.
+
+    :param string: String to be converted.
+    :return: True if the string represents a truthy value, otherwise False.
+
+    """
+
+    return string.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_config_value(param_dict: Optional[Dict], key: str, default_value: Any,
+                     value_type: Callable[[str], Any] = str) -> Any:
+    """
+    Function which returns a value from a dictionary of configuration parameters converted to the specified type.
+
+    :param param_dict: Dictionary containing the configuration parameters read from the config file.
+    :param key: Key of the configuration parameter.
+    :param default_value: The default value if the parameter is not present or cannot be converted.
+    :param value_type: Function used for converting the string value of the parameter.
+    :return: Value of the configuration parameter.
+
+    """
+
+    if param_dict is None or key not in param_dict or len(param_dict[key]) == 0:
+        return default_value
+
+    try:
+        return value_type(param_dict[key])
+    except Exception as e:
+        logger.warning(f"Couldn't convert configuration parameter '{key}': {e}. Using default value: {default_value}")
+        return default_value
+
+
 def get_environment_variable(variable: str, default_value: Any) -> Any:
     """
     Function which returns an environment variable.
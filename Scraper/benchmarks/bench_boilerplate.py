@@ -0,0 +1,73 @@
+"""
+Measures how much of the text of the pages of the corpus the boilerplate removal leaves out, and how long it takes.
+
+For every page, the size of the text without and with the boilerplate removal is reported, together with the number
+of blocks kept and the time the removal adds to the processing of the page. With `--show-removed`, the removed blocks
+are printed as well, for checking that no content is lost.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_boilerplate [--backend lxml|bs4] [--repeat N] [--show-removed]
+
+"""
+from argparse import ArgumentParser
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.html_parsers import get_parser_backend, parse_page
+from src.data_collection.page_extractor import get_page_extractor
+from src.utils.enums import BlockClass
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("--backend", default="lxml", help="Parser backend the pages are parsed with")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per page")
+    parser.add_argument("--show-removed", action="store_true", help="Print the text of the removed blocks")
+    args = parser.parse_args()
+
+    page_extractor = get_page_extractor()
+
+    backend = get_parser_backend(name=args.backend)
+
+    total_raw, total_kept, total_raw_time, total_time = 0, 0, 0.0, 0.0
+
+    print(f"{'page':<100} {'raw bytes':>10} {'kept bytes':>11} {'saved':>6} {'blocks':>11} {'added ms':>9}")
+    for url, content in load_corpus():
+        page_extractor.boilerplate_remover.enabled = False
+        raw_result = page_extractor.process_page_content(url=url, content=content, parser_backend=backend)
+        raw_time = time_function(lambda: page_extractor.process_page_content(url=url, content=content,
+                                                                             parser_backend=backend),
+                                 repeat=args.repeat)
+
+        page_extractor.boilerplate_remover.enabled = True
+        result = page_extractor.process_page_content(url=url, content=content, parser_backend=backend)
+        removal_time = time_function(lambda: page_extractor.process_page_content(url=url, content=content,
+                                                                                 parser_backend=backend),
+                                     repeat=args.repeat)
+
+        raw_size = len((raw_result["page_content"] or "").encode("UTF-8"))
+        kept_size = len((result["page_content"] or "").encode("UTF-8"))
+        total_raw += raw_size
+        total_kept += kept_size
+        total_raw_time += raw_time
+        total_time += removal_time
+
+        # the blocks are only available from the parsed page, the message contains the joined text only
+        blocks = parse_page(content=content, backend=backend, extract_text=True).body_blocks or []
+        block_classes = page_extractor.boilerplate_remover.classify_blocks(blocks=blocks)
+        kept_blocks = sum(1 for block_class in block_classes if block_class == BlockClass.CONTENT)
+
+        print(f"{url:<100} {raw_size:>10} {kept_size:>11} {1 - kept_size / max(raw_size, 1):>6.0%} "
+              f"{f'{kept_blocks}/{len(blocks)}':>11} {removal_time - raw_time:>9.1f}")
+
+        if args.show_removed:
+            for block, block_class in zip(blocks, block_classes):
+                if block_class != BlockClass.CONTENT:
+                    print(f"    - {block.text[:150]}")
+
+    print(f"{'total':<100} {total_raw:>10} {total_kept:>11} {1 - total_kept / max(total_raw, 1):>6.0%} "
+          f"{'':>11} {total_time - total_raw_time:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
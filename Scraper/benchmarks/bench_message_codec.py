@@ -0,0 +1,111 @@
+"""
+Measures the size and the encoding/decoding throughput of the messages sent to the processors, for every combination
+of serialization and compression, compared to the plain JSON messages sent before the `MessageCodec`.
+
+The messages are the results the scraper produces from the pages of the corpus.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_message_codec [--repeat N] [--level N]
+
+The exit code is 1 if any of the messages doesn't survive an encode-decode round trip.
+
+"""
+import json
+import sys
+from argparse import ArgumentParser
+from typing import Dict, List
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.page_extractor import get_page_extractor
+from src.mq.message_codec import MessageCodec, MSGPACK_AVAILABLE, ZSTD_AVAILABLE
+from src.utils.enums import MessageSerialization, MessageCompression, ParserBackend
+
+
+def legacy_encode(messages: List[Dict]) -> List[bytes]:
+    """
+    Function which encodes messages the way the scraper did before the `MessageCodec`.
+
+    :param messages: Data dictionaries to be encoded.
+    :return: List of encoded messages.
+
+    """
+
+    return [bytes(json.dumps(data, ensure_ascii=False).encode('UTF-8')) for data in messages]
+
+
+def legacy_decode(bodies: List[bytes]) -> List[Dict]:
+    """
+    Function which decodes messages the way the processor did before the `MessageCodec`.
+
+    :param bodies: Encoded messages.
+    :return: List of data dictionaries.
+
+    """
+
+    return [json.loads(body.decode()) for body in bodies]
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per codec")
+    parser.add_argument("--level", type=int, default=3, help="Compression level")
+    args = parser.parse_args()
+
+    page_extractor = get_page_extractor()
+
+    if not MSGPACK_AVAILABLE or not ZSTD_AVAILABLE:
+        print("msgpack and zstandard have to be installed for the benchmark!")
+        return 1
+
+    messages = []
+    for url, content in load_corpus():
+        if type(result := page_extractor.process_page_content(url=url, content=content,
+                                                              parser_backend=ParserBackend.LXML)) is dict:
+            messages.append(result)
+
+    legacy_bodies = legacy_encode(messages=messages)
+    legacy_size = sum(len(body) for body in legacy_bodies)
+    legacy_encode_time = time_function(lambda: legacy_encode(messages=messages), repeat=args.repeat)
+    legacy_decode_time = time_function(lambda: legacy_decode(bodies=legacy_bodies), repeat=args.repeat)
+
+    # the throughput is measured in the size of the uncompressed JSON messages, so the codecs are comparable
+    megabytes = legacy_size / 1024 / 1024
+
+    print(f"{len(messages)} messages, {legacy_size / 1024:.1f} KiB as plain JSON")
+    print(f"{'codec':<28} {'KiB':>9} {'ratio':>6} {'enc ms':>8} {'enc MiB/s':>10} {'dec ms':>8} {'dec MiB/s':>10}")
+    print(f"{'legacy json':<28} {legacy_size / 1024:>9.1f} {1.0:>6.2f} {legacy_encode_time:>8.2f} "
+          f"{megabytes / (legacy_encode_time / 1000):>10.1f} {legacy_decode_time:>8.2f} "
+          f"{megabytes / (legacy_decode_time / 1000):>10.1f}")
+
+    failed = False
+    for serialization in MessageSerialization:
+        for compression in MessageCompression:
+            codec = MessageCodec(serialization=serialization, compression=compression,
+                                 compression_level=args.level)
+
+            encoded = [codec.encode(data=data) for data in messages]
+            decoded = [codec.decode(body=message.body, content_type=message.content_type,
+                                    content_encoding=message.content_encoding, headers=message.headers)
+                       for message in encoded]
+
+            if decoded != messages:
+                failed = True
+                print(f"Round trip failed for {serialization.name.lower()}+{compression.name.lower()}!")
+
+            size = sum(len(message.body) for message in encoded)
+            encode_time = time_function(lambda: [codec.encode(data=data) for data in messages], repeat=args.repeat)
+            decode_time = time_function(lambda: [codec.decode(body=message.body, content_type=message.content_type,
+                                                              content_encoding=message.content_encoding,
+                                                              headers=message.headers)
+                                                 for message in encoded], repeat=args.repeat)
+
+            print(f"{serialization.name.lower() + '+' + compression.name.lower():<28} {size / 1024:>9.1f} "
+                  f"{legacy_size / size:>6.2f} {encode_time:>8.2f} {megabytes / (encode_time / 1000):>10.1f} "
+                  f"{decode_time:>8.2f} {megabytes / (decode_time / 1000):>10.1f}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
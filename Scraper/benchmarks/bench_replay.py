@@ -0,0 +1,405 @@
+"""
+Replays a corpus of onion-like pages through the real scraping pipeline without Tor, so the throughput of the scraper
+can be measured (and compared between changes) offline.
+
+A local fixture HTTP server plays the part of the proxy: it serves the recorded pages of the corpus and a few generated
+ones (a huge page, a link farm, deeply nested malformed HTML, a binary file and a missing page) under their onion URLs,
+with a configurable injected latency. The URLs are fed to the callback of the real `MessageQueue`, which runs against
+an in-process stand-in of the broker, so everything from parsing the work message to encoding and publishing the
+result is measured.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_replay [--messages N] [--latency MS] [--jitter MS] [--huge-size MIB]
+                                      [--extraction-workers N] [--verbose]
+
+Reported: pages/sec, the time spent in each stage of the pipeline (the stages are nested, the time of a stage includes
+the time of the stages below it) and the peak RSS of the process.
+
+With `--extraction-workers`, the pages are parsed in the extraction pool the way `main.py` sets it up, and the stand-in
+of the broker delivers up to twice as many messages as there are workers before waiting for an acknowledgement. The
+stages running in the pool can't be measured from the scraper process, only the ones before them.
+
+"""
+import logging
+import queue
+import random
+import resource
+import sys
+import threading
+import time
+from argparse import ArgumentParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from functools import partial
+from typing import Dict, List, Tuple, Callable, Optional
+
+from pika import BasicProperties
+
+import src.data_collection.page_extractor as page_extractor_module
+import src.data_collection.webscraper as webscraper
+import src.mq.message_queue as message_queue_module
+from benchmarks.corpus_utils import load_corpus
+from src.mq.message_queue import MessageQueue, get_deferred_queue_name
+from src.mq.work_message import PageValidators
+from src.utils.logger import get_logger
+
+# characters of the onion addresses
+BASE32_ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"
+
+# stages of the pipeline, in the order they are reported; the indentation shows which stage contains which
+STAGES = [("callback", 0), ("send_request", 1), ("read_response_content", 1), ("process_fetched_page", 1),
+          ("parse_page", 2), ("extract_relevant_content", 2), ("filter_links", 3), ("send_message", 1)]
+
+
+class FixturePage:
+    """
+    Class holding a page served by the fixture server.
+
+    """
+
+    def __init__(self, url: str, content: bytes, content_type: str = "text/html; charset=utf-8", status: int = 200):
+        self.url = url
+        self.content = content
+        self.content_type = content_type
+        self.status = status
+
+
+class FixtureServer:
+    """
+    Class which runs an HTTP server in a background thread, answering the proxy requests of the scraper (the request
+    line contains the whole URL) with the fixture pages, after the injected latency.
+
+    """
+
+    def __init__(self, pages: List[FixturePage], latency: float, jitter: float):
+        """
+        Initializer method.
+
+        :param pages: Pages to be served.
+        :param latency: Number of seconds every answer is delayed by.
+        :param jitter: Maximum number of seconds randomly added to the latency.
+
+        """
+
+        pages_by_url = {page.url: page for page in pages}
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, the same way Tor keeps the connections to the proxy open
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(latency + random.uniform(0, jitter))
+
+                if (page := pages_by_url.get(self.path)) is None:
+                    page = FixturePage(url=self.path, content=b"<html><body>Not found</body></html>", status=404)
+
+                self.send_response(page.status)
+                self.send_header("Content-Type", page.content_type)
+                self.send_header("Content-Length", str(len(page.content)))
+                self.end_headers()
+                self.wfile.write(page.content)
+
+            def log_message(self, format, *args):  # signature defined by BaseHTTPRequestHandler
+                pass
+
+        class Server(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                # the scraper aborts the download of oversized pages, which resets the connection
+                pass
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def proxy_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self) -> 'FixtureServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class FakeChannel:
+    """
+    Class standing in for the channel of the broker: it records the messages published, acknowledged and rejected.
+
+    """
+
+    def __init__(self):
+        self.is_open = True
+        self.published: List[Tuple[str, bytes]] = []
+        self.acks = 0
+        self.nacks = 0
+
+    def queue_declare(self, queue: str, durable: bool = False, arguments: Optional[Dict] = None):
+        pass
+
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes, properties: BasicProperties):
+        self.published.append((routing_key, body))
+
+    def basic_ack(self, delivery_tag: int):
+        self.acks += 1
+
+    def basic_nack(self, delivery_tag: int):
+        self.nacks += 1
+
+
+class FakeConnection:
+    """
+    Class standing in for the connection to the broker: the callbacks handed over from other threads are queued until
+    the replay loop runs them, the same way the connection runs them between two deliveries.
+
+    """
+
+    def __init__(self):
+        self.callbacks = queue.Queue()
+
+    def add_callback_threadsafe(self, callback: Callable):
+        self.callbacks.put(callback)
+
+    def run_callback(self):
+        self.callbacks.get()()
+
+
+class FakeMethod:
+    """
+    Class standing in for the delivery method of a message.
+
+    """
+
+    def __init__(self, delivery_tag: int):
+        self.delivery_tag = delivery_tag
+
+
+class ReplayMessageQueue(MessageQueue):
+    """
+    The real `MessageQueue`, connected to the stand-in of the broker instead of RabbitMQ.
+
+    """
+
+    def __init__(self, param_dict: Dict, function_to_execute: Callable, stage_timer: 'StageTimer',
+                 prefetch_count: int):
+        self.stage_timer = stage_timer
+        super().__init__(param_dict=param_dict, function_to_execute=function_to_execute, prefetch_count=prefetch_count)
+
+    def _connect(self, param_dict: Dict) -> bool:
+        self.connection = FakeConnection()
+        self.channel = FakeChannel()
+        return True
+
+    def _send_message(self, data: Dict) -> bool:
+        with self.stage_timer.measure(stage="send_message"):
+            return super()._send_message(data=data)
+
+
+class StageTimer:
+    """
+    Class which measures the time spent in the stages of the pipeline.
+
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def measure(self, stage: str) -> '_Measurement':
+        return _Measurement(stage_timer=self, stage=stage)
+
+    def wrap(self, target, name: str):
+        """
+        Method which replaces a function of a module (or a method of an object) with one measuring the time spent in
+        it. The functions of the scraper look each other up in the module (or the object) at call time, so the calls
+        between them are measured as well.
+
+        :param target: Module or object the function belongs to.
+        :param name: Name of the function.
+
+        """
+
+        function = getattr(target, name)
+
+        def timed_function(*args, **kwargs):
+            with self.measure(stage=name):
+                return function(*args, **kwargs)
+
+        setattr(target, name, timed_function)
+
+    def add(self, stage: str, seconds: float):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+
+class _Measurement:
+    def __init__(self, stage_timer: StageTimer, stage: str):
+        self.stage_timer = stage_timer
+        self.stage = stage
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stage_timer.add(stage=self.stage, seconds=time.perf_counter() - self.started_at)
+
+
+def generate_onion_url(path: str, rng: random.Random) -> str:
+    """
+    Function which generates a random v3 onion URL.
+
+    :param path: Path of the URL.
+    :param rng: Random number generator.
+    :return: URL string.
+
+    """
+
+    return f"http://{''.join(rng.choice(BASE32_ALPHABET) for _ in range(55))}d.onion{path}"
+
+
+def generate_pages(huge_size: int, rng: random.Random) -> List[FixturePage]:
+    """
+    Function which generates the pages which are hard on the scraper.
+
+    :param huge_size: Size of the huge page in bytes.
+    :param rng: Random number generator.
+    :return: List of the generated pages.
+
+    """
+
+    paragraph = b"<p>" + b"Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 20 + b"</p>\n"
+    huge_page = b"<html><head><title>Archive</title></head><body>" + paragraph * (huge_size // len(paragraph) + 1) + \
+        b"</body></html>"
+
+    links = "".join(f'<li><a href="{generate_onion_url(path="/", rng=rng)}">site {i}</a> '
+                    f'<a href="/page/{i}.html">local {i}</a> <img src="/img/{i}.png"></li>\n' for i in range(5000))
+    link_farm = f"<html><head><title>Links</title></head><body><ul>{links}</ul></body></html>".encode("UTF-8")
+
+    # unclosed and deeply nested tags, broken attributes and stray closing tags
+    malformed = ("<html><head><title>Broken<body>" + "<div class=\"a><span>text " * 3000 + "</td></tr>" * 50 +
+                 "<a href='/x'>end").encode("UTF-8")
+
+    return [
+        FixturePage(url=generate_onion_url(path="/archive/all.html", rng=rng), content=huge_page),
+        FixturePage(url=generate_onion_url(path="/links/", rng=rng), content=link_farm),
+        FixturePage(url=generate_onion_url(path="/broken", rng=rng), content=malformed),
+        FixturePage(url=generate_onion_url(path="/logo.png", rng=rng), content=bytes(rng.getrandbits(8)
+                                                                                     for _ in range(200 * 1024)),
+                    content_type="image/png"),
+        FixturePage(url=generate_onion_url(path="/gone", rng=rng), content=b"Not found", status=404)
+    ]
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200, help="Number of URLs fed to the scraper")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected latency of every answer in ms")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Maximum random latency added to every answer in ms")
+    parser.add_argument("--huge-size", type=float, default=8.0, help="Size of the huge page in MiB")
+    parser.add_argument("--extraction-workers", type=int, default=0,
+                        help="Number of processes the pages are parsed in; 0 parses them in the scraper process")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of the generated pages")
+    parser.add_argument("--verbose", action="store_true", help="Keep the INFO logs of the scraper")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        get_logger().setLevel(logging.WARNING)
+
+    rng = random.Random(args.seed)
+    pages = [FixturePage(url=url, content=content) for url, content in load_corpus()] + \
+        generate_pages(huge_size=int(args.huge_size * 1024 * 1024), rng=rng)
+
+    # the processes of the pool are started and have created their page extractor before the replay
+    if (extraction_pool := page_extractor_module.create_extraction_pool(workers=args.extraction_workers)) is not None:
+        for future in [extraction_pool.submit(page_extractor_module.process_fetched_page, pages[0].url,
+                                              pages[0].content, PageValidators(), None)
+                       for _ in range(args.extraction_workers * 2)]:
+            future.result()
+
+        function_to_execute = partial(webscraper.scrape_url_offloaded, extraction_pool)
+        prefetch_count = 2 * args.extraction_workers
+    else:
+        function_to_execute = webscraper.scrape_url
+        prefetch_count = 1
+
+    stage_timer = StageTimer()
+    for name in ("send_request", "read_response_content"):
+        stage_timer.wrap(target=webscraper, name=name)
+
+    # the stages of the extraction can only be measured if it runs in this process
+    if extraction_pool is None:
+        stage_timer.wrap(target=webscraper, name="process_fetched_page")
+        stage_timer.wrap(target=page_extractor_module, name="parse_page")
+        for name in ("extract_relevant_content", "filter_links"):
+            stage_timer.wrap(target=page_extractor_module.get_page_extractor(), name=name)
+
+    # the same page is requested over and over, the per-host limits would defer most of the requests
+    webscraper.host_rate_limiter.max_requests_per_host = 0
+    webscraper.host_rate_limiter.min_request_interval = 0.0
+
+    # there is no Tor to change the identity of
+    message_queue_module.change_tor_identity = lambda: True
+
+    with FixtureServer(pages=pages, latency=args.latency / 1000, jitter=args.jitter / 1000) as server:
+        webscraper.session_manager.proxy_provider = lambda host: {"http": server.proxy_url}
+
+        message_queue = ReplayMessageQueue(param_dict={"mq_host": "localhost", "mq_port": "5672",
+                                                       "mq_worker_queue": "worker_queue",
+                                                       "mq_processor_queue": "processor_queue"},
+                                           function_to_execute=function_to_execute,
+                                           stage_timer=stage_timer,
+                                           prefetch_count=prefetch_count)
+        callback = message_queue._on_message()
+        connection, channel = message_queue.connection, message_queue.channel
+
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        started_at = time.perf_counter()
+        for delivery_tag in range(args.messages):
+            # the broker doesn't deliver more unacknowledged messages than the prefetch count
+            while delivery_tag - channel.acks - channel.nacks >= prefetch_count:
+                connection.run_callback()
+
+            page = pages[delivery_tag % len(pages)]
+            with stage_timer.measure(stage="callback"):
+                callback(channel, FakeMethod(delivery_tag=delivery_tag), BasicProperties(), page.url.encode("UTF-8"))
+
+        # wait for the pages still being processed
+        while channel.acks + channel.nacks < args.messages:
+            connection.run_callback()
+        elapsed = time.perf_counter() - started_at
+
+    if extraction_pool is not None:
+        extraction_pool.shutdown()
+
+    # kilobytes on Linux; the children are the processes of the extraction pool
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_children_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+    # everything else goes to the processors: the results and the status changes of the hosts
+    deferred_queue = get_deferred_queue_name(worker_queue="mq_worker_queue")
+    results = [body for routing_key, body in channel.published if routing_key != deferred_queue]
+
+    print(f"{args.messages} messages over {len(pages)} pages, latency {args.latency:.0f}+{args.jitter:.0f} ms, "
+          f"{args.extraction_workers} extraction workers")
+    print(f"{args.messages / elapsed:.1f} pages/sec ({elapsed:.2f} s), {len(results)} results "
+          f"({sum(len(body) for body in results) / 1024:.1f} KiB), {len(channel.published) - len(results)} deferred, "
+          f"{channel.acks} acked, {channel.nacks} nacked")
+    print(f"peak RSS {peak_rss / 1024:.1f} MiB ({rss_before / 1024:.1f} MiB before the replay)" +
+          (f", {peak_children_rss / 1024:.1f} MiB in the largest extraction worker" if extraction_pool is not None
+           else ""))
+    print(f"{'stage':<30} {'calls':>7} {'total s':>9} {'avg ms':>9} {'share':>7}")
+    for stage, depth in STAGES:
+        if (calls := stage_timer.calls.get(stage, 0)) == 0:
+            continue
+        seconds = stage_timer.seconds[stage]
+        print(f"{'  ' * depth + stage:<30} {calls:>7} {seconds:>9.3f} {seconds / calls * 1000:>9.2f} "
+              f"{seconds / elapsed * 100:>6.1f}%")
+
+    return 0 if channel.nacks == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""
+Compares the fast text extractor, which walks the parsed tree of a page once, with html2text, which parses the title
+and the body a second time after they are serialized back to HTML, on the pages of the corpus.
+
+The texts can't be identical: html2text adds Markdown markup (`**`, `#`, `*` list bullets, escapes) and keeps the
+navigation menus and `<noscript>` fallbacks, which the fast extractor leaves out. Thus they are compared by the words
+they contain: the similarity is the share of the words the two texts have in common (1.0 means the same words, the same
+number of times). html2text also leaves a trailing space after the titles, thus they are compared stripped. The
+boilerplate removal only works on the text of the fast extractor, thus it is turned off for the comparison.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_text_extractor [--backend lxml|bs4] [--repeat N] [--min-similarity S]
+
+The exit code is 1 if the titles, links or meta tags differ for any page, or the similarity of the texts of a page is
+below the minimum.
+
+"""
+import re
+import sys
+from argparse import ArgumentParser
+from collections import Counter
+from typing import Optional, Any
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.html_parsers import get_parser_backend
+from src.data_collection.page_extractor import get_page_extractor
+from src.utils.enums import TextExtractor
+
+# words of the texts; the Markdown markup of html2text (including the underscores around emphasized text) is not part
+# of them
+WORD_REGEX = re.compile(r"[^\W_]+")
+
+
+def normalize(key: str, value: Any) -> Any:
+    """
+    Function which normalizes a value of the result dictionary before comparison.
+
+    :param key: Key of the value in the result dictionary.
+    :param value: Value to be normalized.
+    :return: Normalized value.
+
+    """
+
+    if key == "page_title" and value is not None:
+        return value.strip()
+
+    return value
+
+
+def get_similarity(text_a: Optional[str], text_b: Optional[str]) -> float:
+    """
+    Function which computes the share of the words two texts have in common.
+
+    :param text_a: First text.
+    :param text_b: Second text.
+    :return: Similarity between 0.0 and 1.0.
+
+    """
+
+    words_a = Counter(WORD_REGEX.findall((text_a or "").lower()))
+    words_b = Counter(WORD_REGEX.findall((text_b or "").lower()))
+
+    if (total := sum(words_a.values()) + sum(words_b.values())) == 0:
+        return 1.0
+
+    return 2 * sum((words_a & words_b).values()) / total
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--backend", default="lxml", help="Parser backend the pages are parsed with")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per page and extractor")
+    parser.add_argument("--min-similarity", type=float, default=0.9,
+                        help="Lowest accepted similarity of the texts of a page")
+    args = parser.parse_args()
+
+    page_extractor = get_page_extractor()
+
+    backend = get_parser_backend(name=args.backend)
+    page_extractor.boilerplate_remover.enabled = False
+
+    failures = 0
+    total_html2text, total_fast = 0.0, 0.0
+
+    print(f"{'page':<100} {'html2text ms':>13} {'fast ms':>10} {'speedup':>8} {'similarity':>11}  parity")
+    for url, content in load_corpus():
+        html2text_result = page_extractor.process_page_content(url=url, content=content, parser_backend=backend,
+                                                               text_extractor=TextExtractor.HTML2TEXT)
+        fast_result = page_extractor.process_page_content(url=url, content=content, parser_backend=backend,
+                                                          text_extractor=TextExtractor.FAST)
+
+        # everything but the text has to be the same
+        differing_keys = [key for key in html2text_result
+                          if key != "page_content" and normalize(key=key, value=html2text_result[key]) !=
+                          normalize(key=key, value=fast_result.get(key))]
+        similarity = get_similarity(text_a=html2text_result["page_content"], text_b=fast_result["page_content"])
+        if len(differing_keys) > 0 or similarity < args.min_similarity:
+            failures += 1
+
+        html2text_time = time_function(lambda: page_extractor.process_page_content(
+            url=url, content=content, parser_backend=backend, text_extractor=TextExtractor.HTML2TEXT),
+            repeat=args.repeat)
+        fast_time = time_function(lambda: page_extractor.process_page_content(
+            url=url, content=content, parser_backend=backend, text_extractor=TextExtractor.FAST), repeat=args.repeat)
+        total_html2text += html2text_time
+        total_fast += fast_time
+
+        print(f"{url:<100} {html2text_time:>13.1f} {fast_time:>10.1f} {html2text_time / fast_time:>7.1f}x "
+              f"{similarity:>11.3f}  {'OK' if len(differing_keys) == 0 else 'DIFF: ' + ', '.join(differing_keys)}")
+
+    print(f"{'total':<100} {total_html2text:>13.1f} {total_fast:>10.1f} {total_html2text / total_fast:>7.1f}x")
+
+    return 1 if failures > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Compares the speed of `normalize_text` with the chain of `remove_line_formatters`, `remove_multiple_spaces` and
+`remove_html_tags_from_string` it replaces, and with a single regex pass doing the same, on the text html2text produces
+from the pages of the corpus. That the results are the same is checked by `tests/test_text_normalizer.py`.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_text_normalizer [--repeat N]
+
+"""
+import re
+import sys
+from argparse import ArgumentParser
+from typing import List, Tuple
+
+import html2text
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.html_parsers import parse_page
+from src.data_collection.scraper_utils import normalize_text, remove_line_formatters, remove_multiple_spaces, \
+    remove_html_tags_from_string, MULTIPLE_SPACES_REGEX, HTML_TAG_REGEX
+from src.utils.enums import ParserBackend
+
+# the runs of spaces (keeping one of them in the group) and the HTML tags (leaving the group empty) in one pattern
+SINGLE_PASS_REGEX = re.compile(r"( ) +|" + HTML_TAG_REGEX.pattern)
+
+
+def legacy_normalize(string: str, strip_html_tags: bool) -> str:
+    """
+    Function which normalizes a string the way the scraper did before `normalize_text`.
+
+    :param string: String to be normalized.
+    :param strip_html_tags: If True, the HTML tags are removed from the string as well.
+    :return: Normalized string.
+
+    """
+
+    string = remove_line_formatters(string=string)
+    string = remove_multiple_spaces(string=string)
+
+    if strip_html_tags:
+        string = remove_html_tags_from_string(string=string)
+
+    return string
+
+
+def single_pass_normalize(string: str, strip_html_tags: bool) -> str:
+    """
+    Function which normalizes a string with a single regex pass over it (after the line breaks are replaced), instead
+    of one pass for the spaces and another one for the HTML tags.
+
+    :param string: String to be normalized.
+    :param strip_html_tags: If True, the HTML tags are removed from the string as well.
+    :return: Normalized string.
+
+    """
+
+    string = string.replace('\r', ' ').replace('\n', ' ')
+
+    if not strip_html_tags:
+        return MULTIPLE_SPACES_REGEX.sub(' ', string)
+
+    return SINGLE_PASS_REGEX.sub(r"\1", string)
+
+
+def load_inputs() -> List[Tuple[str, str, bool]]:
+    """
+    Function which converts the titles and the bodies of the pages of the corpus to text with html2text, the way the
+    scraper does before normalizing them.
+
+    :return: List of (name, text, whether the HTML tags are removed from the text) tuples.
+
+    """
+
+    # same settings as in `html_to_text`
+    h2t = html2text.HTML2Text()
+    h2t.ignore_links = True
+    h2t.bypass_tables = True
+    h2t.escape_snob = False
+    h2t.ignore_images = True
+
+    inputs = []
+    for url, content in load_corpus():
+        parsed_page = parse_page(content=content, backend=ParserBackend.BEAUTIFULSOUP)
+        if parsed_page.title_html is not None:
+            inputs.append((url + " [title]", h2t.handle(parsed_page.title_html), False))
+        if parsed_page.body_html is not None:
+            inputs.append((url + " [body]", h2t.handle(parsed_page.body_html), True))
+
+    return inputs
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per input")
+    args = parser.parse_args()
+
+    total_legacy, total_fused, total_single, total_size = 0.0, 0.0, 0.0, 0
+
+    print(f"{'input':<110} {'KiB':>8} {'chain ms':>9} {'fused ms':>9} {'single ms':>10} {'speedup':>8}")
+    for name, text, strip in load_inputs():
+        legacy_time = time_function(lambda: legacy_normalize(text, strip), repeat=args.repeat)
+        fused_time = time_function(lambda: normalize_text(string=text, strip_html_tags=strip), repeat=args.repeat)
+        single_time = time_function(lambda: single_pass_normalize(text, strip), repeat=args.repeat)
+        total_legacy += legacy_time
+        total_fused += fused_time
+        total_single += single_time
+        total_size += len(text)
+
+        print(f"{name:<110} {len(text) / 1024:>8.1f} {legacy_time:>9.2f} {fused_time:>9.2f} {single_time:>10.2f} "
+              f"{legacy_time / max(fused_time, 1e-6):>7.1f}x")
+
+    print(f"{'total':<110} {total_size / 1024:>8.1f} {total_legacy:>9.2f} {total_fused:>9.2f} {total_single:>10.2f} "
+          f"{total_legacy / max(total_fused, 1e-6):>7.1f}x")
+    print(f"Throughput: chain {total_size / 1024 / 1024 / (total_legacy / 1000):.1f} MiB/s, "
+          f"fused {total_size / 1024 / 1024 / (total_fused / 1000):.1f} MiB/s, "
+          f"single pass {total_size / 1024 / 1024 / (total_single / 1000):.1f} MiB/s")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""
+Compares the `UrlResolver` with the link filtering chain it replaced (`format_urls` and the `filter_*` functions) on
+link-heavy directory pages: the ones of the corpus and generated ones with thousands of links.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.bench_url_resolver [--repeat N] [--links N]
+
+The two don't produce the same links on purpose: the old chain resolved every relative link against the root of the
+site, while the resolver follows RFC 3986 (e.g. 'page2.html' on '/forum/' is '/forum/page2.html').
+
+"""
+import random
+import sys
+from argparse import ArgumentParser
+from typing import List, Optional
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.html_parsers import parse_page
+from src.data_collection.scraper_utils import get_tld_with_protocol, url_has_fld, remove_unusable_links, \
+    filter_resource_links, filter_regular_links, merge_pathlike_link_to_base_url
+from src.data_collection.url_resolver import UrlResolver
+from src.utils.enums import ParserBackend
+from src.utils.general import remove_duplicates
+
+# pages of the corpus which are mostly links
+LINK_HEAVY_PAGES = ("/links/", "/forum/", "/search")
+
+# characters of the onion addresses
+BASE32_ALPHABET = "abcdefghijklmnopqrstuvwxyz234567"
+
+
+def legacy_format_urls(url_being_scraped: str, list_of_urls: List[str]) -> Optional[List[str]]:
+    """
+    Function which formats the URLs in a list, the way the scraper did before the `UrlResolver`.
+
+    :param url_being_scraped: The current URL that is being scraped.
+    :param list_of_urls: List of URLs to format.
+    :return: List of formatted URLs.
+
+    """
+
+    if (current_url := get_tld_with_protocol(url=url_being_scraped)) is None:
+        return None
+
+    formatted_urls = []
+    for url in list_of_urls:
+        if len(url) == 0:
+            continue
+
+        if "../" in url:
+            formatted_urls.append(merge_pathlike_link_to_base_url(base_url=url_being_scraped, link=url))
+            continue
+
+        if url[0] == "#":
+            continue
+
+        if "javascript:void(0);" in url:
+            continue
+
+        url = url.split("#")[0]
+
+        if not url_has_fld(url=url):
+            if url[0] == "/":
+                url = current_url + url[1:]
+            else:
+                url = current_url + url
+
+        formatted_urls.append(url)
+
+    return formatted_urls
+
+
+def legacy_filter_links(url_being_scraped: str, list_of_urls: List[Optional[str]]) -> List[str]:
+    """
+    Function which filters the extracted URLs from a page, the way the scraper did before the `UrlResolver`.
+
+    :param url_being_scraped: The current URL that is being scraped.
+    :param list_of_urls: List of URLs to be filtered.
+    :return: Filtered list of URLs.
+
+    """
+
+    list_of_urls = remove_unusable_links(list_of_links=list_of_urls)
+    list_of_urls = legacy_format_urls(url_being_scraped=url_being_scraped, list_of_urls=list_of_urls)
+    list_of_urls = filter_resource_links(list_of_links=list_of_urls)
+    list_of_urls = remove_duplicates(list_of_strings=list_of_urls)
+    return filter_regular_links(list_of_links=list_of_urls)
+
+
+def generate_directory_links(number_of_links: int, seed: int) -> List[str]:
+    """
+    Function which generates the links of a directory page: mostly links to other onion sites, mixed with relative
+    links, resources, fragments, javascript and clearnet links.
+
+    :param number_of_links: Number of links to generate.
+    :param seed: Seed of the random generator.
+    :return: List of links.
+
+    """
+
+    generator = random.Random(seed)
+    hosts = ["".join(generator.choice(BASE32_ALPHABET) for _ in range(55)) + "d.onion"
+             for _ in range(max(number_of_links // 4, 1))]
+
+    links = []
+    for index in range(number_of_links):
+        host = generator.choice(hosts)
+        kind = generator.random()
+        if kind < 0.5:
+            links.append(f"http://{host}/")
+        elif kind < 0.6:
+            links.append(f"http://{host}/index.php?id={index}")
+        elif kind < 0.7:
+            links.append(f"/category/{index % 50}/page{index}.html")
+        elif kind < 0.75:
+            links.append(f"../wiki/{index}")
+        elif kind < 0.8:
+            links.append(f"http://{host}/files/dump{index}.zip")
+        elif kind < 0.85:
+            links.append(f"#section{index}")
+        elif kind < 0.9:
+            links.append("javascript:void(0);")
+        else:
+            links.append(f"https://www.example{index % 100}.com/")
+
+    return links
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs per page")
+    parser.add_argument("--links", type=int, default=10000, help="Number of links on the generated pages")
+    args = parser.parse_args()
+
+    pages = []
+    for url, content in load_corpus():
+        if any(marker in url for marker in LINK_HEAVY_PAGES):
+            pages.append((url, parse_page(content=content, backend=ParserBackend.LXML).links))
+
+    base_url = "http://" + "a" * 55 + "d.onion/directory/index.html"
+    for seed in range(3):
+        pages.append((f"generated #{seed}", generate_directory_links(number_of_links=args.links, seed=seed)))
+
+    total_legacy, total_resolver = 0.0, 0.0
+
+    print(f"{'page':<100} {'links':>7} {'legacy':>7} {'new':>7} {'legacy ms':>10} {'new ms':>8} {'speedup':>8}")
+    for name, links in pages:
+        url = name if name.startswith("http") else base_url
+
+        # a new resolver for every page, so the cache only helps within the page
+        legacy_links = legacy_filter_links(url_being_scraped=url, list_of_urls=links)
+        resolved_links = UrlResolver(cache_size=4096).resolve_links(base_url=url, links=links)
+
+        legacy_time = time_function(lambda: legacy_filter_links(url_being_scraped=url, list_of_urls=links),
+                                    repeat=args.repeat)
+        resolver_time = time_function(lambda: UrlResolver(cache_size=4096).resolve_links(base_url=url, links=links),
+                                      repeat=args.repeat)
+        total_legacy += legacy_time
+        total_resolver += resolver_time
+
+        print(f"{name:<100} {len(links):>7} {len(legacy_links):>7} {len(resolved_links):>7} {legacy_time:>10.2f} "
+              f"{resolver_time:>8.2f} {legacy_time / max(resolver_time, 1e-6):>7.1f}x")
+
+    print(f"{'total':<100} {'':>7} {'':>7} {'':>7} {total_legacy:>10.2f} {total_resolver:>8.2f} "
+          f"{total_legacy / max(total_resolver, 1e-6):>7.1f}x")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import json
+import os
+import time
+from typing import List, Tuple, Callable, Any
+
+# location of the recorded pages
+CORPUS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def load_corpus() -> List[Tuple[str, bytes]]:
+    """
+    Function which loads the recorded pages of the corpus together with the URLs they were saved from.
+
+    :return: List of (URL, raw content) tuples.
+
+    """
+
+    with open(os.path.join(CORPUS_DIRECTORY, "index.json"), "r") as file:
+        index = json.load(file)
+
+    pages = []
+    for page in index["pages"]:
+        with open(os.path.join(CORPUS_DIRECTORY, page["file"]), "rb") as file:
+            pages.append((page["url"], file.read()))
+
+    return pages
+
+
+def time_function(function: Callable[[], Any], repeat: int) -> float:
+    """
+    Function which measures the best execution time of a function out of multiple runs.
+
+    :param function: Function to be measured.
+    :param repeat: Number of times the function is executed.
+    :return: Best execution time in milliseconds.
+
+    """
+
+    best = float("inf")
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+
+    return best * 1000
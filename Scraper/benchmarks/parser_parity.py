@@ -0,0 +1,81 @@
+"""
+Checks that the lxml and BeautifulSoup parser backends extract exactly the same data from the pages of the corpus and
+compares their speed.
+
+Usage (from the Scraper directory):
+
+    python -m benchmarks.parser_parity [--repeat N]
+
+The exit code is 1 if the backends produce different results for any of the pages.
+
+"""
+import sys
+from argparse import ArgumentParser
+from typing import Any
+
+from benchmarks.corpus_utils import load_corpus, time_function
+from src.data_collection.html_parsers import LXML_AVAILABLE
+from src.data_collection.page_extractor import get_page_extractor
+from src.utils.enums import ParserBackend
+
+
+def normalize(key: str, value: Any) -> Any:
+    """
+    Function which normalizes a value of the result dictionary before comparison.
+
+    :param key: Key of the value in the result dictionary.
+    :param value: Value to be normalized.
+    :return: Normalized value.
+
+    """
+
+    if key == "page_content" and value is not None:
+        return " ".join(value.split())
+
+    return value
+
+
+def main() -> int:
+    parser = ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per page and backend")
+    args = parser.parse_args()
+
+    page_extractor = get_page_extractor()
+
+    if not LXML_AVAILABLE:
+        print("lxml is not installed, nothing to compare.")
+        return 1
+
+    mismatches = 0
+    total_bs4, total_lxml = 0.0, 0.0
+
+    print(f"{'page':<100} {'bs4 ms':>10} {'lxml ms':>10} {'speedup':>8}  parity")
+    for url, content in load_corpus():
+        bs4_result = page_extractor.process_page_content(url=url, content=content,
+                                                         parser_backend=ParserBackend.BEAUTIFULSOUP)
+        lxml_result = page_extractor.process_page_content(url=url, content=content, parser_backend=ParserBackend.LXML)
+
+        # html2text emits different runs of whitespace around elements lxml closes implicitly (e.g. table cells), thus
+        # the page content is compared with the whitespace collapsed
+        differing_keys = [key for key in bs4_result
+                          if normalize(key=key, value=bs4_result[key]) != normalize(key=key, value=lxml_result.get(key))]
+        if len(differing_keys) > 0:
+            mismatches += 1
+
+        bs4_time = time_function(lambda: page_extractor.process_page_content(
+            url=url, content=content, parser_backend=ParserBackend.BEAUTIFULSOUP), repeat=args.repeat)
+        lxml_time = time_function(lambda: page_extractor.process_page_content(
+            url=url, content=content, parser_backend=ParserBackend.LXML), repeat=args.repeat)
+        total_bs4 += bs4_time
+        total_lxml += lxml_time
+
+        print(f"{url:<100} {bs4_time:>10.1f} {lxml_time:>10.1f} {bs4_time / lxml_time:>7.1f}x  "
+              f"{'OK' if len(differing_keys) == 0 else 'DIFF: ' + ', '.join(differing_keys)}")
+
+    print(f"{'total':<100} {total_bs4:>10.1f} {total_lxml:>10.1f} {total_bs4 / total_lxml:>7.1f}x")
+
+    return 1 if mismatches > 0 else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
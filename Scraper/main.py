@@ -1,21 +1,142 @@
+import asyncio
+import atexit
 import signal
 import sys
+from concurrent.futures import Executor
+from functools import partial
+from typing import Dict, Optional
 
-from src.data_collection.webscraper import scrape_url
-from src.mq.message_queue import MessageQueue
-from src.utils.signal_handler import get_signal_handler_method
-from src.utils.general import read_config_file, get_config_file_location
+from src.data_collection.concurrency_controller import ConcurrencyController
+from src.data_collection.page_extractor import create_extraction_pool
+from src.utils.enums import ProxyMode
+from src.utils.general import read_config_file, get_config_file_location, get_config_value
+from src.utils.logger import get_logger
+from src.utils.metrics import metrics_exporter
+
+# get logger
+logger = get_logger()
+
+
+async def run_async_scraper(mq_params: Dict, scraper_params: Optional[Dict], extraction_pool: Optional[Executor]):
+    """
+    Coroutine which runs the scraper in asynchronous mode, keeping multiple URLs in flight at the same time.
+
+    :param mq_params: Dictionary containing the connection parameters for the MQ.
+    :param scraper_params: Dictionary containing the parameters of the scraper.
+    :param extraction_pool: Pool of processes the pages are parsed in, or None for parsing them in threads.
+
+    """
+
+    # imported here for the same reason as in the main block
+    from src.data_collection.async_webscraper import scrape_url_async, ClientSessionPool
+    from src.data_collection.webscraper import circuit_pool, proxy_mode
+    from src.mq.async_message_queue import AsyncMessageQueue
+
+    prefetch_count = get_config_value(param_dict=scraper_params, key="prefetch_count",
+                                      default_value=32, value_type=int)
+    max_concurrent_requests = get_config_value(param_dict=scraper_params, key="max_concurrent_requests",
+                                               default_value=32, value_type=int)
+
+    # the number of requests in flight follows the state of the network, between a floor and `max_concurrent_requests`
+    concurrency_controller = ConcurrencyController(
+        min_limit=get_config_value(param_dict=scraper_params, key="min_concurrent_requests", default_value=4,
+                                   value_type=int),
+        max_limit=max_concurrent_requests,
+        initial_limit=get_config_value(param_dict=scraper_params, key="initial_concurrent_requests",
+                                       default_value=16, value_type=int),
+        increase_step=get_config_value(param_dict=scraper_params, key="concurrency_increase_step", default_value=1.0,
+                                       value_type=float),
+        decrease_factor=get_config_value(param_dict=scraper_params, key="concurrency_decrease_factor",
+                                         default_value=0.5, value_type=float),
+        max_failure_rate=get_config_value(param_dict=scraper_params, key="concurrency_max_failure_rate",
+                                          default_value=0.5, value_type=float),
+        latency_tolerance=get_config_value(param_dict=scraper_params, key="concurrency_latency_tolerance",
+                                           default_value=2.0, value_type=float),
+        min_round_size=get_config_value(param_dict=scraper_params, key="concurrency_round_size", default_value=10,
+                                        value_type=int))
+    metrics_exporter.register(name="concurrency", provider=concurrency_controller.get_snapshot)
+
+    session_pool = ClientSessionPool(circuit_pool=circuit_pool if proxy_mode == ProxyMode.SOCKS else None,
+                                     max_connections=max_concurrent_requests,
+                                     max_connections_per_host=get_config_value(param_dict=scraper_params,
+                                                                               key="pool_maxsize",
+                                                                               default_value=4,
+                                                                               value_type=int),
+                                     connect_timeout=get_config_value(param_dict=scraper_params,
+                                                                      key="connect_timeout",
+                                                                      default_value=30.0,
+                                                                      value_type=float),
+                                     read_timeout=get_config_value(param_dict=scraper_params,
+                                                                   key="read_timeout",
+                                                                   default_value=60.0,
+                                                                   value_type=float))
+
+    async with session_pool:
+        # create the MQ object; the connection is established when it starts working
+        message_queue = AsyncMessageQueue(param_dict=mq_params,
+                                          function_to_execute=partial(scrape_url_async, session_pool,
+                                                                      extraction_executor=extraction_pool,
+                                                                      concurrency_controller=concurrency_controller),
+                                          prefetch_count=prefetch_count,
+                                          max_concurrent_requests=max_concurrent_requests)
+
+        # register signal handling method
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGINT, message_queue.stop)
+        loop.add_signal_handler(signal.SIGTERM, message_queue.stop)
+
+        # start the processing and run until stopped
+        await message_queue.start_working()
 
-# setting the recursion limit(bugfix for BeautifulSoup when dealing with large pages)
-sys.setrecursionlimit(25000)
 
 if __name__ == '__main__':
+    # the scraping modules connect to Tor and open the stores shared by the scrapers when they are imported; the
+    # processes of the extraction pool import this script again (not as `__main__`), so the scraping modules are only
+    # imported when the scraper is actually run
+    from src.data_collection.webscraper import scrape_url, circuit_pool, scrape_url_offloaded, warc_archive
+    from src.mq.message_queue import MessageQueue
+    from src.utils.signal_handler import get_signal_handler_method
+
     # get the parameters for connecting to the message queue
     if (mq_params := read_config_file(config_file=get_config_file_location(), section="MQ")) is None:
         sys.exit(3)
 
+    # get the parameters of the scraper; if they are missing, the defaults are used
+    scraper_params = read_config_file(config_file=get_config_file_location(), section="SCRAPER")
+
+    # don't take any URL from the MQ until TOR is able to build circuits, otherwise they would all fail
+    if not circuit_pool.wait_until_ready(timeout=get_config_value(param_dict=scraper_params, key="tor_ready_timeout",
+                                                                  default_value=300.0, value_type=float)):
+        logger.error("TOR didn't get ready in time!")
+        sys.exit(1)
+
+    # write the metrics of the scraper (e.g. the latency histograms of the hosts) periodically
+    metrics_exporter.start()
+
+    # the archive file being written gets its final name when the scraper exits, so it is picked up for re-extraction
+    atexit.register(warc_archive.close)
+
+    # the pages are parsed in separate processes, so parsing neither blocks the MQ connection nor is limited to one core
+    extraction_workers = get_config_value(param_dict=scraper_params, key="extraction_workers", default_value=2,
+                                          value_type=int)
+    extraction_pool = create_extraction_pool(workers=extraction_workers)
+
+    if get_config_value(param_dict=scraper_params, key="scraping_mode", default_value="sync") == "async":
+        asyncio.run(run_async_scraper(mq_params=mq_params, scraper_params=scraper_params,
+                                      extraction_pool=extraction_pool))
+        metrics_exporter.stop()
+        if extraction_pool is not None:
+            extraction_pool.shutdown()
+        sys.exit(0)
+
     # create connect to the message queue
-    message_queue = MessageQueue(param_dict=mq_params, function_to_execute=scrape_url)
+    if extraction_pool is not None:
+        # while a page is being parsed, the next one is already being fetched; a worker always has a page waiting
+        message_queue = MessageQueue(param_dict=mq_params,
+                                     function_to_execute=partial(scrape_url_offloaded, extraction_pool),
+                                     prefetch_count=2 * extraction_workers)
+    else:
+        message_queue = MessageQueue(param_dict=mq_params, function_to_execute=scrape_url)
 
     # register signal handling method
     signal.signal(signal.SIGINT, get_signal_handler_method(mq=message_queue))
@@ -0,0 +1,167 @@
+"""
+Extracts the pages archived by the scrapers (see `warc_directory`) again with the current extraction code, without
+fetching them over Tor, and emits the same messages the scrapers send to the processors.
+
+Usage (from the Scraper directory):
+
+    python reextract.py PATH [PATH ...] (--output FILE | --publish) [--workers N] [--include-open]
+
+The paths are WARC files or directories searched recursively for `.warc.gz` files. The messages are either written to
+a file as JSON lines, or published to the processor queue of the MQ configured in the config file, the same way as the
+scrapers publish them. The pages are extracted in a pool of `--workers` processes.
+
+"""
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Iterator, Tuple, Union, Dict, Optional, Deque, List, Mapping
+
+from src.data_collection.warc_archive import WARCIO_AVAILABLE, find_warc_files, read_warc_responses
+from src.data_collection.page_extractor import create_extraction_pool, process_fetched_page, get_response_validators, \
+    get_page_extractor
+from src.utils.enums import ScrapingResult
+from src.utils.general import read_config_file, get_config_file_location
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+# number of pages per worker waiting to be extracted, so the workers always have something to do, but the archives
+# aren't read into the memory much faster than the pages are extracted
+PAGES_PER_WORKER = 8
+
+
+def read_pages(warc_files: List[str]) -> Iterator[Tuple[str, bytes, Mapping]]:
+    """
+    Function which reads the archived pages of the archive files one after the other.
+
+    :param warc_files: Paths of the archive files.
+    :return: Iterator of the URL, the body and the headers of the pages.
+
+    """
+
+    for file_number, warc_file in enumerate(warc_files, start=1):
+        logger.info(f"Reading archive file {file_number}/{len(warc_files)}: '{warc_file}'.")
+        yield from read_warc_responses(file_path=warc_file)
+
+
+def extract_pages(pages: Iterator[Tuple[str, bytes, Mapping]], executor: Optional[Executor], workers: int) \
+        -> Iterator[Tuple[str, Union[ScrapingResult, Dict]]]:
+    """
+    Function which extracts the pages in the pool of processes, keeping their order.
+
+    :param pages: Iterator of the URL, the body and the headers of the pages.
+    :param executor: Pool of processes the pages are extracted in, or None for extracting them in this process.
+    :param workers: Number of processes of the pool.
+    :return: Iterator of the URL and the extracted message (or a `ScrapingResult` object) of the pages; the
+             blacklisted pages are not extracted.
+
+    """
+
+    pending: Deque[Tuple[str, Future]] = deque()
+    blacklist = get_page_extractor().blacklist
+
+    for url, content, headers in pages:
+        # the page might have been blacklisted since it was archived
+        if blacklist.is_url_blacklisted(url=url):
+            yield url, ScrapingResult.BLACKLISTED
+            continue
+
+        validators = get_response_validators(headers=headers)
+
+        if executor is None:
+            yield url, process_fetched_page(url=url, content=content, response_validators=validators,
+                                            previous_validators=None)
+            continue
+
+        pending.append((url, executor.submit(process_fetched_page, url, content, validators, None)))
+
+        if len(pending) >= workers * PAGES_PER_WORKER:
+            url, future = pending.popleft()
+            yield url, future.result()
+
+    while len(pending) > 0:
+        url, future = pending.popleft()
+        yield url, future.result()
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Extracts the archived pages again and emits the messages of the processors.")
+    parser.add_argument("paths", nargs="+", help="WARC files or directories containing them")
+    output_group = parser.add_mutually_exclusive_group(required=True)
+    output_group.add_argument("--output", help="File the messages are written to as JSON lines")
+    output_group.add_argument("--publish", action="store_true",
+                              help="Publish the messages to the processor queue of the configured MQ")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of processes the pages are extracted in; 0 extracts them in this process")
+    parser.add_argument("--include-open", action="store_true",
+                        help="Also read the archive files which are still being written")
+    args = parser.parse_args()
+
+    if not WARCIO_AVAILABLE:
+        logger.error("warcio is not installed!")
+        return 2
+
+    if len(warc_files := find_warc_files(paths=args.paths, include_open=args.include_open)) == 0:
+        logger.error("No archive files found!")
+        return 2
+
+    message_queue = None
+    if args.publish:
+        if (mq_params := read_config_file(config_file=get_config_file_location(), section="MQ")) is None:
+            return 3
+
+        # the MQ module sets up the scraper (Tor, the shared stores) when imported; the processes of the pool import
+        # this script again, so it is only imported when it is needed
+        from src.mq.message_queue import MessageQueue
+        message_queue = MessageQueue(param_dict=mq_params, function_to_execute=None)
+
+    output_file = open(args.output, "w", encoding="UTF-8") if args.output is not None else None
+    executor = create_extraction_pool(workers=args.workers)
+
+    sent, failed, blacklisted, boilerplate_size = 0, 0, 0, 0
+    started_at = time.monotonic()
+
+    try:
+        for url, result in extract_pages(pages=read_pages(warc_files=warc_files), executor=executor,
+                                         workers=args.workers):
+            if result == ScrapingResult.BLACKLISTED:
+                blacklisted += 1
+                continue
+
+            if type(result) is ScrapingResult:
+                logger.warning(f"Extraction failed for url '{url}': {result.name}.")
+                failed += 1
+                continue
+
+            if output_file is not None:
+                output_file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            elif not message_queue.send_result(data=result):
+                logger.warning(f"Couldn't send back result for url: '{url}'!")
+                failed += 1
+                continue
+
+            sent += 1
+            boilerplate_size += result.get("boilerplate_size", 0)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        if output_file is not None:
+            output_file.close()
+        if message_queue is not None:
+            message_queue.close_connection()
+
+    elapsed = time.monotonic() - started_at
+    logger.info(f"{sent} pages re-extracted, {failed} failed, {blacklisted} blacklisted, in {elapsed:.1f} seconds "
+                f"({(sent + failed) / max(elapsed, 1e-9):.1f} pages/sec), {boilerplate_size} bytes of boilerplate "
+                f"removed.")
+
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,439 @@
+import asyncio
+import time
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from typing import Dict, Union, Optional, Tuple, Set, AsyncIterator
+
+import aiohttp
+
+from src.utils.enums import ScrapingResult, FetchOutcome
+from src.utils.logger import get_logger
+from src.data_collection.concurrency_controller import ConcurrencyController
+from src.data_collection.page_extractor import process_fetched_page, create_unchanged_message, get_response_validators
+from src.data_collection.response_limits import ResponseLimits
+from src.data_collection.webscraper import response_limits, host_rate_limiter, get_conditional_headers, \
+    host_circuit_breaker, record_host_result, host_latency_tracker, response_cache, warc_archive, blacklist
+from src.mq.work_message import PageValidators
+from src.data_collection.scraper_utils import get_tor_proxy_url, get_request_headers, is_onion_link, get_host
+from src.data_collection.tor_circuit_pool import TorCircuitPool
+
+# aiohttp-socks is needed for talking to the SOCKS port of Tor directly; without it, the requests go through privoxy
+try:
+    from aiohttp_socks import ProxyConnector, ProxyType
+
+    AIOHTTP_SOCKS_AVAILABLE = True
+except ImportError:
+    AIOHTTP_SOCKS_AVAILABLE = False
+
+# get logger
+logger = get_logger()
+
+
+class ClientSessionPool:
+    """
+    Class which keeps the HTTP client sessions used by the asynchronous scraping mode.
+
+    Through privoxy, a single session is used for every request. In SOCKS mode, aiohttp can only set the SOCKS proxy per
+    connector, so every circuit of the circuit pool gets its own session. When a circuit is retired, its session is
+    replaced, and the old one is closed as soon as its last request in flight finishes.
+
+    The connections are kept alive between requests, so consecutive pages of the same site can reuse a warm connection.
+
+    IMPORTANT: the sessions have to be created (and closed) from within a running event loop!
+
+    """
+
+    def __init__(self,
+                 circuit_pool: Optional[TorCircuitPool],
+                 max_connections: int,
+                 max_connections_per_host: int,
+                 connect_timeout: float,
+                 read_timeout: float,
+                 stats_log_interval: int = 100):
+        """
+        Initializer method.
+
+        :param circuit_pool: Circuit pool the requests are spread over, or None for sending them through privoxy.
+        :param max_connections: Maximum number of simultaneous connections a session is allowed to open.
+        :param max_connections_per_host: Maximum number of simultaneous connections to the same host.
+        :param connect_timeout: Number of seconds to wait for a connection to be established.
+        :param read_timeout: Number of seconds to wait between bytes received from the server.
+        :param stats_log_interval: Number of requests after which the pool statistics are logged. 0 disables logging.
+
+        """
+
+        if circuit_pool is not None and not AIOHTTP_SOCKS_AVAILABLE:
+            logger.warning("aiohttp-socks is not installed! The requests are sent through privoxy.")
+            circuit_pool = None
+
+        self.circuit_pool = circuit_pool
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.timeout = aiohttp.ClientTimeout(total=None, sock_connect=connect_timeout, sock_read=read_timeout)
+
+        # the statistics are shared by every session
+        self._trace_config = _get_pool_statistics_trace_config(stats_log_interval=stats_log_interval)
+
+        # the sessions by the index of their circuit (-1 for privoxy), together with the SOCKS password they use
+        self._sessions: Dict[int, Tuple[Optional[str], aiohttp.ClientSession]] = {}
+
+        # number of requests in flight for each session, and the replaced sessions waiting for them to finish
+        self._requests_in_flight: Dict[aiohttp.ClientSession, int] = {}
+        self._retired_sessions: Set[aiohttp.ClientSession] = set()
+
+    async def __aenter__(self) -> 'ClientSessionPool':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    @asynccontextmanager
+    async def acquire(self, url: str) -> AsyncIterator[Tuple[aiohttp.ClientSession, Optional[str]]]:
+        """
+        Method which provides the session to be used for sending a request to a URL, for the duration of the request.
+
+        :param url: URL the request is sent to.
+        :return: Tuple of the session and the HTTP proxy URL to be passed to the request (None in SOCKS mode).
+
+        """
+
+        session, proxy = self._get_session(host=get_host(url=url))
+
+        self._requests_in_flight[session] = self._requests_in_flight.get(session, 0) + 1
+        try:
+            yield session, proxy
+        finally:
+            self._requests_in_flight[session] -= 1
+            if self._requests_in_flight[session] == 0:
+                del self._requests_in_flight[session]
+
+                # the last request of a replaced session finished, it can be closed now
+                if session in self._retired_sessions:
+                    self._retired_sessions.discard(session)
+                    await session.close()
+
+    async def close(self):
+        """
+        Coroutine which closes every session of the pool.
+
+        """
+
+        sessions = [session for _, session in self._sessions.values()] + list(self._retired_sessions)
+        self._sessions.clear()
+        self._retired_sessions.clear()
+
+        for session in sessions:
+            await session.close()
+
+    def _get_session(self, host: str) -> Tuple[aiohttp.ClientSession, Optional[str]]:
+        """
+        Method which returns the session to be used for a host, creating it if necessary.
+
+        :param host: Host the request is sent to.
+        :return: Tuple of the session and the HTTP proxy URL to be passed to the request (None in SOCKS mode).
+
+        """
+
+        # we are using the TOR proxy in order to access .onion sites
+        if self.circuit_pool is None:
+            if (entry := self._sessions.get(-1)) is None:
+                entry = None, self._create_session(connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_connections_per_host,
+                    keepalive_timeout=60))
+                self._sessions[-1] = entry
+            return entry[1], get_tor_proxy_url()
+
+        circuit = self.circuit_pool.get_circuit(host=host)
+        username, password = self.circuit_pool.get_credentials(circuit=circuit)
+
+        if (entry := self._sessions.get(circuit)) is not None:
+            if entry[0] == password:
+                return entry[1], None
+
+            # the circuit was retired, the connections of its session can't be used anymore
+            self._retire_session(session=entry[1])
+
+        # the host names are resolved by Tor (rdns), which is a must for onion addresses
+        session = self._create_session(connector=ProxyConnector(proxy_type=ProxyType.SOCKS5,
+                                                                host=self.circuit_pool.socks_host,
+                                                                port=self.circuit_pool.socks_port,
+                                                                username=username,
+                                                                password=password,
+                                                                rdns=True,
+                                                                limit=self.max_connections,
+                                                                limit_per_host=self.max_connections_per_host,
+                                                                keepalive_timeout=60))
+        self._sessions[circuit] = password, session
+
+        return session, None
+
+    def _create_session(self, connector: aiohttp.TCPConnector) -> aiohttp.ClientSession:
+        """
+        Method which creates a client session with the specified connector.
+
+        :param connector: Connector of the session.
+        :return: ClientSession object.
+
+        """
+
+        return aiohttp.ClientSession(connector=connector,
+                                     timeout=self.timeout,
+                                     headers=get_request_headers(),
+                                     trace_configs=[self._trace_config])
+
+    def _retire_session(self, session: aiohttp.ClientSession):
+        """
+        Method which closes a replaced session once its requests in flight are finished.
+
+        :param session: Session to be retired.
+
+        """
+
+        if self._requests_in_flight.get(session, 0) > 0:
+            self._retired_sessions.add(session)
+        else:
+            # nothing is using the session, so it can be closed right away
+            task = asyncio.get_running_loop().create_task(session.close())
+            self._retired_sessions.add(session)
+            task.add_done_callback(lambda _: self._retired_sessions.discard(session))
+
+
+def _get_pool_statistics_trace_config(stats_log_interval: int) -> aiohttp.TraceConfig:
+    """
+    Function which creates a trace config counting how many connections the client session creates and reuses.
+
+    :param stats_log_interval: Number of requests after which the pool statistics are logged. 0 disables logging.
+    :return: TraceConfig object.
+
+    """
+
+    stats = {"requests_sent": 0, "connections_created": 0, "connections_reused": 0}
+
+    async def on_request_end(session, trace_config_ctx, params):  # signature defined by aiohttp
+        stats["requests_sent"] += 1
+        if stats_log_interval > 0 and stats["requests_sent"] % stats_log_interval == 0:
+            logger.info(f"HTTP session pool statistics: {stats}")
+
+    async def on_connection_create_end(session, trace_config_ctx, params):  # signature defined by aiohttp
+        stats["connections_created"] += 1
+
+    async def on_connection_reuseconn(session, trace_config_ctx, params):  # signature defined by aiohttp
+        stats["connections_reused"] += 1
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+
+    return trace_config
+
+
+async def scrape_url_async(session_pool: ClientSessionPool,
+                           url: str,
+                           validators: Optional[PageValidators] = None,
+                           extraction_executor: Optional[Executor] = None,
+                           concurrency_controller: Optional[ConcurrencyController] = None,
+                           host_wait: float = 0.0) \
+        -> Union[ScrapingResult, Dict]:
+    """
+    Coroutine which scrapes the content of a page.
+
+    The result has the same format as the one returned by `scrape_url`.
+
+    :param session_pool: Pool of the client sessions used for sending the request.
+    :param url: URL to be scraped.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :param extraction_executor: Executor the parsing and extraction of the page is run in (e.g. the extraction pool).
+                                Defaults to the thread pool of the event loop.
+    :param concurrency_controller: Controller limiting the number of requests in flight, if any.
+    :param host_wait: Maximum number of seconds to wait for the host to take another request before the URL is
+                      deferred.
+    :return: A Dictionary containing the relevant data from the page (or the "unchanged" message) or a
+             `ScrapingResult` object.
+
+    """
+
+    if type(result := await fetch_page_async(session_pool=session_pool, url=url, validators=validators,
+                                             concurrency_controller=concurrency_controller,
+                                             host_wait=host_wait)) is not tuple:
+        return result
+
+    content, response_validators = result
+
+    # hashing and parsing are CPU bound, so we run them outside the event loop, otherwise they would stall every other
+    # request in flight
+    try:
+        return await asyncio.get_running_loop().run_in_executor(extraction_executor, process_fetched_page, url,
+                                                                content, response_validators, validators)
+    except Exception as e:
+        # e.g. the process of the extraction crashed
+        logger.error(f"Processing failed for url '{url}': {e}")
+        return ScrapingResult.SCRAPING_FAILED
+
+
+async def fetch_page_async(session_pool: ClientSessionPool,
+                           url: str,
+                           validators: Optional[PageValidators] = None,
+                           concurrency_controller: Optional[ConcurrencyController] = None,
+                           host_wait: float = 0.0) \
+        -> Union[ScrapingResult, Dict, Tuple[bytes, PageValidators]]:
+    """
+    Coroutine which fetches the content of a page: everything `scrape_url_async` does before the content is parsed.
+
+    :param session_pool: Pool of the client sessions used for sending the request.
+    :param url: URL to be scraped.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :param concurrency_controller: Controller limiting the number of requests in flight, if any.
+    :param host_wait: Maximum number of seconds to wait for the host to take another request before the URL is
+                      deferred.
+    :return: Tuple of the content and the validators of the response, the "unchanged" message if the page didn't change,
+             or a `ScrapingResult` object.
+
+    """
+
+    # check if url is an onion link
+    if not is_onion_link(link=url):
+        logger.error(f"URL '{url}' is not an onion link!")
+        return ScrapingResult.INVALID_URL
+
+    # the scheduler doesn't send blacklisted pages, but its list might be older than the one of the scraper
+    if blacklist.is_url_blacklisted(url=url):
+        logger.warning(f"URL '{url}' is blacklisted! Skipping...")
+        return ScrapingResult.BLACKLISTED
+
+    loop = asyncio.get_running_loop()
+
+    # the page was already downloaded for an earlier delivery of the message, but its result wasn't sent; the cache is
+    # on disk, so it is read in a thread
+    if (cached := await loop.run_in_executor(None, response_cache.get, url)) is not None:
+        logger.info(f"URL '{url}' served from the response cache.")
+        return cached
+
+    host = get_host(url=url)
+
+    # requests to hosts which are down are short-circuited; the store might be busy, so it is checked in a thread
+    if not await loop.run_in_executor(None, host_circuit_breaker.allow_request, host):
+        logger.info(f"Host of url '{url}' is down, skipping it.")
+        return ScrapingResult.HOST_DOWN
+
+    # wait until the network can take another request; the slot is taken before the lease of the host, so the host
+    # isn't blocked for the other scrapers while the request waits
+    if concurrency_controller is not None:
+        await concurrency_controller.acquire()
+
+    outcome = FetchOutcome.SKIPPED
+    fetch_time = None
+
+    try:
+        # check whether the host can take another request right now
+        if (lease_id := await loop.run_in_executor(None, host_rate_limiter.acquire, host, host_wait)) is None:
+            logger.info(f"Request budget of the host of url '{url}' is exhausted, deferring it.")
+            return ScrapingResult.DEFERRED
+
+        try:
+            # get the content of the page
+            started_at = time.monotonic()
+            result = await send_request_async(session_pool=session_pool, url=url, validators=validators)
+            fetch_time = time.monotonic() - started_at
+
+            # the requests which timed out or failed at the proxy are the signs of a congested network
+            outcome = FetchOutcome.CONGESTION if result == ScrapingResult.HOST_UNREACHABLE else FetchOutcome.SUCCESS
+
+            # only a host which doesn't answer at all counts as down, an error status still comes from a live server
+            await loop.run_in_executor(None, record_host_result, host, result != ScrapingResult.HOST_UNREACHABLE)
+
+            if type(result) is ScrapingResult:
+                if result == ScrapingResult.HOST_UNREACHABLE:
+                    return ScrapingResult.SCRAPING_FAILED
+                if result == ScrapingResult.NOT_MODIFIED:
+                    logger.info(f"URL '{url}' not modified.")
+                    return create_unchanged_message(url=url, validators=validators)
+                return result
+        finally:
+            await loop.run_in_executor(None, host_rate_limiter.release, lease_id)
+    finally:
+        if concurrency_controller is not None:
+            concurrency_controller.release(outcome=outcome, latency=fetch_time)
+
+    content, response_validators = result
+    await loop.run_in_executor(None, response_cache.put, url, content, response_validators)
+
+    return result
+
+
+async def send_request_async(session_pool: ClientSessionPool, url: str, validators: Optional[PageValidators] = None) \
+        -> Union[ScrapingResult, Tuple[bytes, PageValidators]]:
+    """
+    Coroutine which sends an HTTP GET request to the specified URL and downloads the body of the response, if the
+    response is worth downloading at all.
+
+    The status code and the headers are checked before the body is read, and the body is read only up to the
+    configured size limit. The body is decompressed chunk by chunk, so the limit applies to the decompressed content.
+
+    :param session_pool: Pool of the client sessions used for sending the request.
+    :param url: URL to send an HTTP GET request to.
+    :param validators: Validators of the page from the previous scraping, used for sending a conditional request.
+    :return: Tuple of the content and the validators of the response, or a `ScrapingResult` object
+             (`HOST_UNREACHABLE` if the request failed before the server answered).
+
+    """
+
+    host = get_host(url=url)
+    connect_timeout, read_timeout = host_latency_tracker.get_timeouts(host=host)
+
+    response_received = False
+    started_at = time.monotonic()
+
+    try:
+        # the session of the circuit (or the proxy) takes care of reaching TOR
+        async with session_pool.acquire(url=url) as (session, proxy), \
+                session.get(url,
+                            proxy=proxy,
+                            headers=get_conditional_headers(validators=validators),
+                            timeout=aiohttp.ClientTimeout(total=None,
+                                                          sock_connect=connect_timeout,
+                                                          sock_read=read_timeout)) as response:
+            response_received = True
+
+            # the time until the headers of the response arrived
+            host_latency_tracker.record(host=host, latency=time.monotonic() - started_at)
+
+            # the page didn't change since the validators of the conditional request were received
+            if response.status == 304:
+                return ScrapingResult.NOT_MODIFIED
+
+            # if the status code isn't within the 200 range, we consider it failed
+            if response.status >= 300:
+                return ScrapingResult.SCRAPING_FAILED
+
+            if (result := response_limits.check_headers(url=url,
+                                                        content_type=response.headers.get("Content-Type"),
+                                                        content_length=response.headers.get("Content-Length"))) \
+                    is not None:
+                return result
+
+            if type(content := await response_limits.read_content_async(
+                    url=url,
+                    chunks=response.content.iter_chunked(ResponseLimits.CHUNK_SIZE))) is ScrapingResult:
+                return content
+
+            # compressing the record is CPU bound, so it is done in a thread
+            if warc_archive.is_enabled():
+                await asyncio.get_running_loop().run_in_executor(None, warc_archive.write_response, url,
+                                                                 response.status, response.reason,
+                                                                 list(response.headers.items()), content)
+
+            return content, get_response_validators(headers=response.headers)
+    except asyncio.TimeoutError as e:
+        if response_received:
+            logger.error(f"Download timed out for url '{url}': {e}")
+            return ScrapingResult.SCRAPING_FAILED
+
+        # the host needed more time than it got, so the next request gets more
+        host_latency_tracker.record(host=host, latency=max(connect_timeout, read_timeout))
+        logger.error(f"GET request timed out for url '{url}': {e}")
+        return ScrapingResult.HOST_UNREACHABLE
+    except Exception as e:
+        logger.error(f"GET request failed for url '{url}': {e}")
+        return ScrapingResult.SCRAPING_FAILED if response_received else ScrapingResult.HOST_UNREACHABLE
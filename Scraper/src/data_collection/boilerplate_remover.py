@@ -0,0 +1,111 @@
+from typing import List, Optional, Tuple
+
+from src.data_collection.html_parsers import TextBlock
+from src.utils.enums import BlockClass
+
+
+class BoilerplateRemover:
+    """
+    Class which removes the boilerplate (navigation, footers, the chrome repeated on every page of a forum) from the
+    text of a page, based on the density of the content in its blocks.
+
+    A block is boilerplate if more than `max_link_density` of its words are the text of links, content if it has at
+    least `min_block_words` words. The shorter blocks (headings, short posts, labels) can't be judged on their own, so
+    they follow the blocks around them: a short block between content blocks is content, one between boilerplate
+    blocks is boilerplate, and one between the two is kept if it has no links. The start and the end of the page count
+    as boilerplate.
+
+    If no block of a page is content (e.g. a page with a few lines of text only), the text is kept as it is.
+
+    """
+
+    def __init__(self, enabled: bool, min_block_words: int, max_link_density: float):
+        """
+        Initializer method.
+
+        :param enabled: Whether the boilerplate is removed at all.
+        :param min_block_words: Number of words from which a block with few links is content.
+        :param max_link_density: Share of the words of a block which may be the text of links before the block is
+                                 boilerplate.
+
+        """
+
+        self.enabled = enabled
+        self.min_block_words = max(min_block_words, 1)
+        self.max_link_density = min(max(max_link_density, 0.0), 1.0)
+
+    def remove_boilerplate(self, blocks: Optional[List[TextBlock]]) -> Tuple[Optional[str], int]:
+        """
+        Method which joins the blocks of the text of a page, leaving out the boilerplate.
+
+        :param blocks: Blocks of the text of the page in document order, or None if the page has no body.
+        :return: Tuple of the text of the content blocks (or None if the page has no body) and the number of bytes of
+                 the text removed.
+
+        """
+
+        if blocks is None:
+            return None, 0
+
+        full_text = " ".join(block.text for block in blocks)
+        if not self.enabled:
+            return full_text, 0
+
+        block_classes = self.classify_blocks(blocks=blocks)
+        if BlockClass.CONTENT not in block_classes:
+            return full_text, 0
+
+        text = " ".join(block.text for block, block_class in zip(blocks, block_classes)
+                        if block_class == BlockClass.CONTENT)
+
+        return text, len(full_text.encode("UTF-8")) - len(text.encode("UTF-8"))
+
+    def classify_blocks(self, blocks: List[TextBlock]) -> List[BlockClass]:
+        """
+        Method which decides for every block of the text of a page whether it is content or boilerplate.
+
+        :param blocks: Blocks of the text of the page in document order.
+        :return: List of the classes of the blocks.
+
+        """
+
+        block_classes = [self._classify_block(block=block) for block in blocks]
+
+        # the class of the closest block before every block which could be judged on its own
+        previous_classes = []
+        previous_class = BlockClass.BOILERPLATE
+        for block_class in block_classes:
+            previous_classes.append(previous_class)
+            if block_class != BlockClass.SHORT:
+                previous_class = block_class
+
+        next_class = BlockClass.BOILERPLATE
+        for index in range(len(blocks) - 1, -1, -1):
+            if (block_class := block_classes[index]) != BlockClass.SHORT:
+                next_class = block_class
+                continue
+
+            if previous_classes[index] == next_class:
+                block_classes[index] = next_class
+            else:
+                block_classes[index] = BlockClass.CONTENT if blocks[index].link_word_count == 0 \
+                    else BlockClass.BOILERPLATE
+
+        return block_classes
+
+    def _classify_block(self, block: TextBlock) -> BlockClass:
+        """
+        Method which judges a block on its own.
+
+        :param block: Block of the text of a page.
+        :return: Class of the block; `SHORT` if it can't be judged on its own.
+
+        """
+
+        if block.get_link_density() > self.max_link_density:
+            return BlockClass.BOILERPLATE
+
+        if block.word_count >= self.min_block_words:
+            return BlockClass.CONTENT
+
+        return BlockClass.SHORT
@@ -0,0 +1,218 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, List
+
+from src.utils.enums import FetchOutcome
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class ConcurrencyController:
+    """
+    Class which adapts the number of requests in flight to the state of the Tor network with AIMD (additive increase,
+    multiplicative decrease), the way TCP adapts its congestion window.
+
+    The requests are judged in rounds: a round ends when as many requests completed as the limit allowed in flight
+    (but at least `min_round_size`). If more than `max_failure_rate` of the requests of the round timed out or failed at
+    the proxy, the network is congested and the limit is multiplied by `decrease_factor`. Otherwise, if the requests of
+    the round didn't take more than `latency_tolerance` times as long as usual, the limit is raised by `increase_step`.
+    If they did, the limit is kept.
+
+    A single failure is not a signal on its own: a lot of the onion hosts are simply gone, and their requests fail
+    however healthy the network is.
+
+    The controller is used from the event loop of the asynchronous scraper, thus it has to be created there.
+
+    """
+
+    def __init__(self,
+                 min_limit: int,
+                 max_limit: int,
+                 initial_limit: int,
+                 increase_step: float,
+                 decrease_factor: float,
+                 max_failure_rate: float,
+                 latency_tolerance: float,
+                 min_round_size: int):
+        """
+        Initializer method.
+
+        :param min_limit: Lowest number of requests in flight the limit is cut to.
+        :param max_limit: Highest number of requests in flight the limit is raised to.
+        :param initial_limit: Number of requests in flight allowed at the start.
+        :param increase_step: Number the limit is raised by after a healthy round.
+        :param decrease_factor: Factor the limit is multiplied by after a congested round (between 0 and 1).
+        :param max_failure_rate: Share of the requests of a round which may time out or fail at the proxy without the
+                                 round being considered congested.
+        :param latency_tolerance: How many times longer than usual the requests of a round may take and still allow
+                                  raising the limit.
+        :param min_round_size: Minimum number of requests a round consists of, so a round at a low limit is not judged
+                               by a handful of requests.
+
+        """
+
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.increase_step = max(increase_step, 0.0)
+        self.decrease_factor = min(max(decrease_factor, 0.0), 1.0)
+        self.max_failure_rate = min(max(max_failure_rate, 0.0), 1.0)
+        self.latency_tolerance = max(latency_tolerance, 1.0)
+        self.min_round_size = max(min_round_size, 1)
+
+        self.limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        # outcomes of the current round
+        self._round_requests = 0
+        self._round_congestions = 0
+        self._round_latencies: List[float] = []
+
+        # latency of the network when it is not loaded, which the latency of a round is compared to
+        self._baseline_latency: Optional[float] = None
+
+        # statistics of the controller, exported with the metrics
+        self._last_failure_rate: Optional[float] = None
+        self._last_round_latency: Optional[float] = None
+        self._rounds = 0
+        self._increases = 0
+        self._decreases = 0
+        self._last_change_at = time.time()
+
+    def get_limit(self) -> int:
+        """
+        Method which returns the number of requests currently allowed in flight.
+
+        :return: Limit of the requests in flight.
+
+        """
+
+        return int(self.limit)
+
+    async def acquire(self):
+        """
+        Coroutine which waits until another request is allowed in flight, and takes its slot.
+
+        """
+
+        while self._in_flight >= self.get_limit():
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # the slot this waiter was woken up for goes to the next one
+                    self._wake_up_waiters()
+                else:
+                    self._waiters.remove(waiter)
+                raise
+
+        self._in_flight += 1
+
+    def release(self, outcome: FetchOutcome, latency: Optional[float] = None):
+        """
+        Method which gives back the slot of a request, and adapts the limit to the outcome of the request.
+
+        :param outcome: Outcome of the request; `SKIPPED` if no request was sent after all.
+        :param latency: Number of seconds the request took, if it was answered.
+
+        """
+
+        self._in_flight = max(self._in_flight - 1, 0)
+
+        if outcome != FetchOutcome.SKIPPED:
+            self._record(outcome=outcome, latency=latency)
+
+        self._wake_up_waiters()
+
+    def get_snapshot(self) -> Dict:
+        """
+        Method which returns the state of the controller.
+
+        :return: Dictionary containing the state and the statistics of the controller.
+
+        """
+
+        return {"limit": self.get_limit(),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "rounds": self._rounds,
+                "increases": self._increases,
+                "decreases": self._decreases,
+                "last_failure_rate": self._last_failure_rate,
+                "last_round_latency": self._last_round_latency,
+                "baseline_latency": self._baseline_latency,
+                "last_change_at": self._last_change_at}
+
+    def _record(self, outcome: FetchOutcome, latency: Optional[float]):
+        """
+        Method which adds the outcome of a request to the current round, and closes the round if it is complete.
+
+        :param outcome: Outcome of the request.
+        :param latency: Number of seconds the request took, if it was answered.
+
+        """
+
+        self._round_requests += 1
+        if outcome == FetchOutcome.CONGESTION:
+            self._round_congestions += 1
+        elif latency is not None:
+            self._round_latencies.append(latency)
+
+        if self._round_requests < max(self.get_limit(), self.min_round_size):
+            return
+
+        failure_rate = self._round_congestions / self._round_requests
+        round_latency = sorted(self._round_latencies)[len(self._round_latencies) // 2] \
+            if len(self._round_latencies) > 0 else None
+
+        previous_limit = self.get_limit()
+        if failure_rate > self.max_failure_rate:
+            self.limit = max(self.limit * self.decrease_factor, float(self.min_limit))
+            self._decreases += 1
+        elif round_latency is None or self._baseline_latency is None or \
+                round_latency <= self._baseline_latency * self.latency_tolerance:
+            self.limit = min(self.limit + self.increase_step, float(self.max_limit))
+            self._increases += 1
+
+        # the baseline is the latency of the network when it is not loaded: it drops to a faster round right away, but
+        # only slowly follows the slower ones, so the requests piling up stand out from it, while a lasting change of
+        # the network is eventually accepted
+        if round_latency is not None:
+            if self._baseline_latency is None or round_latency < self._baseline_latency:
+                self._baseline_latency = round_latency
+            else:
+                self._baseline_latency += 0.05 * (round_latency - self._baseline_latency)
+
+        if self.get_limit() != previous_limit:
+            self._last_change_at = time.time()
+            logger.info(f"Concurrency limit {'lowered' if self.get_limit() < previous_limit else 'raised'} from "
+                        f"{previous_limit} to {self.get_limit()} ({failure_rate:.0%} of the requests failed).")
+
+        self._rounds += 1
+        self._last_failure_rate = failure_rate
+        self._last_round_latency = round_latency
+
+        self._round_requests = 0
+        self._round_congestions = 0
+        self._round_latencies = []
+
+    def _wake_up_waiters(self):
+        """
+        Method which wakes up as many waiting requests as there are free slots.
+
+        """
+
+        free_slots = self.get_limit() - self._in_flight
+        while free_slots > 0 and len(self._waiters) > 0:
+            if not (waiter := self._waiters.popleft()).done():
+                waiter.set_result(None)
+                free_slots -= 1
@@ -0,0 +1,255 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict
+
+from src.utils.enums import HostState, MessageType
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class HostStatus:
+    """
+    Class holding the state of a host after a transition of its circuit breaker.
+
+    """
+
+    def __init__(self, host: str, state: HostState, consecutive_failures: int, down_until: Optional[float]):
+        """
+        Initializer method.
+
+        :param host: Host the status belongs to ('domain.onion').
+        :param state: New state of the circuit breaker of the host.
+        :param consecutive_failures: Number of requests to the host that failed in a row.
+        :param down_until: UNIX timestamp until which the host is considered down, None if it is up.
+
+        """
+
+        self.host = host
+        self.state = state
+        self.consecutive_failures = consecutive_failures
+        self.down_until = down_until
+
+    def to_message(self) -> Dict:
+        """
+        Method which converts the status into the message sent to the processors, so the scheduler can skip the hosts
+        which are down.
+
+        :return: Message dictionary.
+
+        """
+
+        return {"message_type": MessageType.HOST_STATUS.value,
+                "host": self.host,
+                "consecutive_failures": self.consecutive_failures,
+                "down_until": self.down_until}
+
+
+class HostCircuitBreaker:
+    """
+    Class which keeps track of the onion hosts that can't be reached, so the requests to a hidden service which is
+    offline don't each burn a full Tor timeout.
+
+    After `failure_threshold` requests to a host fail in a row (within `failure_window` seconds), the breaker of the
+    host opens and the requests to it are short-circuited for `down_time` seconds. After that, a single probe request is
+    let through (half-open state): if it succeeds, the breaker closes, otherwise it opens again for twice as long as
+    before, up to `max_down_time` seconds.
+
+    The state is kept in the SQLite database shared by the scrapers, the same way as the per-host limits.
+
+    """
+
+    def __init__(self,
+                 store_path: Optional[str],
+                 failure_threshold: int,
+                 failure_window: float,
+                 down_time: float,
+                 max_down_time: float,
+                 probe_timeout: float):
+        """
+        Initializer method.
+
+        :param store_path: Path of the SQLite database shared by the scrapers. None or an empty string keeps the state
+                           in memory, so only this process knows about the hosts which are down.
+        :param failure_threshold: Number of failed requests in a row after which a host is considered down. 0 disables
+                                  the circuit breaker.
+        :param failure_window: Number of seconds after which an earlier failure doesn't count anymore.
+        :param down_time: Number of seconds a host is considered down for when its breaker opens for the first time.
+        :param max_down_time: Maximum number of seconds a host is considered down for.
+        :param probe_timeout: Number of seconds after which a probe request is considered abandoned.
+
+        """
+
+        self.failure_threshold = max(failure_threshold, 0)
+        self.failure_window = failure_window
+        self.down_time = down_time
+        self.max_down_time = max(max_down_time, down_time)
+        self.probe_timeout = probe_timeout
+
+        if store_path is not None and len(store_path) > 0:
+            if len(directory := os.path.dirname(store_path)) > 0:
+                os.makedirs(directory, exist_ok=True)
+        else:
+            store_path = ":memory:"
+
+        self.store_path = store_path
+
+        # the connection is shared by the threads of the process, so its use has to be serialized
+        self._lock = threading.Lock()
+
+        # the processes wait for each other's transactions for at most 10 seconds
+        self._connection = sqlite3.connect(store_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS host_breakers "
+                                     "(host TEXT PRIMARY KEY, state INTEGER NOT NULL, failures INTEGER NOT NULL, "
+                                     "last_failure_at REAL NOT NULL, down_time REAL NOT NULL, "
+                                     "down_until REAL NOT NULL, probe_started_at REAL NOT NULL)")
+        except sqlite3.Error as e:
+            # every host is considered up until the store becomes usable
+            logger.warning(f"Couldn't initialize the host circuit breaker store '{store_path}': {e}")
+
+    def allow_request(self, host: str) -> bool:
+        """
+        Method which checks whether a request can be sent to a host. If the host has been down long enough, the request
+        is let through as the probe of the host.
+
+        :param host: Host the request is sent to ('domain.onion').
+        :return: True if the request can be sent, False if the host is considered down.
+
+        """
+
+        if self.failure_threshold == 0:
+            return True
+
+        now = time.time()
+
+        with self._lock:
+            try:
+                # the write lock is taken right away, so only one scraper can take the probe of a host
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                # if the store is unusable, we don't want to stop scraping altogether
+                logger.warning(f"Couldn't access the host circuit breaker store: {e}")
+                return True
+
+            try:
+                row = self._connection.execute("SELECT state, down_until, probe_started_at FROM host_breakers "
+                                               "WHERE host = ?", (host,)).fetchone()
+
+                if row is None or row[0] == HostState.CLOSED:
+                    allowed = True
+                elif row[0] == HostState.OPEN and now < row[1]:
+                    allowed = False
+                elif row[0] == HostState.HALF_OPEN and now - row[2] < self.probe_timeout:
+                    # another request is already probing the host
+                    allowed = False
+                else:
+                    self._connection.execute("UPDATE host_breakers SET state = ?, probe_started_at = ? WHERE host = ?",
+                                             (HostState.HALF_OPEN.value, now, host))
+                    logger.info(f"Probing host '{host}'.")
+                    allowed = True
+
+                self._connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't check the circuit breaker of host '{host}': {e}")
+                self._connection.execute("ROLLBACK")
+                return True
+
+            return allowed
+
+    def record_success(self, host: str) -> Optional[HostStatus]:
+        """
+        Method which records that a host could be reached.
+
+        :param host: Host the request was sent to.
+        :return: The new status of the host if it was considered down before, otherwise None.
+
+        """
+
+        if self.failure_threshold == 0:
+            return None
+
+        with self._lock:
+            try:
+                if (row := self._connection.execute("SELECT state FROM host_breakers WHERE host = ?",
+                                                    (host,)).fetchone()) is not None:
+                    # the row is only needed while the host is failing, a successful request resets it
+                    self._connection.execute("DELETE FROM host_breakers WHERE host = ?", (host,))
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't record success of host '{host}': {e}")
+                return None
+
+        if row is None or row[0] == HostState.CLOSED:
+            return None
+
+        logger.info(f"Host '{host}' is up again.")
+
+        return HostStatus(host=host, state=HostState.CLOSED, consecutive_failures=0, down_until=None)
+
+    def record_failure(self, host: str) -> Optional[HostStatus]:
+        """
+        Method which records that a host couldn't be reached, opening its circuit breaker if it failed too many times.
+
+        :param host: Host the request was sent to.
+        :return: The new status of the host if its breaker opened, otherwise None.
+
+        """
+
+        if self.failure_threshold == 0:
+            return None
+
+        now = time.time()
+
+        with self._lock:
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't access the host circuit breaker store: {e}")
+                return None
+
+            try:
+                row = self._connection.execute("SELECT state, failures, last_failure_at, down_time FROM host_breakers "
+                                               "WHERE host = ?", (host,)).fetchone()
+
+                state, failures, last_failure_at, down_time = row if row is not None else \
+                    (HostState.CLOSED.value, 0, now, 0.0)
+
+                # failures too far apart don't mean that the host is down
+                if state == HostState.CLOSED and now - last_failure_at > self.failure_window:
+                    failures = 0
+                failures += 1
+
+                status = None
+                if state == HostState.HALF_OPEN:
+                    # the probe failed, the host stays down for longer
+                    down_time = min(down_time * 2, self.max_down_time)
+                    status = HostStatus(host=host, state=HostState.OPEN, consecutive_failures=failures,
+                                        down_until=now + down_time)
+                elif state == HostState.CLOSED and failures >= self.failure_threshold:
+                    down_time = self.down_time
+                    status = HostStatus(host=host, state=HostState.OPEN, consecutive_failures=failures,
+                                        down_until=now + down_time)
+
+                # requests already in flight when the breaker opened don't extend the down time
+                new_state, down_until = (status.state, status.down_until) if status is not None else (state, 0.0)
+                self._connection.execute("INSERT INTO host_breakers (host, state, failures, last_failure_at, "
+                                         "down_time, down_until, probe_started_at) VALUES (?, ?, ?, ?, ?, ?, 0) "
+                                         "ON CONFLICT (host) DO UPDATE SET state = excluded.state, "
+                                         "failures = excluded.failures, last_failure_at = excluded.last_failure_at, "
+                                         "down_time = excluded.down_time, "
+                                         "down_until = MAX(host_breakers.down_until, excluded.down_until)",
+                                         (host, int(new_state), failures, now, down_time, down_until))
+                self._connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't record failure of host '{host}': {e}")
+                self._connection.execute("ROLLBACK")
+                return None
+
+        if status is not None:
+            logger.info(f"Host '{host}' is down for {down_time:.0f} seconds after {failures} failed requests.")
+
+        return status
@@ -0,0 +1,240 @@
+import bisect
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Optional
+
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class LatencyHistogram:
+    """
+    Class which keeps a rolling histogram of the latencies of a host: the samples of the current and the previous
+    window are counted, so the older samples age out without having to be stored one by one.
+
+    """
+
+    # upper bounds of the buckets in seconds; onion services answer anywhere from under a second to over a minute
+    BUCKET_BOUNDS = [0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.5, 10.0, 15.0, 20.0, 30.0, 45.0, 60.0, 90.0, 120.0, float("inf")]
+
+    def __init__(self, window: float):
+        """
+        Initializer method.
+
+        :param window: Number of seconds after which the current window is closed; the samples live for at most two
+                       windows.
+
+        """
+
+        self.window = window
+
+        self._current: List[int] = [0] * len(LatencyHistogram.BUCKET_BOUNDS)
+        self._previous: List[int] = [0] * len(LatencyHistogram.BUCKET_BOUNDS)
+        self._window_started_at = time.monotonic()
+
+    def record(self, latency: float):
+        """
+        Method which adds a sample to the histogram.
+
+        :param latency: Latency in seconds.
+
+        """
+
+        self._rotate()
+        self._current[bisect.bisect_left(LatencyHistogram.BUCKET_BOUNDS, latency)] += 1
+
+    def get_counts(self) -> List[int]:
+        """
+        Method which returns the number of samples in each bucket, over the current and the previous window.
+
+        :return: List of the counts, in the order of the bucket bounds.
+
+        """
+
+        self._rotate()
+
+        return [current + previous for current, previous in zip(self._current, self._previous)]
+
+    def get_percentile(self, percentile: float) -> Optional[float]:
+        """
+        Method which estimates a percentile of the latencies as the upper bound of the bucket containing it.
+
+        :param percentile: Percentile between 0 and 100.
+        :return: Estimated latency in seconds (infinite if it is beyond the last finite bucket), None if there are no
+                 samples.
+
+        """
+
+        counts = self.get_counts()
+        if (total := sum(counts)) == 0:
+            return None
+
+        rank = total * percentile / 100.0
+        cumulative = 0
+        for bound, count in zip(LatencyHistogram.BUCKET_BOUNDS, counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+
+        return LatencyHistogram.BUCKET_BOUNDS[-1]
+
+    def _rotate(self):
+        """
+        Method which closes the current window if it is over, dropping the samples of the previous one.
+
+        """
+
+        if (elapsed := time.monotonic() - self._window_started_at) < self.window:
+            return
+
+        # if no sample came for two windows, every sample is outdated
+        self._previous = self._current if elapsed < 2 * self.window else [0] * len(LatencyHistogram.BUCKET_BOUNDS)
+        self._current = [0] * len(LatencyHistogram.BUCKET_BOUNDS)
+        self._window_started_at = time.monotonic()
+
+
+class HostLatencyTracker:
+    """
+    Class which keeps a rolling latency histogram for every onion host, and derives the timeouts of the requests to a
+    host from them: a percentile of the time it took for the host to answer, multiplied by a factor, kept between a
+    floor and a ceiling. Slow but alive hosts get more time, while fast hosts which stop answering are given up on
+    sooner.
+
+    The latency of a request is the time until the headers of the response arrive, which includes building the
+    rendezvous circuit when there is no warm connection to the host. Requests that timed out count with the timeout they
+    had, so a host which got too little time gets more the next time.
+
+    """
+
+    def __init__(self,
+                 max_hosts: int,
+                 window: float,
+                 percentile: float,
+                 factor: float,
+                 min_timeout: float,
+                 max_timeout: float,
+                 min_samples: int,
+                 default_connect_timeout: float,
+                 default_read_timeout: float):
+        """
+        Initializer method.
+
+        :param max_hosts: Maximum number of hosts whose histogram is kept; the least recently used ones are dropped.
+        :param window: Number of seconds a histogram window lasts; samples live for at most two windows.
+        :param percentile: Percentile of the latencies the timeouts are derived from.
+        :param factor: Factor the percentile is multiplied by. 0 disables the adaptive timeouts.
+        :param min_timeout: Lowest timeout given to a host.
+        :param max_timeout: Highest timeout given to a host.
+        :param min_samples: Number of samples needed before the timeouts of a host are derived from its histogram.
+        :param default_connect_timeout: Connect timeout of the hosts without enough samples.
+        :param default_read_timeout: Read timeout of the hosts without enough samples.
+
+        """
+
+        self.max_hosts = max(max_hosts, 1)
+        self.window = window
+        self.percentile = min(max(percentile, 0.0), 100.0)
+        self.factor = max(factor, 0.0)
+        self.min_timeout = min_timeout
+        self.max_timeout = max(max_timeout, min_timeout)
+        self.min_samples = max(min_samples, 1)
+        self.default_timeouts = (default_connect_timeout, default_read_timeout)
+
+        self._histograms: "OrderedDict[str, LatencyHistogram]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, host: str, latency: float):
+        """
+        Method which records the latency of a request to a host.
+
+        :param host: Host the request was sent to ('domain.onion').
+        :param latency: Number of seconds it took for the host to answer, or the timeout of the request if it timed out.
+
+        """
+
+        with self._lock:
+            if (histogram := self._histograms.get(host)) is None:
+                histogram = LatencyHistogram(window=self.window)
+                self._histograms[host] = histogram
+
+                # drop the histogram of the least recently used host if there are too many of them
+                if len(self._histograms) > self.max_hosts:
+                    self._histograms.popitem(last=False)
+            else:
+                self._histograms.move_to_end(host)
+
+            histogram.record(latency=latency)
+
+    def get_timeouts(self, host: str) -> Tuple[float, float]:
+        """
+        Method which returns the timeouts of the next request to a host.
+
+        :param host: Host the request is sent to ('domain.onion').
+        :return: Tuple of the connect and the read timeout in seconds.
+
+        """
+
+        if self.factor == 0:
+            return self.default_timeouts
+
+        with self._lock:
+            if (histogram := self._histograms.get(host)) is None or sum(histogram.get_counts()) < self.min_samples:
+                return self.default_timeouts
+
+            latency = histogram.get_percentile(percentile=self.percentile)
+
+        timeout = min(max(latency * self.factor, self.min_timeout), self.max_timeout)
+
+        # the same budget applies to building the connection and to waiting for the answer
+        return timeout, timeout
+
+    def get_snapshot(self) -> Dict:
+        """
+        Method which returns the histograms of the hosts together with their tail latencies and current timeouts.
+
+        :return: Dictionary containing the histograms by host.
+
+        """
+
+        with self._lock:
+            histograms = list(self._histograms.items())
+
+        snapshot = {}
+        for host, histogram in histograms:
+            with self._lock:
+                counts = histogram.get_counts()
+                p50, p95, p99 = [histogram.get_percentile(percentile=p) for p in (50, 95, 99)]
+
+            if (samples := sum(counts)) == 0:
+                continue
+
+            snapshot[host] = {
+                "samples": samples,
+                "p50": HostLatencyTracker._to_json_number(value=p50),
+                "p95": HostLatencyTracker._to_json_number(value=p95),
+                "p99": HostLatencyTracker._to_json_number(value=p99),
+                "timeouts": self.get_timeouts(host=host),
+                "buckets": {("+Inf" if bound == float("inf") else str(bound)): count
+                            for bound, count in zip(LatencyHistogram.BUCKET_BOUNDS, counts)}
+            }
+
+        return {"percentile": self.percentile, "factor": self.factor, "hosts": snapshot}
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def _to_json_number(value: Optional[float]) -> Optional[float]:
+        """
+        Function which converts a latency into a value JSON can represent.
+
+        :param value: Latency in seconds.
+        :return: The latency, or None if it is infinite or unknown.
+
+        """
+
+        return value if value is not None and value != float("inf") else None
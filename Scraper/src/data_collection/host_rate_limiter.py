@@ -0,0 +1,189 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Dict
+
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class HostRateLimiter:
+    """
+    Class which limits how hard the scrapers hit a single onion host: at most `max_requests_per_host` requests to a
+    host can be in progress at the same time, and consecutive requests to a host have to be at least
+    `min_request_interval` seconds apart.
+
+    The scrapers coordinate through a SQLite database on a volume they all mount. Every request holds a lease on its
+    host while it is in progress; leases of crashed scrapers expire after `lease_timeout` seconds. Without a shared
+    database, the limits only apply to the scraper process itself.
+
+    """
+
+    def __init__(self,
+                 store_path: Optional[str],
+                 max_requests_per_host: int,
+                 min_request_interval: float,
+                 lease_timeout: float):
+        """
+        Initializer method.
+
+        :param store_path: Path of the SQLite database shared by the scrapers. None or an empty string keeps the state
+                           in memory, so only the requests of this process are limited.
+        :param max_requests_per_host: Maximum number of requests in progress to the same host. 0 means no limit.
+        :param min_request_interval: Minimum number of seconds between the start of two requests to the same host.
+        :param lease_timeout: Number of seconds after which a lease is considered abandoned.
+
+        """
+
+        self.max_requests_per_host = max(max_requests_per_host, 0)
+        self.min_request_interval = max(min_request_interval, 0.0)
+        self.lease_timeout = lease_timeout
+
+        if store_path is not None and len(store_path) > 0:
+            if len(directory := os.path.dirname(store_path)) > 0:
+                os.makedirs(directory, exist_ok=True)
+        else:
+            store_path = ":memory:"
+
+        self.store_path = store_path
+
+        # the connection is shared by the threads of the process, so its use has to be serialized
+        self._lock = threading.Lock()
+
+        # the processes wait for each other's transactions for at most 10 seconds
+        self._connection = sqlite3.connect(store_path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        try:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS host_leases "
+                                     "(lease_id TEXT PRIMARY KEY, host TEXT NOT NULL, acquired_at REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS host_leases_host ON host_leases (host)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS host_requests "
+                                     "(host TEXT PRIMARY KEY, last_request_at REAL NOT NULL)")
+        except sqlite3.Error as e:
+            # every request is allowed until the store becomes usable
+            logger.warning(f"Couldn't initialize the host rate limiter store '{store_path}': {e}")
+
+        # counters for the statistics of this process
+        self._leases_granted = 0
+        self._leases_denied = 0
+
+    def acquire(self, host: str, max_wait: float = 0.0) -> Optional[str]:
+        """
+        Method which tries to acquire a lease for sending a request to a host.
+
+        :param host: Host the request is sent to ('domain.onion').
+        :param max_wait: Maximum number of seconds to wait for the budget of the host, e.g. for the interval after the
+                         previous request of the same batch of URLs to pass. 0 doesn't wait.
+        :return: ID of the lease, or None if the budget of the host is exhausted and the request has to be deferred.
+
+        """
+
+        deadline = time.monotonic() + max(max_wait, 0.0)
+
+        while (lease_id := self._try_acquire(host=host)) is None and (remaining := deadline - time.monotonic()) > 0:
+            # the interval is the usual reason to wait, so the budget is checked again about when it passes
+            time.sleep(min(remaining, max(self.min_request_interval / 4, 0.05)))
+
+        if lease_id is None:
+            with self._lock:
+                self._leases_denied += 1
+
+        return lease_id
+
+    def _try_acquire(self, host: str) -> Optional[str]:
+        """
+        Method which tries to acquire a lease for sending a request to a host, without waiting.
+
+        :param host: Host the request is sent to ('domain.onion').
+        :return: ID of the lease, or None if the budget of the host is exhausted.
+
+        """
+
+        now = time.time()
+
+        with self._lock:
+            try:
+                # the write lock is taken right away, so the check and the insertion are atomic across the scrapers
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                # if the store is unusable, we don't want to stop scraping altogether
+                logger.warning(f"Couldn't access the host rate limiter store: {e}")
+                return str(uuid.uuid4())
+
+            try:
+                self._connection.execute("DELETE FROM host_leases WHERE host = ? AND acquired_at < ?",
+                                         (host, now - self.lease_timeout))
+
+                if not self._host_has_budget(host=host, now=now):
+                    self._connection.execute("ROLLBACK")
+                    return None
+
+                lease_id = str(uuid.uuid4())
+                self._connection.execute("INSERT INTO host_leases (lease_id, host, acquired_at) VALUES (?, ?, ?)",
+                                         (lease_id, host, now))
+                self._connection.execute("INSERT INTO host_requests (host, last_request_at) VALUES (?, ?) "
+                                         "ON CONFLICT (host) DO UPDATE SET last_request_at = excluded.last_request_at",
+                                         (host, now))
+                self._connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't acquire lease for host '{host}': {e}")
+                self._connection.execute("ROLLBACK")
+                return str(uuid.uuid4())
+
+            self._leases_granted += 1
+            return lease_id
+
+    def release(self, lease_id: str):
+        """
+        Method which releases a lease once its request is finished.
+
+        :param lease_id: ID of the lease.
+
+        """
+
+        with self._lock:
+            try:
+                self._connection.execute("DELETE FROM host_leases WHERE lease_id = ?", (lease_id,))
+            except sqlite3.Error as e:
+                # the lease will expire on its own
+                logger.warning(f"Couldn't release lease '{lease_id}': {e}")
+
+    def get_stats(self) -> Dict:
+        """
+        Method which returns the statistics of the rate limiter in this process.
+
+        :return: Dictionary containing the statistics.
+
+        """
+
+        with self._lock:
+            return {"leases_granted": self._leases_granted, "leases_denied": self._leases_denied}
+
+    def _host_has_budget(self, host: str, now: float) -> bool:
+        """
+        Method which checks whether a new request can be sent to a host. Has to be called within the transaction of
+        `acquire`.
+
+        :param host: Host the request is sent to.
+        :param now: Current time.
+        :return: True if the request can be sent, otherwise False.
+
+        """
+
+        if self.max_requests_per_host > 0:
+            (active_leases,) = self._connection.execute("SELECT COUNT(*) FROM host_leases WHERE host = ?",
+                                                        (host,)).fetchone()
+            if active_leases >= self.max_requests_per_host:
+                return False
+
+        if self.min_request_interval > 0:
+            row = self._connection.execute("SELECT last_request_at FROM host_requests WHERE host = ?",
+                                           (host,)).fetchone()
+            if row is not None and now - row[0] < self.min_request_interval:
+                return False
+
+        return True
@@ -0,0 +1,818 @@
+import re
+from html.parser import HTMLParser
+from typing import Optional, List, Dict
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from bs4.dammit import UnicodeDammit
+from bs4.element import PreformattedString
+
+from src.utils.enums import ParserBackend, TextExtractor
+from src.utils.logger import get_logger
+
+# lxml is optional; if it is not installed, every page is parsed with BeautifulSoup
+try:
+    import lxml.html
+    from lxml.etree import ParserError, iterwalk, HTMLParser as LxmlHTMLParser
+
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# get logger
+logger = get_logger()
+
+# regex used for checking whether a document has a body tag, on its decoded markup
+BODY_TAG_REGEX = re.compile(r"<body[\s>/]", re.IGNORECASE)
+
+# XML declaration at the start of XHTML pages; lxml refuses unicode strings which declare an encoding
+XML_DECLARATION_REGEX = re.compile(r"^\s*<\?xml[^>]*\?>")
+
+# elements whose content is not part of the text of a page: code, templates, fallbacks for browsers without JavaScript
+# and the navigation repeated on every page of a site
+SKIPPED_TEXT_TAGS = frozenset({"script", "style", "noscript", "template", "nav", "head"})
+
+# elements whose content is separated from the surrounding text, the same way html2text puts them on separate lines
+BLOCK_TEXT_TAGS = frozenset({"address", "article", "aside", "blockquote", "body", "br", "caption", "dd", "details",
+                             "dialog", "div", "dl", "dt", "fieldset", "figcaption", "figure", "footer", "form", "h1",
+                             "h2", "h3", "h4", "h5", "h6", "header", "hr", "legend", "li", "main", "menu", "ol", "p",
+                             "pre", "section", "summary", "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul"})
+
+# elements which can't have content, thus they are never closed
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "meta", "param",
+                       "source", "track", "wbr"})
+
+# regex used for finding the start and end tags when estimating how deeply the elements of a page are nested
+TAG_NAME_REGEX = re.compile(rb"<(/?)([a-zA-Z][a-zA-Z0-9]*)")
+
+# error reported by libxml2 when a page is nested deeper than it builds trees
+LXML_DEPTH_ERROR = "Excessive depth in document"
+
+# regex used for collapsing the runs of whitespace in the text collected by the streaming parser; unlike splitting the
+# text into words, it keeps the whitespace at the ends of the text
+WHITESPACE_REGEX = re.compile(r"\s+")
+
+# number of characters fed to the streaming parser at once
+STREAMING_CHUNK_SIZE = 65536
+
+# number of pieces of text the streaming parser buffers before joining them; a large page is reported in millions of
+# small pieces, which take several times more memory as separate strings than joined
+STREAMING_TEXT_BUFFER_SIZE = 4096
+
+
+class TextBlock:
+    """
+    Class holding a block of the visible text of a page (e.g. a paragraph, a list item or a table cell), together with
+    the numbers which tell whether it is boilerplate.
+
+    """
+
+    def __init__(self, text: str, word_count: int, link_word_count: int):
+        """
+        Initializer method.
+
+        :param text: Text of the block with the whitespace collapsed.
+        :param word_count: Number of words in the block.
+        :param link_word_count: Number of the words of the block which are the text of a link.
+
+        """
+
+        self.text = text
+        self.word_count = word_count
+        self.link_word_count = link_word_count
+
+    def get_link_density(self) -> float:
+        """
+        Method which returns the share of the words of the block which are the text of a link.
+
+        :return: Link density between 0.0 and 1.0.
+
+        """
+
+        return min(self.link_word_count / self.word_count, 1.0) if self.word_count > 0 else 0.0
+
+
+class ParsedPage:
+    """
+    Class holding the elements of a page which are needed for extracting its relevant content, independently of the
+    parser backend that produced them.
+
+    """
+
+    def __init__(self,
+                 links: List[Optional[str]],
+                 title_html: Optional[str],
+                 body_html: Optional[str],
+                 meta_tags: List[Dict],
+                 title_text: Optional[str] = None,
+                 body_text: Optional[str] = None,
+                 body_blocks: Optional[List[TextBlock]] = None):
+        """
+        Initializer method.
+
+        :param links: References present in the anchor(a) tags of the page, in document order.
+        :param title_html: HTML string of the title tag, if present.
+        :param body_html: HTML string of the body tag, if present.
+        :param meta_tags: List of the meta tags of the page in {"key": <name>, "value": <content>} format.
+        :param title_text: Text of the title tag, if present and the text was extracted while parsing.
+        :param body_text: Visible text of the body tag, if present and the text was extracted while parsing.
+        :param body_blocks: Blocks of the visible text of the body tag, if the text was extracted from a parsed tree.
+
+        """
+
+        self.links = links
+        self.title_html = title_html
+        self.body_html = body_html
+        self.meta_tags = meta_tags
+        self.title_text = title_text
+        self.body_text = body_text
+        self.body_blocks = body_blocks
+
+
+def get_parser_backend(name: str) -> ParserBackend:
+    """
+    Function which returns the parser backend matching a name, falling back to BeautifulSoup if the backend is unknown
+    or its library is not installed.
+
+    :param name: Name of the parser backend.
+    :return: ParserBackend object.
+
+    """
+
+    try:
+        backend = ParserBackend(name.strip().lower())
+    except ValueError:
+        logger.warning(f"Unknown parser backend '{name}'! Falling back to '{ParserBackend.BEAUTIFULSOUP.value}'.")
+        return ParserBackend.BEAUTIFULSOUP
+
+    if backend == ParserBackend.LXML and not LXML_AVAILABLE:
+        logger.warning(f"lxml is not installed! Falling back to '{ParserBackend.BEAUTIFULSOUP.value}'.")
+        return ParserBackend.BEAUTIFULSOUP
+
+    return backend
+
+
+def get_text_extractor(name: str) -> TextExtractor:
+    """
+    Function which returns the text extractor matching a name, falling back to html2text if the extractor is unknown.
+
+    :param name: Name of the text extractor.
+    :return: TextExtractor object.
+
+    """
+
+    try:
+        return TextExtractor(name.strip().lower())
+    except ValueError:
+        logger.warning(f"Unknown text extractor '{name}'! Falling back to '{TextExtractor.HTML2TEXT.value}'.")
+        return TextExtractor.HTML2TEXT
+
+
+def select_parser_backend(content: bytes, backend: ParserBackend, max_tree_size: int, max_tree_depth: int) \
+        -> ParserBackend:
+    """
+    Function which chooses the backend a page is parsed with: the pages which are too large or too deeply nested for
+    building a tree of them are parsed with the streaming backend instead of the configured one.
+
+    The nesting depth is only estimated for BeautifulSoup, which can run out of stack on deeply nested trees; lxml
+    notices on its own when a page is nested deeper than it supports, and the page is parsed in streaming mode then.
+
+    :param content: Raw content of the page.
+    :param backend: Configured parser backend.
+    :param max_tree_size: Size in bytes above which a page is parsed with the streaming backend. 0 means no limit.
+    :param max_tree_depth: Estimated nesting depth above which a page is parsed with the streaming backend instead of
+                           BeautifulSoup. 0 means no limit.
+    :return: ParserBackend object.
+
+    """
+
+    if backend == ParserBackend.STREAMING:
+        return backend
+
+    if 0 < max_tree_size < len(content):
+        logger.info(f"Page of {len(content)} bytes is too large for building a tree, parsing it in streaming mode.")
+        return ParserBackend.STREAMING
+
+    if backend == ParserBackend.BEAUTIFULSOUP and max_tree_depth > 0 and \
+            estimate_nesting_depth(content=content, limit=max_tree_depth) > max_tree_depth:
+        logger.info(f"Page is nested deeper than {max_tree_depth} elements, parsing it in streaming mode.")
+        return ParserBackend.STREAMING
+
+    return backend
+
+
+def estimate_nesting_depth(content: bytes, limit: int) -> int:
+    """
+    Function which estimates how deeply the elements of a page are nested, without parsing it.
+
+    The tags are only counted, thus the estimation is on the high side for pages which leave elements open (e.g.
+    paragraphs or list items) and the parser would close on its own; such pages are rather parsed in streaming mode
+    than lose part of their content.
+
+    :param content: Raw content of the page.
+    :param limit: Depth above which the estimation stops.
+    :return: Estimated nesting depth, at most one more than the limit.
+
+    """
+
+    # a page can't be nested deeper than the number of its tags, which is cheap to count
+    if (tag_count := content.count(b"<")) <= limit:
+        return tag_count
+
+    depth = 0
+    max_depth = 0
+    for closing, name in TAG_NAME_REGEX.findall(content):
+        if len(closing) > 0:
+            depth = max(depth - 1, 0)
+        elif name.lower().decode("ascii") not in VOID_TAGS:
+            depth += 1
+            if depth > max_depth:
+                if (max_depth := depth) > limit:
+                    break
+
+    return max_depth
+
+
+def parse_page(content: bytes, backend: ParserBackend, extract_text: bool = False) -> ParsedPage:
+    """
+    Function which parses the raw content of a page with the specified backend.
+
+    If the lxml backend fails to parse the page, BeautifulSoup is used instead; if the page is nested too deeply for
+    lxml, the streaming backend. The streaming backend always extracts the text of the page, as it doesn't build a tree
+    which could be serialized.
+
+    :param content: Raw content of the page.
+    :param backend: Parser backend to be used.
+    :param extract_text: If True, the text of the title and the body is extracted from the parsed tree instead of
+                         serializing them back to HTML.
+    :return: ParsedPage object.
+
+    """
+
+    if backend == ParserBackend.STREAMING:
+        return parse_with_streaming(content=content)
+
+    if backend == ParserBackend.LXML:
+        try:
+            if (parsed_page := parse_with_lxml(content=content, extract_text=extract_text)) is not None:
+                return parsed_page
+
+            logger.info("Page is nested too deeply for lxml, parsing it in streaming mode.")
+            return parse_with_streaming(content=content)
+        except Exception as e:
+            logger.warning(f"lxml couldn't parse page, falling back to BeautifulSoup: {e}")
+
+    return parse_with_beautifulsoup(content=content, extract_text=extract_text)
+
+
+def parse_with_beautifulsoup(content: bytes, extract_text: bool = False) -> ParsedPage:
+    """
+    Function which parses the raw content of a page with BeautifulSoup using the pure-Python html.parser.
+
+    :param content: Raw content of the page.
+    :param extract_text: If True, the text of the title and the body is extracted instead of their HTML.
+    :return: ParsedPage object.
+
+    """
+
+    parsed_content = BeautifulSoup(content, "html.parser")
+
+    # we extract only the references present in anchor(a) tags
+    links = [tag.get('href') for tag in parsed_content.findAll('a')]
+
+    # we are going for name here
+    meta_tags = [{"key": tag.get('name'), "value": tag.get("content")} for tag in parsed_content.findAll('meta')]
+
+    if extract_text:
+        title_text = _join_text(parts=[parsed_content.title.get_text()]) if parsed_content.title is not None else None
+        body_blocks = _extract_text_from_soup(tag=parsed_content.body) if parsed_content.body is not None else None
+
+        return ParsedPage(links=links, title_html=None, body_html=None, meta_tags=meta_tags, title_text=title_text,
+                          body_text=_join_blocks(blocks=body_blocks), body_blocks=body_blocks)
+
+    title_html = str(parsed_content.title).strip() if parsed_content.title is not None else None
+
+    body_html = str(parsed_content.body).strip() if parsed_content.body is not None else None
+
+    return ParsedPage(links=links, title_html=title_html, body_html=body_html, meta_tags=meta_tags)
+
+
+def parse_with_lxml(content: bytes, extract_text: bool = False) -> Optional[ParsedPage]:
+    """
+    Function which parses the raw content of a page with lxml, collecting the links, title, body and meta tags in a
+    single traversal of the document.
+
+    :param content: Raw content of the page.
+    :param extract_text: If True, the text of the title and the body is extracted instead of their HTML.
+    :return: ParsedPage object, or None if the page is nested deeper than lxml builds trees.
+
+    """
+
+    # decode the content the same way BeautifulSoup does, so both backends see the same text
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+
+    if markup is None or len(markup.strip()) == 0:
+        return ParsedPage(links=[], title_html=None, body_html=None, meta_tags=[])
+
+    # a parser of its own for every page, as its error log tells whether the page was parsed completely
+    parser = lxml.html.HTMLParser()
+
+    try:
+        # the markup is decoded already, the encoding declared by the XML declaration doesn't apply to it anymore
+        root = lxml.html.document_fromstring(XML_DECLARATION_REGEX.sub("", markup, count=1), parser=parser)
+    except ParserError:
+        # the document has no elements at all
+        return ParsedPage(links=[], title_html=None, body_html=None, meta_tags=[])
+
+    # libxml2 stops building the tree 256 levels deep, silently dropping the rest of the page
+    if any(LXML_DEPTH_ERROR in error.message for error in parser.error_log):
+        return None
+
+    links = []
+    meta_tags = []
+    title_element = None
+    body_element = None
+
+    for element in root.iter():
+        tag = element.tag
+
+        # comments and processing instructions don't have string tags
+        if not isinstance(tag, str):
+            continue
+
+        if tag == "a":
+            links.append(element.get("href"))
+        elif tag == "meta":
+            meta_tags.append({"key": element.get("name"), "value": element.get("content")})
+        elif tag == "title" and title_element is None:
+            title_element = element
+        elif tag == "body" and body_element is None:
+            body_element = element
+
+    # lxml creates a body for documents that don't have one; html.parser doesn't, and we want both backends to
+    # produce the same results
+    if body_element is not None and BODY_TAG_REGEX.search(markup) is None:
+        body_element = None
+
+    if extract_text:
+        title_text = _join_text(parts=[title_element.text_content()]) if title_element is not None else None
+        body_blocks = _extract_text_from_element(element=body_element) if body_element is not None else None
+
+        return ParsedPage(links=links, title_html=None, body_html=None, meta_tags=meta_tags, title_text=title_text,
+                          body_text=_join_blocks(blocks=body_blocks), body_blocks=body_blocks)
+
+    title_html = _element_to_string(element=title_element) if title_element is not None else None
+
+    body_html = _element_to_string(element=body_element) if body_element is not None else None
+
+    return ParsedPage(links=links, title_html=title_html, body_html=body_html, meta_tags=meta_tags)
+
+
+def parse_with_streaming(content: bytes) -> ParsedPage:
+    """
+    Function which parses the raw content of a page with a streaming (SAX-style) parser, which reports the elements as
+    they are read instead of building a tree of the document.
+
+    The memory used doesn't depend on how the elements are nested, only on the size of the text and the links
+    collected, and nothing is recursive, so pages of any depth can be parsed. lxml is used if it is installed,
+    otherwise the pure-Python `html.parser`.
+
+    :param content: Raw content of the page.
+    :return: ParsedPage object, with the text of the title and the body extracted.
+
+    """
+
+    # decode the content the same way the other backends do, so they all see the same text
+    markup = UnicodeDammit(content, is_html=True).unicode_markup
+
+    if markup is None or len(markup.strip()) == 0:
+        return StreamingPageParser(has_body=False).close()
+
+    page_parser = StreamingPageParser(has_body=BODY_TAG_REGEX.search(markup) is not None)
+
+    # lxml reports the end of every element, closing the ones left open the same way as when building a tree; unlike
+    # its tree builder, it doesn't stop at 256 levels of nesting
+    parser = LxmlHTMLParser(target=page_parser) if LXML_AVAILABLE else StandardLibraryEventParser(target=page_parser)
+
+    for start in range(0, len(markup), STREAMING_CHUNK_SIZE):
+        parser.feed(markup[start:start + STREAMING_CHUNK_SIZE])
+
+    return parser.close()
+
+
+class StreamingPageParser:
+    """
+    Class which collects the elements of a page needed for extracting its relevant content from the events of a
+    streaming parser: the links, the meta tags, and the text of the title and the body, the latter the same way as the
+    fast text extractor does it.
+
+    Its methods follow the parser target interface of lxml.
+
+    """
+
+    def __init__(self, has_body: bool):
+        """
+        Initializer method.
+
+        :param has_body: Whether the page has a body tag; the parsers report one even if the page doesn't, but we want
+                         the same results as with the other backends.
+
+        """
+
+        self.has_body = has_body
+
+        self.links: List[Optional[str]] = []
+        self.meta_tags: List[Dict] = []
+
+        self._title_parts: Optional[List[str]] = None
+        self._body_parts: List[str] = []
+        self._body_chunks: List[str] = []
+
+        self._in_title = False
+        self._body_depth = 0
+        self._skipped_depth = 0
+
+    def start(self, tag: str, attrib: Dict):
+        """
+        Method which handles the start of an element.
+
+        :param tag: Name of the element.
+        :param attrib: Attributes of the element.
+
+        """
+
+        if tag == "a":
+            self.links.append(attrib.get("href"))
+        elif tag == "meta":
+            self.meta_tags.append({"key": attrib.get("name"), "value": attrib.get("content")})
+        elif tag == "title" and self._title_parts is None:
+            self._title_parts = []
+            self._in_title = True
+        elif tag == "body":
+            self._body_depth += 1
+
+        if self._body_depth == 0:
+            return
+
+        if tag in SKIPPED_TEXT_TAGS:
+            self._skipped_depth += 1
+            self._body_parts.append("\n")
+        elif tag in BLOCK_TEXT_TAGS:
+            self._body_parts.append("\n")
+
+    def end(self, tag: str):
+        """
+        Method which handles the end of an element.
+
+        :param tag: Name of the element.
+
+        """
+
+        if tag == "title":
+            self._in_title = False
+
+        if self._body_depth == 0:
+            return
+
+        if tag in SKIPPED_TEXT_TAGS:
+            self._skipped_depth = max(self._skipped_depth - 1, 0)
+        elif tag in BLOCK_TEXT_TAGS:
+            self._body_parts.append("\n")
+
+        if tag == "body":
+            self._body_depth -= 1
+
+    def data(self, data: str):
+        """
+        Method which handles a piece of text.
+
+        :param data: Text of the page.
+
+        """
+
+        if self._in_title:
+            self._title_parts.append(data)
+        elif self._body_depth > 0 and self._skipped_depth == 0:
+            self._body_parts.append(data)
+
+            if len(self._body_parts) >= STREAMING_TEXT_BUFFER_SIZE:
+                self._flush_body_parts()
+
+    def close(self) -> ParsedPage:
+        """
+        Method which is called at the end of the document.
+
+        :return: ParsedPage object.
+
+        """
+
+        self._flush_body_parts()
+
+        title_text = _join_text(parts=self._title_parts) if self._title_parts is not None else None
+
+        # the chunks are collapsed already; collapsing the whole text again would take as much memory as the tree
+        body_text = "".join(self._body_chunks).rstrip(" ") if self.has_body else None
+
+        return ParsedPage(links=self.links, title_html=None, body_html=None, meta_tags=self.meta_tags,
+                          title_text=title_text, body_text=body_text)
+
+    def _flush_body_parts(self):
+        """
+        Method which joins the buffered pieces of the text of the body into a single chunk, with the whitespace
+        collapsed.
+
+        """
+
+        if len(self._body_parts) == 0:
+            return
+
+        chunk = WHITESPACE_REGEX.sub(" ", "".join(self._body_parts))
+        self._body_parts = []
+
+        # the whitespace at the ends of a chunk is kept, so the words of adjacent chunks stay separated, unless the text
+        # so far is empty or already ends with a space
+        if len(self._body_chunks) == 0 or self._body_chunks[-1].endswith(" "):
+            chunk = chunk.lstrip(" ")
+
+        if len(chunk) > 0:
+            self._body_chunks.append(chunk)
+
+
+class StandardLibraryEventParser(HTMLParser):
+    """
+    Class which feeds the events of the pure-Python `html.parser` to a parser target, used when lxml is not installed.
+
+    `html.parser` reports the tags exactly as they are in the page, thus the elements left open are closed here, when
+    an element containing them ends.
+
+    """
+
+    def __init__(self, target: StreamingPageParser):
+        """
+        Initializer method.
+
+        :param target: Target receiving the events.
+
+        """
+
+        super().__init__(convert_charrefs=True)
+
+        self.target = target
+
+        # names of the open elements, and how many times each of them is open, for finding the matching start tag of
+        # an end tag without searching the stack
+        self._open_tags: List[str] = []
+        self._open_tag_counts: Dict[str, int] = {}
+
+    def handle_starttag(self, tag: str, attrs: List):
+        """
+        Method which handles a start tag.
+
+        :param tag: Name of the element.
+        :param attrs: List of the (name, value) pairs of the attributes of the element.
+
+        """
+
+        self.target.start(tag, dict(attrs))
+
+        if tag in VOID_TAGS:
+            self.target.end(tag)
+        else:
+            self._open_tags.append(tag)
+            self._open_tag_counts[tag] = self._open_tag_counts.get(tag, 0) + 1
+
+    def handle_startendtag(self, tag: str, attrs: List):
+        """
+        Method which handles a self-closing tag.
+
+        :param tag: Name of the element.
+        :param attrs: List of the (name, value) pairs of the attributes of the element.
+
+        """
+
+        self.target.start(tag, dict(attrs))
+        self.target.end(tag)
+
+    def handle_endtag(self, tag: str):
+        """
+        Method which handles an end tag.
+
+        :param tag: Name of the element.
+
+        """
+
+        # end tags without a matching start tag are ignored
+        if self._open_tag_counts.get(tag, 0) > 0:
+            self._close_until(tag=tag)
+
+    def handle_data(self, data: str):
+        """
+        Method which handles a piece of text.
+
+        :param data: Text of the page.
+
+        """
+
+        self.target.data(data)
+
+    def close(self) -> ParsedPage:
+        """
+        Method which finishes parsing the document, closing the elements left open.
+
+        :return: ParsedPage object.
+
+        """
+
+        super().close()
+
+        while len(self._open_tags) > 0:
+            self.target.end(self._open_tags.pop())
+
+        return self.target.close()
+
+    def _close_until(self, tag: str):
+        """
+        Method which closes the open elements up to and including the last element with the specified name.
+
+        :param tag: Name of the element.
+
+        """
+
+        while len(self._open_tags) > 0:
+            open_tag = self._open_tags.pop()
+            self._open_tag_counts[open_tag] -= 1
+            self.target.end(open_tag)
+
+            if open_tag == tag:
+                return
+
+
+def _element_to_string(element) -> str:  # the element is an lxml HtmlElement, not annotated as lxml is optional
+    """
+    Function which serializes an lxml element to an HTML string, without the text following the element.
+
+    :param element: Element to be serialized.
+    :return: HTML string.
+
+    """
+
+    return lxml.html.tostring(element, encoding="unicode", with_tail=False).strip()
+
+
+def _extract_text_from_element(element) -> List[TextBlock]:  # an lxml HtmlElement, not annotated as lxml is optional
+    """
+    Function which extracts the visible text of an lxml element in a single walk of its subtree, without serializing
+    it or building any intermediate representation.
+
+    :param element: Element the text is extracted from.
+    :return: Blocks of the text of the element, with the whitespace collapsed.
+
+    """
+
+    blocks = []
+    parts = []
+    link_parts = []
+    link_depth = 0
+
+    # the walk is iterative, so deeply nested pages don't hit the recursion limit
+    walker = iterwalk(element, events=("start", "end", "comment", "pi"))
+    for event, node in walker:
+        tag = node.tag
+
+        if event == "start":
+            if tag in SKIPPED_TEXT_TAGS:
+                walker.skip_subtree()
+                _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+                continue
+
+            if tag == "br":
+                # the lines of a post are part of the same block
+                parts.append("\n")
+            elif tag in BLOCK_TEXT_TAGS:
+                _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+            elif tag == "a":
+                link_depth += 1
+
+            if (text := node.text) is not None:
+                parts.append(text)
+                if link_depth > 0:
+                    link_parts.append(text)
+
+            continue
+
+        # the text following an element (its tail) belongs to its parent; the end event of a skipped element is
+        # reported as well
+        if event == "end":
+            if tag == "br":
+                parts.append("\n")
+            elif tag in BLOCK_TEXT_TAGS:
+                _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+            elif tag == "a":
+                link_depth = max(link_depth - 1, 0)
+
+        if (text := node.tail) is not None and node is not element:
+            parts.append(text)
+            if link_depth > 0:
+                link_parts.append(text)
+
+    _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+
+    return blocks
+
+
+def _extract_text_from_soup(tag: Tag) -> List[TextBlock]:
+    """
+    Function which extracts the visible text of a BeautifulSoup tag in a single walk of its subtree.
+
+    :param tag: Tag the text is extracted from.
+    :return: Blocks of the text of the tag, with the whitespace collapsed.
+
+    """
+
+    blocks = []
+    parts = []
+    link_parts = []
+    link_depth = 0
+
+    # the walk is iterative, so deeply nested pages don't hit the recursion limit; the end of an element is marked by
+    # its name pushed as a plain string, which the text (NavigableString) is not
+    stack = [tag]
+    while len(stack) > 0:
+        if type(node := stack.pop()) is str:
+            if node == "a":
+                link_depth = max(link_depth - 1, 0)
+            else:
+                _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+        elif isinstance(node, NavigableString):
+            # comments, CDATA sections, doctypes and processing instructions are not visible
+            if not isinstance(node, PreformattedString):
+                parts.append(node)
+                if link_depth > 0:
+                    link_parts.append(node)
+        elif node.name == "br":
+            # the lines of a post are part of the same block
+            parts.append("\n")
+        elif node.name in SKIPPED_TEXT_TAGS:
+            _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+        elif node.name in BLOCK_TEXT_TAGS:
+            _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+            stack.append(node.name)
+            stack.extend(reversed(node.contents))
+        elif node.name == "a":
+            link_depth += 1
+            stack.append(node.name)
+            stack.extend(reversed(node.contents))
+        else:
+            stack.extend(reversed(node.contents))
+
+    _end_text_block(blocks=blocks, parts=parts, link_parts=link_parts)
+
+    return blocks
+
+
+def _end_text_block(blocks: List[TextBlock], parts: List[str], link_parts: List[str]):
+    """
+    Function which ends the current block of the text of an element: its pieces are joined into a block, which is
+    added to the blocks if it has any words, and the pieces are cleared for the next block.
+
+    :param blocks: Blocks of the text so far.
+    :param parts: Pieces of the text of the current block in document order.
+    :param link_parts: Pieces of the text of the current block which are the text of a link.
+
+    """
+
+    if len(parts) == 0:
+        return
+
+    # the words are counted the same way as they are separated in the text; the pieces of the links are counted
+    # separately, so adjacent links without whitespace between them (e.g. in a menu) don't count as a single word
+    if len(words := "".join(parts).split()) > 0:
+        blocks.append(TextBlock(text=" ".join(words), word_count=len(words),
+                                link_word_count=len(" ".join(link_parts).split()) if len(link_parts) > 0 else 0))
+
+    parts.clear()
+    link_parts.clear()
+
+
+def _join_blocks(blocks: Optional[List[TextBlock]]) -> Optional[str]:
+    """
+    Function which joins the blocks of the text of an element into its whole text.
+
+    :param blocks: Blocks of the text in document order, or None if the element is not present.
+    :return: Joined text, or None if the element is not present.
+
+    """
+
+    return " ".join(block.text for block in blocks) if blocks is not None else None
+
+
+def _join_text(parts: List[str]) -> str:
+    """
+    Function which joins the pieces of text of an element, collapsing every run of whitespace (including line breaks
+    and non-breaking spaces) into a single space, as html2text does outside of preformatted blocks.
+
+    :param parts: Pieces of text in document order.
+    :return: Joined text.
+
+    """
+
+    return " ".join("".join(parts).split())
@@ -0,0 +1,412 @@
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Dict, Union, List
+
+import html2text
+
+from src.mq.work_message import PageValidators
+from src.utils.enums import ScrapingResult, ParserBackend, MessageType, TextExtractor
+from src.utils.blacklist import Blacklist, get_blacklist_manifest_location
+from src.utils.url_canonicalizer import UrlCanonicalizer, get_url_canonicalizer
+from src.utils.general import read_config_file, get_config_file_location, get_config_value, str_to_bool
+from src.utils.logger import get_logger
+from src.data_collection.boilerplate_remover import BoilerplateRemover
+from src.data_collection.html_parsers import ParsedPage, parse_page, get_parser_backend, get_text_extractor, \
+    select_parser_backend
+from src.data_collection.url_resolver import UrlResolver
+from src.data_collection.scraper_utils import normalize_text
+
+# get logger
+logger = get_logger()
+
+
+class PageExtractor:
+    """
+    Class which turns the downloaded content of the pages into the messages sent to the processors: it parses the
+    pages, extracts their text and filters their links.
+
+    It only holds the parsing settings and the filters of the links, nothing connected to Tor, the MQ or the stores
+    shared by the scrapers, so the processes of the extraction pool can create it cheaply (see `get_page_extractor`).
+
+    """
+
+    def __init__(self,
+                 blacklist: Blacklist,
+                 url_canonicalizer: UrlCanonicalizer,
+                 url_resolver: UrlResolver,
+                 boilerplate_remover: BoilerplateRemover,
+                 parser_backend: ParserBackend,
+                 text_extractor: TextExtractor,
+                 max_tree_size: int,
+                 max_tree_depth: int,
+                 keep_raw_page_content: bool):
+        """
+        Initializer method.
+
+        :param blacklist: Blacklist the links are filtered with.
+        :param url_canonicalizer: Canonicalizer the links are sent through.
+        :param url_resolver: Resolves and classifies the links extracted from the pages.
+        :param boilerplate_remover: Removes the navigation, footers and other chrome from the text of the pages.
+        :param parser_backend: Default backend used for parsing the pages.
+        :param text_extractor: Default way of extracting the text of the pages.
+        :param max_tree_size: Pages larger than this (in bytes) are parsed in streaming mode.
+        :param max_tree_depth: Pages nested deeper than this are parsed in streaming mode.
+        :param keep_raw_page_content: Whether the whole text of the pages is sent as well.
+
+        """
+
+        self.blacklist = blacklist
+        self.url_canonicalizer = url_canonicalizer
+        self.url_resolver = url_resolver
+        self.boilerplate_remover = boilerplate_remover
+        self.parser_backend = parser_backend
+        self.text_extractor = text_extractor
+        self.max_tree_size = max_tree_size
+        self.max_tree_depth = max_tree_depth
+        self.keep_raw_page_content = keep_raw_page_content
+
+    def process_fetched_page(self,
+                             url: str,
+                             content: bytes,
+                             response_validators: PageValidators,
+                             previous_validators: Optional[PageValidators]) -> Union[ScrapingResult, Dict]:
+        """
+        Method which turns the downloaded content of a page into the message sent to the processors: an "unchanged"
+        message if the content is the same as on the previous scraping, otherwise the relevant data of the page
+        together with its validators.
+
+        :param url: URL of the page the content belongs to.
+        :param content: Raw content of the page.
+        :param response_validators: Validators received in the headers of the response.
+        :param previous_validators: Validators of the page from the previous scraping, if any.
+        :return: A Dictionary containing the message or a `ScrapingResult` object.
+
+        """
+
+        response_validators.content_hash = hashlib.sha256(content).hexdigest()
+
+        # a lot of hidden services don't support conditional requests, but the content still tells if the page changed
+        if previous_validators is not None and previous_validators.content_hash == response_validators.content_hash:
+            logger.info(f"Content of url '{url}' didn't change.")
+            return create_unchanged_message(url=url, validators=response_validators)
+
+        if type(result := self.process_page_content(url=url, content=content)) is dict:
+            result["message_type"] = MessageType.PAGE.value
+            result.update(response_validators.to_dict())
+
+        return result
+
+    def process_page_content(self,
+                             url: str,
+                             content: bytes,
+                             parser_backend: Optional[ParserBackend] = None,
+                             text_extractor: Optional[TextExtractor] = None) -> Union[ScrapingResult, Dict]:
+        """
+        Method which parses the raw content of a page and extracts the relevant data from it.
+
+        This step is independent of how the page was fetched, thus it is shared by the synchronous and asynchronous
+        scraping modes.
+
+        :param url: URL of the page the content belongs to.
+        :param content: Raw content of the page.
+        :param parser_backend: Parser backend to be used. If not specified, the default one is used.
+        :param text_extractor: Way of extracting the text of the page. If not specified, the default one is used.
+        :return: A Dictionary containing the relevant data from the page or a `ScrapingResult` object.
+
+        """
+
+        # with the fast extractor, the text is collected from the parsed tree right away, instead of serializing the
+        # title and the body to HTML and parsing them again with html2text
+        extract_text = (text_extractor or self.text_extractor) == TextExtractor.FAST
+
+        backend = select_parser_backend(content=content, backend=parser_backend or self.parser_backend,
+                                        max_tree_size=self.max_tree_size, max_tree_depth=self.max_tree_depth)
+
+        # parse content
+        try:
+            parsed_page = parse_page(content=content, backend=backend, extract_text=extract_text)
+        except Exception as e:
+            logger.error(f"Couldn't parse response for url '{url}': {e}")
+            return ScrapingResult.SCRAPING_FAILED
+
+        # extract relevant data from page
+        content_dict = self.extract_relevant_content(url=url, parsed_page=parsed_page)
+
+        return content_dict
+
+    def extract_relevant_content(self, url: str, parsed_page: ParsedPage) -> Optional[Dict]:
+        """
+        Method which extracts the relevant content from a page.
+
+        :param url: The current URL being scraped.
+        :param parsed_page: The parsed page from which we want to extract the relevant data.
+        :return: Dictionary containing the relevant information we need, the number of bytes of the text removed as
+                 boilerplate and the version of the blacklist the links were filtered with.
+
+        """
+
+        # filter the extracted urls
+        extracted_urls = self.filter_links(url_being_scraped=url, list_of_urls=parsed_page.links)
+
+        # extract title, unless it was already extracted while parsing the page
+        if (extracted_title := parsed_page.title_text) is None and parsed_page.title_html is not None:
+            extracted_title = html_to_text(html=parsed_page.title_html)
+
+        if extracted_title is not None:
+            # format title
+            formatted_title = format_text(string=extracted_title)
+        else:
+            formatted_title = None
+
+        # extract body text, unless it was already extracted while parsing the page
+        if (extracted_body := parsed_page.body_text) is None and parsed_page.body_html is not None:
+            extracted_body = html_to_text(html=parsed_page.body_html)
+
+        # the boilerplate can only be told apart in the blocks of the text collected from a parsed tree
+        boilerplate_size = 0
+        if parsed_page.body_blocks is not None:
+            content_body, boilerplate_size = self.boilerplate_remover.remove_boilerplate(blocks=parsed_page.body_blocks)
+        else:
+            content_body = extracted_body
+
+        # format text data
+        extracted_text = format_content_text(title=formatted_title, body=content_body)
+
+        content_dict = {
+            "url": url,
+            "page_title": formatted_title,
+            "page_content": extracted_text,
+            "links": extracted_urls,
+            "meta_tags": parsed_page.meta_tags,
+            "boilerplate_size": boilerplate_size,
+            "blacklist_version": self.blacklist.version
+        }
+
+        if self.keep_raw_page_content:
+            content_dict["raw_page_content"] = format_content_text(title=formatted_title, body=extracted_body)
+
+        return content_dict
+
+    def filter_links(self, url_being_scraped: str, list_of_urls: List[Optional[str]]) -> List[str]:
+        """
+        Method which filters the extracted URLs from a page.
+
+        Relative links are resolved against the URL being scraped, then only the onion links which are potentially
+        pointing to HTML or txt pages, and which are not blacklisted, are kept, in their canonical form and without
+        duplicates.
+
+        :param url_being_scraped: The current URL that is being scraped.
+        :param list_of_urls: List of URLs to be filtered.
+        :return: Filtered list of URLs.
+
+        """
+
+        canonical_links = {}
+        for link in self.url_resolver.resolve_links(base_url=url_being_scraped, links=list_of_urls):
+            if self.blacklist.is_url_blacklisted(url=link):
+                continue
+
+            # the blacklist has the URLs as they were found, so both forms are checked
+            if (canonical_link := self.url_canonicalizer.canonicalize(url=link)) != link and \
+                    self.blacklist.is_url_blacklisted(url=canonical_link):
+                continue
+
+            # dictionaries keep the insertion order, so the order of the links is preserved
+            canonical_links[canonical_link] = None
+
+        return list(canonical_links)
+
+
+def create_page_extractor() -> PageExtractor:
+    """
+    Function which creates the page extractor with the parameters of the `SCRAPER` section of the config file; the
+    missing parameters get their defaults.
+
+    :return: PageExtractor object.
+
+    """
+
+    scraper_params = read_config_file(config_file=get_config_file_location(), section="SCRAPER")
+
+    return PageExtractor(
+        # the blacklisted links are left out of the results; it is the same list the scheduler and the processors use
+        blacklist=Blacklist(manifest_path=get_blacklist_manifest_location()),
+        # the links are sent in their canonical form, so the different spellings of a page are saved and scraped only
+        # once; the processors canonicalize the links with the same rules
+        url_canonicalizer=get_url_canonicalizer(),
+        url_resolver=UrlResolver(cache_size=get_config_value(param_dict=scraper_params, key="url_cache_size",
+                                                             default_value=4096, value_type=int)),
+        # the navigation, footers and other chrome are left out of the text of the pages extracted by the fast extractor
+        boilerplate_remover=BoilerplateRemover(enabled=get_config_value(param_dict=scraper_params,
+                                                                        key="remove_boilerplate", default_value=True,
+                                                                        value_type=str_to_bool),
+                                               min_block_words=get_config_value(param_dict=scraper_params,
+                                                                                key="min_block_words",
+                                                                                default_value=10, value_type=int),
+                                               max_link_density=get_config_value(param_dict=scraper_params,
+                                                                                 key="max_link_density",
+                                                                                 default_value=0.5,
+                                                                                 value_type=float)),
+        parser_backend=get_parser_backend(name=get_config_value(param_dict=scraper_params, key="parser_backend",
+                                                                default_value=ParserBackend.LXML.value)),
+        text_extractor=get_text_extractor(name=get_config_value(param_dict=scraper_params, key="text_extractor",
+                                                                default_value=TextExtractor.FAST.value)),
+        # pages larger or nested deeper than these are parsed in streaming mode, without building a tree of them
+        max_tree_size=get_config_value(param_dict=scraper_params, key="max_tree_size", default_value=1048576,
+                                       value_type=int),
+        max_tree_depth=get_config_value(param_dict=scraper_params, key="max_tree_depth", default_value=250,
+                                        value_type=int),
+        # the whole text of the pages is sent as well, for comparing it with the text without the boilerplate
+        keep_raw_page_content=get_config_value(param_dict=scraper_params, key="keep_raw_page_content",
+                                               default_value=False, value_type=str_to_bool))
+
+
+@lru_cache(maxsize=1)
+def get_page_extractor() -> PageExtractor:
+    """
+    Function which returns the page extractor of the process, creating it on the first call. Every process of the
+    extraction pool creates its own on its first page.
+
+    :return: PageExtractor object.
+
+    """
+
+    return create_page_extractor()
+
+
+def process_fetched_page(url: str,
+                         content: bytes,
+                         response_validators: PageValidators,
+                         previous_validators: Optional[PageValidators]) -> Union[ScrapingResult, Dict]:
+    """
+    Function which turns the downloaded content of a page into the message sent to the processors with the page
+    extractor of the process (see `PageExtractor.process_fetched_page`). This is the function submitted to the
+    extraction pool.
+
+    :param url: URL of the page the content belongs to.
+    :param content: Raw content of the page.
+    :param response_validators: Validators received in the headers of the response.
+    :param previous_validators: Validators of the page from the previous scraping, if any.
+    :return: A Dictionary containing the message or a `ScrapingResult` object.
+
+    """
+
+    return get_page_extractor().process_fetched_page(url=url, content=content,
+                                                     response_validators=response_validators,
+                                                     previous_validators=previous_validators)
+
+
+def create_extraction_pool(workers: int) -> Optional[ProcessPoolExecutor]:
+    """
+    Function which creates the pool of processes the parsing and extraction of the pages is offloaded to.
+
+    The processes are spawned, not forked: the pool is used from a process that already runs other threads (e.g. the
+    one of the MQ connection), and forking those could leave the children with locks nobody is going to release. A
+    spawned process imports the module of the submitted function and the main script again, so neither of them may
+    set up the connections or the shared stores of the scraper when imported (see `main.py`).
+
+    :param workers: Number of processes. 0 or less means that the pages are processed in the calling thread.
+    :return: ProcessPoolExecutor object, or None if the pool is disabled.
+
+    """
+
+    if workers < 1:
+        return None
+
+    logger.info(f"Extracting the pages in {workers} processes.")
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def create_unchanged_message(url: str, validators: Optional[PageValidators]) -> Dict:
+    """
+    Function which creates the message sent to the processors for a page which didn't change since it was last
+    scraped. The processors only update the access date of such pages.
+
+    :param url: URL of the page.
+    :param validators: Validators of the page.
+    :return: Message dictionary.
+
+    """
+
+    return {"message_type": MessageType.UNCHANGED.value,
+            "url": url,
+            **(validators if validators is not None else PageValidators()).to_dict()}
+
+
+def get_response_validators(headers) -> PageValidators:
+    """
+    Function which extracts the validators from the headers of a response.
+
+    :param headers: Case-insensitive header mapping of the response.
+    :return: PageValidators object without the content hash.
+
+    """
+
+    return PageValidators(etag=headers.get("ETag"), last_modified=headers.get("Last-Modified"))
+
+
+def html_to_text(html: str) -> str:
+    """
+    Function which converts an HTML string to text with html2text.
+
+    :param html: HTML string to be converted.
+    :return: Text of the HTML string.
+
+    """
+
+    # setup HTML2Text
+    h2t = html2text.HTML2Text()
+    h2t.ignore_links = True
+    h2t.bypass_tables = True
+    h2t.escape_snob = False
+    h2t.ignore_images = True
+
+    return h2t.handle(html)
+
+
+def format_content_text(title: Optional[str], body: Optional[str]) -> Optional[str]:
+    """
+    Function which formats the title and body text of a webpage.
+
+    :param title: Title string.
+    :param body: Body string.
+    :return: Formatted page content in string format.
+
+    """
+
+    if title is not None:
+        # remove line formatters and multiple spaces from title
+        title = normalize_text(string=title, strip_html_tags=False)
+
+    if body is not None:
+        # remove line formatters, multiple spaces and HTML tags from body text
+        body = normalize_text(string=body, strip_html_tags=True)
+
+    # combine the title with the body text and return result
+    formatted_text = ""
+    if title is not None:
+        formatted_text += title + ". "
+
+    if body is not None:
+        formatted_text += body
+
+    if len(formatted_text) > 0:
+        return formatted_text
+
+    return None
+
+
+def format_text(string: str) -> str:
+    """
+    Function which formats a given text.
+
+    :param string: Text to be formatted.
+    :return: Formatted text.
+
+    """
+
+    # remove line formatters and multiple spaces
+    return normalize_text(string=string, strip_html_tags=False)
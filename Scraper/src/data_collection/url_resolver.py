@@ -0,0 +1,208 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple, Set
+from urllib.parse import urljoin
+
+from src.utils.enums import LinkType
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class UrlResolver:
+    """
+    Class which resolves the links extracted from a page against the URL of the page and classifies them in a single
+    pass over each link.
+
+    The parsing of the hosts is memoized in a bounded LRU cache, as the pages of a site mostly link to the same
+    handful of hosts.
+
+    """
+
+    # values of href attributes that don't point anywhere useful
+    UNUSABLE_LINKS = {"", "#", "./", "/", "."}
+
+    def __init__(self, cache_size: int, allowed_extensions: Optional[Set[str]] = None):
+        """
+        Initializer method.
+
+        :param cache_size: Maximum number of hosts kept in the cache.
+        :param allowed_extensions: File extensions a link is allowed to point to. Links to files with other extensions
+                                   are considered resources (images, archives, etc.). Defaults to html and txt.
+
+        """
+
+        self.allowed_extensions = allowed_extensions if allowed_extensions is not None else {"html", "txt"}
+
+        # bounded cache for the host parsing
+        self._parse_netloc = lru_cache(maxsize=max(cache_size, 1))(UrlResolver._parse_netloc_uncached)
+
+    def resolve_links(self, base_url: str, links: List[Optional[str]]) -> List[str]:
+        """
+        Method which resolves the links of a page and keeps only the onion links pointing to pages, without duplicates.
+
+        :param base_url: URL of the page the links were extracted from.
+        :param links: Links to be resolved, as they appear in the href attributes.
+        :return: List of unique, absolute onion links in the order of their first occurrence.
+
+        """
+
+        if (base := self._split_base_url(base_url=base_url)) is None:
+            logger.error(f"URL {base_url} can't be used as base URL!")
+            return []
+
+        resolved_links = {}
+        for link in links:
+            link_type, resolved_link = self.classify_link(base_url=base_url, link=link, base=base)
+
+            if link_type == LinkType.ONION:
+                # dictionaries keep the insertion order, so the order of the links is preserved
+                resolved_links[resolved_link] = None
+
+        return list(resolved_links)
+
+    def classify_link(self, base_url: str, link: Optional[str], base: Optional[Tuple[str, str]] = None) \
+            -> Tuple[LinkType, Optional[str]]:
+        """
+        Method which resolves a link against the URL of the page it was extracted from and determines its type.
+
+        Example:    base: 'http://domain.onion/forum/index.html'; link: '../wiki/page#section'
+                    result: (LinkType.ONION, 'http://domain.onion/wiki/page')
+
+        :param base_url: URL of the page the link was extracted from.
+        :param link: Link to be resolved.
+        :param base: Pre-computed (scheme, root) of the base URL, see `_split_base_url`.
+        :return: Tuple of the type of the link and the resolved link without its fragment, if it could be resolved.
+
+        """
+
+        if link is None:
+            return LinkType.INVALID, None
+
+        link = link.strip()
+
+        if link in UrlResolver.UNUSABLE_LINKS:
+            return LinkType.INVALID, None
+
+        # the link only points to a section within the current page
+        if link[0] == "#":
+            return LinkType.FRAGMENT, None
+
+        if link[:11].lower() == "javascript:":
+            return LinkType.JAVASCRIPT, None
+
+        if base is None and (base := self._split_base_url(base_url=base_url)) is None:
+            return LinkType.INVALID, None
+
+        # resolve the link; the most common forms are handled without the generic (and slower) urljoin
+        if link.startswith("http://") or link.startswith("https://"):
+            resolved_link = link
+        elif link.startswith("//"):
+            resolved_link = base[0] + ":" + link
+        elif link[0] == "/":
+            resolved_link = base[1] + link
+        else:
+            try:
+                resolved_link = urljoin(base_url, link)
+            except ValueError:
+                return LinkType.INVALID, None
+
+        # remove the section part
+        if (fragment_index := resolved_link.find("#")) != -1:
+            resolved_link = resolved_link[:fragment_index]
+
+        scheme_end = resolved_link.find("://")
+        if scheme_end == -1 or resolved_link[:scheme_end].lower() not in ("http", "https"):
+            return LinkType.UNSUPPORTED_SCHEME, None
+
+        # split the rest of the URL into the network location and the path with the parameters
+        rest = resolved_link[scheme_end + 3:]
+        path_start = len(rest)
+        for separator in "/?":
+            if (index := rest.find(separator)) != -1 and index < path_start:
+                path_start = index
+
+        if (host := self._parse_netloc(rest[:path_start])) is None:
+            return LinkType.INVALID, None
+
+        if not host.endswith(".onion"):
+            return LinkType.NON_ONION, resolved_link
+
+        if self._points_to_resource(path=rest[path_start:]):
+            return LinkType.RESOURCE, resolved_link
+
+        return LinkType.ONION, resolved_link
+
+    def _points_to_resource(self, path: str) -> bool:
+        """
+        Method which checks whether a path potentially points to a non-HTML or -txt resource.
+
+        :param path: Path of the URL, including the parameters.
+        :return: True if the path has a file extension which is not allowed, otherwise False.
+
+        """
+
+        # if there is a list of parameters, we will allow it
+        if "?" in path:
+            return False
+
+        last_segment = path[path.rfind("/") + 1:]
+
+        if (dot_index := last_segment.rfind(".")) == -1:
+            # if there are no dots, the link is good
+            return False
+
+        extension = last_segment[dot_index + 1:].lower()
+
+        # if no extension was found, the link is probably good
+        return len(extension) > 0 and extension not in self.allowed_extensions
+
+    def _split_base_url(self, base_url: str) -> Optional[Tuple[str, str]]:
+        """
+        Method which splits the base URL into its scheme and root ('scheme://netloc').
+
+        :param base_url: URL of the page the links were extracted from.
+        :return: Tuple of the scheme and the root of the URL, or None if the URL is not absolute.
+
+        """
+
+        if (scheme_end := base_url.find("://")) == -1:
+            return None
+
+        rest = base_url[scheme_end + 3:]
+        netloc_end = len(rest)
+        for separator in "/?#":
+            if (index := rest.find(separator)) != -1 and index < netloc_end:
+                netloc_end = index
+
+        if self._parse_netloc(rest[:netloc_end]) is None:
+            return None
+
+        return base_url[:scheme_end], base_url[:scheme_end + 3 + netloc_end]
+
+    '''
+    ######## Static methods #########
+    '''
+
+    @staticmethod
+    def _parse_netloc_uncached(netloc: str) -> Optional[str]:
+        """
+        Function which extracts the host from the network location part of a URL.
+
+        :param netloc: Network location ('user:password@host:port').
+        :return: The lowercase host, or None if the network location doesn't contain a valid host.
+
+        """
+
+        # drop the credentials and the port
+        host = netloc[netloc.rfind("@") + 1:]
+        if (port_index := host.rfind(":")) != -1:
+            host = host[:port_index]
+
+        host = host.lower().rstrip(".")
+
+        # a host needs at least one dot and can't contain whitespace
+        if "." not in host or any(character.isspace() for character in host):
+            return None
+
+        return host
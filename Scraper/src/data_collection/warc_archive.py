@@ -0,0 +1,229 @@
+import os
+import socket
+import threading
+import time
+from io import BytesIO
+from typing import Optional, Iterator, Tuple, Iterable, Dict, List
+
+from requests.structures import CaseInsensitiveDict
+
+from src.utils.logger import get_logger
+
+# warcio is only needed when the raw responses are archived or re-extracted
+try:
+    from warcio.archiveiterator import ArchiveIterator
+    from warcio.statusandheaders import StatusAndHeaders
+    from warcio.warcwriter import WARCWriter
+
+    WARCIO_AVAILABLE = True
+except ImportError:
+    WARCIO_AVAILABLE = False
+
+# get logger
+logger = get_logger()
+
+# extension of the finished archive files
+WARC_EXTENSION = ".warc.gz"
+
+# extension of the archive file still being written; it is renamed once it is closed
+OPEN_WARC_EXTENSION = f"{WARC_EXTENSION}.open"
+
+# headers which describe the transfer of the body rather than the body itself; the archived body is already decoded
+# and complete, so they would be wrong for it
+TRANSFER_HEADERS = {"content-encoding", "transfer-encoding", "content-length"}
+
+
+class WarcArchive:
+    """
+    Class which writes the raw responses of the downloaded pages into gzip compressed WARC files, so the pages can be
+    extracted again later without fetching them over Tor.
+
+    Every page is a `response` record (compressed on its own, as usual for WARC files), whose HTTP headers are the
+    headers of the response except for the ones describing the transfer encoding, as the body is stored decoded. A file
+    is closed and a new one is started when it grows beyond `max_file_size` bytes. The files are written with the
+    `.warc.gz.open` extension, and renamed to `.warc.gz` once they are closed, thus every `.warc.gz` file is complete.
+
+    The name of a file contains the host name and the process ID, so the replicas can write into the same directory.
+    The file is only created when the first page is archived.
+
+    """
+
+    def __init__(self, directory: Optional[str], max_file_size: int, prefix: str = "scraper"):
+        """
+        Initializer method.
+
+        :param directory: Directory the archive files are written to. None or an empty string disables the archive.
+        :param max_file_size: Size in bytes after which an archive file is closed and a new one is started.
+        :param prefix: First part of the names of the archive files.
+
+        """
+
+        self.directory = directory if directory is not None and len(directory) > 0 else None
+        self.max_file_size = max(max_file_size, 1)
+        self.prefix = prefix
+
+        if self.directory is not None and not WARCIO_AVAILABLE:
+            logger.warning("warcio is not installed, the raw responses are not archived.")
+            self.directory = None
+
+        self._pages = 0
+        self._files = 0
+        self._failures = 0
+
+        # the pages of the sync and the async scraper are archived from several threads
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_path: Optional[str] = None
+        self._writer = None
+
+    def is_enabled(self) -> bool:
+        """
+        Method which checks whether the raw responses are archived.
+
+        :return: True if the archive is enabled, otherwise False.
+
+        """
+
+        return self.directory is not None
+
+    def write_response(self, url: str, status: int, reason: Optional[str], headers: Iterable[Tuple[str, str]],
+                       content: bytes):
+        """
+        Method which archives the raw response of a page.
+
+        :param url: URL of the page.
+        :param status: Status code of the response.
+        :param reason: Reason phrase of the status, if any.
+        :param headers: Headers of the response, as name and value pairs.
+        :param content: Decoded body of the response.
+
+        """
+
+        if not self.is_enabled():
+            return
+
+        http_headers = [(name, value) for name, value in headers if name.lower() not in TRANSFER_HEADERS]
+        http_headers.append(("Content-Length", str(len(content))))
+
+        with self._lock:
+            try:
+                if self._writer is None:
+                    self._open_file()
+
+                record = self._writer.create_warc_record(
+                    url, "response", payload=BytesIO(content),
+                    http_headers=StatusAndHeaders(statusline=f"{status} {reason or ''}".rstrip(), headers=http_headers,
+                                                  protocol="HTTP/1.1"))
+                self._writer.write_record(record)
+                self._pages += 1
+
+                if self._file.tell() >= self.max_file_size:
+                    self._close_file()
+            except Exception as e:
+                # the page is still sent to the processors, it is only missing from the archive
+                logger.warning(f"Couldn't archive url '{url}': {e}")
+                self._failures += 1
+
+    def close(self):
+        """
+        Method which closes the archive file being written, so it gets its final name.
+
+        """
+
+        with self._lock:
+            try:
+                self._close_file()
+            except OSError as e:
+                logger.warning(f"Couldn't close the archive file '{self._file_path}': {e}")
+
+    def get_stats(self) -> Dict:
+        """
+        Method which returns the statistics of the archive.
+
+        :return: Dictionary containing the number of archived pages, the number of started files and the number of
+                 pages which couldn't be archived.
+
+        """
+
+        return {"pages": self._pages, "files": self._files, "failures": self._failures}
+
+    def _open_file(self):
+        """
+        Method which starts a new archive file, beginning with a `warcinfo` record.
+
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._files += 1
+        file_name = f"{self.prefix}-{time.strftime('%Y%m%d%H%M%S', time.gmtime())}-{socket.gethostname()}-" \
+                    f"{os.getpid()}-{self._files:05d}{OPEN_WARC_EXTENSION}"
+        self._file_path = os.path.join(self.directory, file_name)
+        self._file = open(self._file_path, "wb")
+        self._writer = WARCWriter(self._file, gzip=True)
+
+        self._writer.write_record(self._writer.create_warcinfo_record(
+            file_name[:-len(".open")], {"software": "DrkSrch Scraper", "format": "WARC File Format 1.0"}))
+
+    def _close_file(self):
+        """
+        Method which closes the archive file being written and gives it its final name.
+
+        """
+
+        if self._file is None:
+            return
+
+        self._file.close()
+        os.replace(self._file_path, self._file_path[:-len(".open")])
+
+        self._file = None
+        self._writer = None
+        self._file_path = None
+
+
+def find_warc_files(paths: List[str], include_open: bool = False) -> List[str]:
+    """
+    Function which collects the archive files from a list of files and directories.
+
+    :param paths: Paths of archive files, or of directories which are searched recursively.
+    :param include_open: Whether the files still being written (or left behind by a scraper which crashed) are
+                         included; their records are complete up to the last one written.
+    :return: Sorted list of the paths of the archive files.
+
+    """
+
+    extensions = (WARC_EXTENSION, OPEN_WARC_EXTENSION) if include_open else (WARC_EXTENSION,)
+
+    warc_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, file_names in os.walk(path):
+                warc_files.extend(os.path.join(directory, file_name) for file_name in file_names
+                                  if file_name.endswith(extensions))
+        else:
+            warc_files.append(path)
+
+    return sorted(warc_files)
+
+
+def read_warc_responses(file_path: str) -> Iterator[Tuple[str, bytes, CaseInsensitiveDict]]:
+    """
+    Function which reads the archived responses of an archive file one by one.
+
+    :param file_path: Path of the archive file.
+    :return: Iterator of the URL, the body and the case-insensitive header mapping of the responses.
+
+    """
+
+    with open(file_path, "rb") as file:
+        try:
+            for record in ArchiveIterator(file):
+                if record.rec_type != "response" or record.http_headers is None:
+                    continue
+
+                yield record.rec_headers.get_header("WARC-Target-URI"), record.content_stream().read(), \
+                    CaseInsensitiveDict(record.http_headers.headers)
+        except Exception as e:
+            # e.g. the last record of a file left behind by a crashed scraper is truncated
+            logger.warning(f"Couldn't read the rest of the archive file '{file_path}': {e}")
@@ -1,289 +1,449 @@
-from typing import Optional, Dict, Union, List
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Optional, Dict, Union, List, Deque, Tuple
 
-import html2text
 import requests
-from bs4 import BeautifulSoup
 from stem import Signal
 from stem.control import Controller
 
-from src.utils.enums import ScrapingResult
-from src.utils.general import remove_duplicates
+from src.mq.work_message import PageValidators
+from src.utils.enums import ScrapingResult, ProxyMode, MessageType
+from src.utils.general import read_config_file, get_config_file_location, get_config_value, \
+    str_to_bool
 from src.utils.logger import get_logger
-from src.data_collection.scraper_utils import get_tor_proxy_dict, get_request_headers, get_tld_with_protocol, \
-    url_has_fld, is_onion_link, remove_line_formatters, remove_multiple_spaces, remove_unusable_links, \
-    remove_html_tags_from_string, filter_resource_links, filter_regular_links, merge_pathlike_link_to_base_url
+from src.utils.metrics import metrics_exporter
+from src.data_collection.host_circuit_breaker import HostCircuitBreaker
+from src.data_collection.host_latency import HostLatencyTracker
+from src.data_collection.host_rate_limiter import HostRateLimiter
+from src.data_collection.page_extractor import get_page_extractor, process_fetched_page, create_unchanged_message, \
+    get_response_validators
+from src.data_collection.response_cache import ResponseCache
+from src.data_collection.response_limits import ResponseLimits
+from src.data_collection.session_manager import SessionManager
+from src.data_collection.tor_circuit_pool import TorCircuitPool, get_proxy_mode
+from src.data_collection.warc_archive import WarcArchive
+from src.data_collection.scraper_utils import is_onion_link, get_tor_proxy_dict, get_host
 
 # get logger
 logger = get_logger()
 
+# read the parameters of the scraper; if they are missing, the defaults are used
+scraper_params = read_config_file(config_file=get_config_file_location(), section="SCRAPER")
 
-def scrape_url(url: str) -> Union[ScrapingResult, Dict]:
-    """
-    Function which scrapes the content of a page.
+# how the requests reach Tor: through privoxy, or directly through the SOCKS port, spread over several circuits
+proxy_mode = get_proxy_mode(name=get_config_value(param_dict=scraper_params, key="proxy_mode",
+                                                  default_value=ProxyMode.SOCKS.value))
 
-    :param url: URL to be scraped.
-    :return: A Dictionary containing the relevant data from the page or a `ScrapingResult` object.
+# control port of Tor, used for changing the identity and checking whether Tor is ready
+tor_control_port = get_config_value(param_dict=scraper_params, key="tor_control_port", default_value=9051,
+                                    value_type=int)
 
-    """
+# isolated circuits the requests are spread over in SOCKS mode
+circuit_pool = TorCircuitPool(socks_host=get_config_value(param_dict=scraper_params, key="tor_socks_host",
+                                                          default_value="127.0.0.1"),
+                              socks_port=get_config_value(param_dict=scraper_params, key="tor_socks_port",
+                                                          default_value=9050, value_type=int),
+                              control_port=tor_control_port,
+                              circuit_count=get_config_value(param_dict=scraper_params, key="circuit_count",
+                                                             default_value=8, value_type=int))
 
-    # check if url is an onion link
-    if not is_onion_link(link=url):
-        logger.error(f"URL '{url}' is not an onion link!")
-        return ScrapingResult.INVALID_URL
 
-    # get the response from the page
-    if (response := send_request(url=url)) is None:
-        return ScrapingResult.SCRAPING_FAILED
+def get_proxy_dict(host: str) -> Dict:
+    """
+    Function which returns the proxy dictionary for the requests sent to a host, according to the proxy mode.
 
-    # if the status code isn't within the 200 range, we consider it failed
-    if response.status_code >= 300:
-        return ScrapingResult.SCRAPING_FAILED
+    :param host: Host of the URL ('domain.onion').
+    :return: Proxy dictionary.
 
-    # parse content
-    try:
-        parsed_content = BeautifulSoup(response.content, "html.parser")
-    except Exception as e:
-        logger.error(f"Couldn't parse response for url '{url}': {e}")
-        return ScrapingResult.SCRAPING_FAILED
+    """
 
-    # extract relevant data from page
-    content_dict = extract_relevant_content(url=url, parsed_content=parsed_content)
+    if proxy_mode == ProxyMode.SOCKS:
+        return circuit_pool.get_proxy_dict(host=host)
+
+    return get_tor_proxy_dict()
+
+
+# timeouts of the requests to the hosts which haven't been measured yet
+connect_timeout = get_config_value(param_dict=scraper_params, key="connect_timeout", default_value=30.0,
+                                   value_type=float)
+read_timeout = get_config_value(param_dict=scraper_params, key="read_timeout", default_value=60.0, value_type=float)
+
+# keep-alive sessions for the onion hosts, so consecutive pages of the same site reuse an already warm connection
+session_manager = SessionManager(max_hosts=get_config_value(param_dict=scraper_params, key="max_pooled_hosts",
+                                                            default_value=64, value_type=int),
+                                 pool_maxsize=get_config_value(param_dict=scraper_params, key="pool_maxsize",
+                                                               default_value=4, value_type=int),
+                                 connect_timeout=connect_timeout,
+                                 read_timeout=read_timeout,
+                                 proxy_provider=get_proxy_dict)
+
+# rolling latency histograms of the hosts; the timeouts of the requests to a host are derived from its histogram
+host_latency_tracker = HostLatencyTracker(max_hosts=get_config_value(param_dict=scraper_params,
+                                                                     key="latency_tracked_hosts",
+                                                                     default_value=4096, value_type=int),
+                                          window=get_config_value(param_dict=scraper_params, key="latency_window",
+                                                                  default_value=3600.0, value_type=float),
+                                          percentile=get_config_value(param_dict=scraper_params,
+                                                                      key="timeout_percentile",
+                                                                      default_value=95.0, value_type=float),
+                                          factor=get_config_value(param_dict=scraper_params, key="timeout_factor",
+                                                                  default_value=3.0, value_type=float),
+                                          min_timeout=get_config_value(param_dict=scraper_params, key="min_timeout",
+                                                                       default_value=10.0, value_type=float),
+                                          max_timeout=get_config_value(param_dict=scraper_params, key="max_timeout",
+                                                                       default_value=120.0, value_type=float),
+                                          min_samples=get_config_value(param_dict=scraper_params,
+                                                                       key="min_latency_samples",
+                                                                       default_value=5, value_type=int),
+                                          default_connect_timeout=connect_timeout,
+                                          default_read_timeout=read_timeout)
+
+# limits applied on the responses before and while their body is downloaded
+response_limits = ResponseLimits(max_content_size=get_config_value(param_dict=scraper_params, key="max_content_size",
+                                                                   default_value=5 * 1024 * 1024, value_type=int),
+                                 allowed_content_types=set(get_config_value(param_dict=scraper_params,
+                                                                            key="allowed_content_types",
+                                                                            default_value="text/html,"
+                                                                                          "application/xhtml+xml,"
+                                                                                          "text/plain").split(",")),
+                                 truncate_oversized=get_config_value(param_dict=scraper_params,
+                                                                     key="truncate_oversized_content",
+                                                                     default_value=True, value_type=str_to_bool))
+
+# per-host limits shared by the scrapers, so they don't overload the same hidden service
+host_rate_limiter = HostRateLimiter(store_path=get_config_value(param_dict=scraper_params, key="host_limits_store",
+                                                                default_value=""),
+                                    max_requests_per_host=get_config_value(param_dict=scraper_params,
+                                                                           key="max_requests_per_host",
+                                                                           default_value=2, value_type=int),
+                                    min_request_interval=get_config_value(param_dict=scraper_params,
+                                                                          key="min_host_request_interval",
+                                                                          default_value=1.0, value_type=float),
+                                    lease_timeout=get_config_value(param_dict=scraper_params,
+                                                                   key="host_lease_timeout",
+                                                                   default_value=300.0, value_type=float))
+
+# hosts which can't be reached are skipped for a while; the state is shared by the scrapers through the same store
+host_circuit_breaker = HostCircuitBreaker(store_path=get_config_value(param_dict=scraper_params,
+                                                                      key="host_limits_store",
+                                                                      default_value=""),
+                                          failure_threshold=get_config_value(param_dict=scraper_params,
+                                                                             key="host_failure_threshold",
+                                                                             default_value=3, value_type=int),
+                                          failure_window=get_config_value(param_dict=scraper_params,
+                                                                          key="host_failure_window",
+                                                                          default_value=600.0, value_type=float),
+                                          down_time=get_config_value(param_dict=scraper_params, key="host_down_time",
+                                                                     default_value=600.0, value_type=float),
+                                          max_down_time=get_config_value(param_dict=scraper_params,
+                                                                         key="max_host_down_time",
+                                                                         default_value=86400.0, value_type=float),
+                                          probe_timeout=get_config_value(param_dict=scraper_params,
+                                                                         key="host_probe_timeout",
+                                                                         default_value=120.0, value_type=float))
+
+# downloaded pages are kept until their result is sent, so a message delivered again doesn't fetch its page over Tor
+# again; the cache can be shared by the scrapers the same way as the limits of the hosts
+response_cache = ResponseCache(store_path=get_config_value(param_dict=scraper_params, key="response_cache_store",
+                                                           default_value=""),
+                               ttl=get_config_value(param_dict=scraper_params, key="response_cache_ttl",
+                                                    default_value=900.0, value_type=float),
+                               max_size=get_config_value(param_dict=scraper_params, key="response_cache_max_size",
+                                                         default_value=268435456, value_type=int))
+
+# the raw responses can be archived into WARC files, so the pages can be extracted again without fetching them again
+warc_archive = WarcArchive(directory=get_config_value(param_dict=scraper_params, key="warc_directory",
+                                                      default_value=""),
+                           max_file_size=get_config_value(param_dict=scraper_params, key="warc_max_file_size",
+                                                          default_value=1073741824, value_type=int))
+
+# status changes of the hosts waiting to be sent to the processors, so the scheduler can skip the hosts which are down
+host_status_messages: Deque[Dict] = deque()
+
+# the state of the components is part of the exported metrics
+metrics_exporter.register(name="host_latency", provider=host_latency_tracker.get_snapshot)
+metrics_exporter.register(name="host_rate_limiter", provider=host_rate_limiter.get_stats)
+metrics_exporter.register(name="session_pool", provider=session_manager.get_stats)
+metrics_exporter.register(name="response_cache", provider=response_cache.get_stats)
+metrics_exporter.register(name="warc_archive", provider=warc_archive.get_stats)
+
+# the blacklisted pages are neither fetched nor sent to the processors; the links of the pages are filtered with the
+# same list by the page extractor
+blacklist = get_page_extractor().blacklist
+
+
+def scrape_url(url: str, validators: Optional[PageValidators] = None, host_wait: float = 0.0) \
+        -> Union[ScrapingResult, Dict]:
+    """
+    Function which scrapes the content of a page.
 
-    return content_dict
+    If the validators of the page are known from a previous scraping, the request is a conditional one, and if the page
+    didn't change, only a small "unchanged" message is returned.
 
+    :param url: URL to be scraped.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :param host_wait: Maximum number of seconds to wait for the host to take another request before the URL is
+                      deferred.
+    :return: A Dictionary containing the relevant data from the page (or the "unchanged" message) or a
+             `ScrapingResult` object.
 
-def extract_relevant_content(url: str, parsed_content: BeautifulSoup) -> Optional[Dict]:
     """
-    Function which extracts the relevant content from a page.
 
-    :param url: The current URL being scraped.
-    :param parsed_content: The content from which we want to extract the relevant data.
-    :return: Dictionary containing the relevant information we need.
+    if type(result := fetch_page(url=url, validators=validators, host_wait=host_wait)) is not tuple:
+        return result
+
+    content, response_validators = result
+
+    return process_fetched_page(url=url, content=content, response_validators=response_validators,
+                                previous_validators=validators)
 
-    """
 
-    # setup HTML2Text
-    h2t = html2text.HTML2Text()
-    h2t.ignore_links = True
-    h2t.bypass_tables = True
-    h2t.escape_snob = False
-    h2t.ignore_images = True
-
-    # extract the links present on the page
-    # we extract only the references present in anchor(a) tags
-    extracted_urls = [tag.get('href') for tag in parsed_content.findAll('a')]
-
-    # filter the extracted urls
-    extracted_urls = filter_links(url_being_scraped=url, list_of_urls=extracted_urls)
-
-    if parsed_content.title is not None:
-        # extract title
-        extracted_title = h2t.handle(str(parsed_content.title).strip())
-
-        # format title
-        formatted_title = format_text(string=extracted_title)
-    else:
-        formatted_title = None
-
-    if parsed_content.body is not None:
-        # extract body text
-        extracted_body = h2t.handle(str(parsed_content.body).strip())
-    else:
-        extracted_body = None
-
-    # format text data
-    extracted_text = format_content_text(title=formatted_title, body=extracted_body)
-
-    # extract the meta tags
-    # we are going for name here
-    extracted_meta_tags = [{"key": tag.get('name'), "value": tag.get("content")}
-                           for tag in parsed_content.findAll('meta')]
-
-    return {
-        "url": url,
-        "page_title": formatted_title,
-        "page_content": extracted_text,
-        "links": extracted_urls,
-        "meta_tags": extracted_meta_tags
-    }
-
-
-def filter_links(url_being_scraped: str, list_of_urls: List[str]) -> List[str]:
+def scrape_url_offloaded(executor: Executor, url: str, validators: Optional[PageValidators] = None,
+                         host_wait: float = 0.0) -> Union[ScrapingResult, Dict, Future]:
     """
-    Function which filters the extracted URLs from a page.
+    Function which fetches the content of a page, and hands the CPU-bound parsing and extraction over to an executor
+    (e.g. the extraction pool), so the calling thread is free as soon as the content is downloaded.
 
-    :param url_being_scraped: The current URL that is being scraped.
-    :param list_of_urls: List of URLs to be filtered.
-    :return: Filtered list of URLs.
+    :param executor: Executor the extraction is submitted to.
+    :param url: URL to be scraped.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :param host_wait: Maximum number of seconds to wait for the host to take another request before the URL is
+                      deferred.
+    :return: A Future of the result of `process_fetched_page`, or the result itself if there is nothing to extract.
 
     """
-    # filter unusable links
-    list_of_urls = remove_unusable_links(list_of_links=list_of_urls)
 
-    # format same domain links
-    list_of_urls = format_urls(url_being_scraped=url_being_scraped, list_of_urls=list_of_urls)
+    if type(result := fetch_page(url=url, validators=validators, host_wait=host_wait)) is not tuple:
+        return result
 
-    # filter links that point to resources that are not html or txt
-    list_of_urls = filter_resource_links(list_of_links=list_of_urls)
+    content, response_validators = result
 
-    # remove duplicate urls
-    list_of_urls = remove_duplicates(list_of_strings=list_of_urls)
+    return executor.submit(process_fetched_page, url, content, response_validators, validators)
 
-    # remove non-onion links
-    list_of_urls = filter_regular_links(list_of_links=list_of_urls)
 
-    return list_of_urls
+def fetch_page(url: str, validators: Optional[PageValidators] = None, host_wait: float = 0.0) \
+        -> Union[ScrapingResult, Dict, Tuple[bytes, PageValidators]]:
+    """
+    Function which fetches the content of a page: everything `scrape_url` does before the content is parsed.
 
+    :param url: URL to be scraped.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :param host_wait: Maximum number of seconds to wait for the host to take another request before the URL is
+                      deferred.
+    :return: Tuple of the content and the validators of the response, the "unchanged" message if the page didn't change,
+             or a `ScrapingResult` object.
 
-def format_urls(url_being_scraped: str, list_of_urls: List[str]) -> Optional[List[str]]:
     """
-    Function which formats the URLs in a list.
 
-    Example:    '/some/pages' -> 'http://domain.top_level/some/pages';
-                'http://domain.top_leve/page#section' -> 'http://domain.top_leve/page'
+    # check if url is an onion link
+    if not is_onion_link(link=url):
+        logger.error(f"URL '{url}' is not an onion link!")
+        return ScrapingResult.INVALID_URL
 
-    :param url_being_scraped: The current URL that is being scraped.
-    :param list_of_urls: List of URLs to format.
-    :return: List of formatted URLs.
+    # the scheduler doesn't send blacklisted pages, but its list might be older than the one of the scraper
+    if blacklist.is_url_blacklisted(url=url):
+        logger.warning(f"URL '{url}' is blacklisted! Skipping...")
+        return ScrapingResult.BLACKLISTED
 
-    """
+    # the page was already downloaded for an earlier delivery of the message, but its result wasn't sent
+    if (cached := response_cache.get(url=url)) is not None:
+        logger.info(f"URL '{url}' served from the response cache.")
+        return cached
 
-    if (current_url := get_tld_with_protocol(url=url_being_scraped)) is None:
-        # again, this shouldn't happen, ever!
-        return None
+    host = get_host(url=url)
 
-    # initialize the new list
-    formatted_urls = []
-    for url in list_of_urls:
-        # double check if url has any data
-        if len(url) == 0:
-            continue
+    # requests to hosts which are down are short-circuited until it is time to probe them again
+    if not host_circuit_breaker.allow_request(host=host):
+        logger.info(f"Host of url '{url}' is down, skipping it.")
+        return ScrapingResult.HOST_DOWN
 
-        # handle situation where ref has path-like structure
-        if "../" in url:
-            merged_url = merge_pathlike_link_to_base_url(base_url=url_being_scraped, link=url)
-            formatted_urls.append(merged_url)
-            continue
+    # check whether the host can take another request right now
+    if (lease_id := host_rate_limiter.acquire(host=host, max_wait=host_wait)) is None:
+        logger.info(f"Request budget of the host of url '{url}' is exhausted, deferring it.")
+        return ScrapingResult.DEFERRED
 
-        # check if url starts with # (meaning that it is only pointing to a section within the current page)
-        if url[0] == "#":
-            continue
+    try:
+        # get the response from the page
+        response = send_request(url=url, validators=validators)
+
+        # only a host which doesn't answer at all counts as down, an error status still comes from a live server
+        record_host_result(host=host, reachable=response is not None)
 
-        # check for javascript:void(0);
-        if "javascript:void(0);" in url:
-            continue
+        if response is None:
+            return ScrapingResult.SCRAPING_FAILED
 
-        # remove section part
-        parts = url.split("#")
-        url = parts[0]
+        response_validators = get_response_validators(headers=response.headers)
 
-        # NOTE: will keep this commented for now
-        # remove parameters
-        # parts = url_without_section.split("?")
-        # url_without_params = parts[0]
+        # download the content of the page
+        if type(content := read_response_content(url=url, response=response)) is ScrapingResult:
+            if content == ScrapingResult.NOT_MODIFIED:
+                logger.info(f"URL '{url}' not modified.")
+                return create_unchanged_message(url=url, validators=validators)
+            return content
+    finally:
+        host_rate_limiter.release(lease_id=lease_id)
 
-        # if url doesn't contain FLD
-        if not url_has_fld(url=url):
-            # add FLD to it
-            # if the url starts with a backslash, slice the string
-            if url[0] == "/":
-                url = current_url + url[1:]
-            else:
-                url = current_url + url
+    warc_archive.write_response(url=url, status=response.status_code, reason=response.reason,
+                                headers=response.headers.items(), content=content)
 
-        formatted_urls.append(url)
+    response_cache.put(url=url, content=content, validators=response_validators)
 
-    return formatted_urls
+    return content, response_validators
 
 
-def format_content_text(title: Optional[str], body: Optional[str]) -> Optional[str]:
+def read_response_content(url: str, response: requests.Response) -> Union[ScrapingResult, bytes]:
     """
-    Function which formats the title and body text of a webpage.
+    Function which downloads the body of a streamed response, if the response is worth downloading at all.
 
-    :param title: Title string.
-    :param body: Body string.
-    :return: Formatted page content in string format.
+    The status code and the headers are checked before the body is read, and the body is read only up to the
+    configured size limit. The body is decompressed chunk by chunk, so the limit applies to the decompressed content.
+
+    :param url: URL the response belongs to.
+    :param response: Streamed response object.
+    :return: Content of the response or a `ScrapingResult` object.
 
     """
 
-    if title is not None:
-        # remove line formatters from title
-        title = remove_line_formatters(string=title)
+    # closing the response releases the connection
+    with response:
+        # the page didn't change since the validators of the conditional request were received
+        if response.status_code == 304:
+            return ScrapingResult.NOT_MODIFIED
 
-        # remove multiple spaces from title
-        title = remove_multiple_spaces(string=title)
+        # if the status code isn't within the 200 range, we consider it failed
+        if response.status_code >= 300:
+            return ScrapingResult.SCRAPING_FAILED
 
-    if body is not None:
-        # remove line formatters from body text
-        body = remove_line_formatters(string=body)
+        if (result := response_limits.check_headers(url=url,
+                                                    content_type=response.headers.get("Content-Type"),
+                                                    content_length=response.headers.get("Content-Length"))) is not None:
+            return result
 
-        # remove multiple spaces from body text
-        body = remove_multiple_spaces(string=body)
+        try:
+            return response_limits.read_content(url=url,
+                                                chunks=response.iter_content(chunk_size=ResponseLimits.CHUNK_SIZE))
+        except Exception as e:
+            logger.error(f"Couldn't read response for url '{url}': {e}")
+            return ScrapingResult.SCRAPING_FAILED
 
-        # remove HTML tags from body text
-        body = remove_html_tags_from_string(string=body)
 
-    # combine the title with the body text and return result
-    formatted_text = ""
-    if title is not None:
-        formatted_text += title + ". "
+def create_batch_message(results: List[Dict], failed_urls: Dict[str, str]) -> Dict:
+    """
+    Function which creates the message sent to the processors for the URLs of a batch, in place of the messages of the
+    URLs one by one.
 
-    if body is not None:
-        formatted_text += body
+    :param results: Messages of the pages of the batch (page or "unchanged" messages).
+    :param failed_urls: Names of the `ScrapingResult` of the URLs of the batch which didn't yield a page, by URL.
+    :return: Message dictionary.
 
-    if len(formatted_text) > 0:
-        return formatted_text
+    """
 
-    return None
+    return {"message_type": MessageType.BATCH.value,
+            "results": results,
+            "failed_urls": failed_urls}
 
 
-def format_text(string: str) -> str:
+def get_conditional_headers(validators: Optional[PageValidators]) -> Optional[Dict]:
     """
-    Function which formats a given text.
+    Function which returns the headers making a request conditional on the page having changed.
 
-    :param string: Text to be formatted.
-    :return: Formatted text.
+    :param validators: Validators of the page from the previous scraping, if any.
+    :return: Header dictionary or None if there are no usable validators.
 
     """
 
-    # remove line formatters
-    string = remove_line_formatters(string=string)
+    if validators is None:
+        return None
 
-    # remove multiple spaces
-    string = remove_multiple_spaces(string=string)
+    headers = {}
+    if validators.etag is not None:
+        headers["If-None-Match"] = validators.etag
+    if validators.last_modified is not None:
+        headers["If-Modified-Since"] = validators.last_modified
 
-    return string
+    return headers if len(headers) > 0 else None
 
 
-def send_request(url: str) -> Optional[requests.Response]:
+def send_request(url: str, validators: Optional[PageValidators] = None) -> Optional[requests.Response]:
     """
     Function which sends an HTTP GET request to the specified URL.
+    Only the headers are read, the body has to be read from the returned (streamed) response object.
 
     :param url: URL to send an HTTP GET request to.
+    :param validators: Validators of the page from the previous scraping, used for sending a conditional request.
     :return: Response object.
     """
 
+    host = get_host(url=url)
+    timeout = host_latency_tracker.get_timeouts(host=host)
+
     try:
         # send a GET request to the URL
-        # we are using the TOR proxy in order to access .onion sites
-        # the headers we use are the same that the TOR browser sends when sending requests
-        result = requests.get(url, proxies=get_tor_proxy_dict(), headers=get_request_headers())
+        # the session of the host takes care of the TOR proxy and the headers
+        result = session_manager.get(url=url, headers=get_conditional_headers(validators=validators), timeout=timeout)
+    except requests.exceptions.Timeout as e:
+        # the host needed more time than it got, so the next request gets more
+        host_latency_tracker.record(host=host, latency=max(timeout))
+        logger.error(f"GET request timed out for url '{url}': {e}")
+        return None
     except Exception as e:
         logger.error(f"GET request failed for url '{url}': {e}")
         return None
 
+    # the time until the headers of the response arrived
+    host_latency_tracker.record(host=host, latency=result.elapsed.total_seconds())
+
     return result
 
 
+def record_host_result(host: str, reachable: bool):
+    """
+    Function which records whether a host could be reached, queueing the status of the host for the processors if it
+    went down or came back up.
+
+    :param host: Host the request was sent to.
+    :param reachable: True if the host answered the request, otherwise False.
+
+    """
+
+    status = host_circuit_breaker.record_success(host=host) if reachable else \
+        host_circuit_breaker.record_failure(host=host)
+
+    if status is not None:
+        host_status_messages.append(status.to_message())
+
+
+def pop_host_status_messages() -> List[Dict]:
+    """
+    Function which removes and returns the host status messages waiting to be sent to the processors.
+
+    :return: List of message dictionaries.
+
+    """
+
+    messages = []
+    while len(host_status_messages) > 0:
+        messages.append(host_status_messages.popleft())
+
+    return messages
+
+
 def change_tor_identity() -> bool:
     """
     Function which changes the TOR identity.
 
+    In SOCKS mode only the next circuit of the circuit pool is retired, the rest of them keep working. Otherwise every
+    circuit is thrown away with NEWNYM.
+
     :return: True if the identity was changed, otherwise False.
     """
 
+    if proxy_mode == ProxyMode.SOCKS:
+        circuit_pool.retire_circuit()
+        return True
+
     try:
-        with Controller.from_port(port=9051) as controller:
+        with Controller.from_port(port=tor_control_port) as controller:
             controller.authenticate()
             controller.signal(Signal.NEWNYM)
     except Exception as e:
@@ -0,0 +1,448 @@
+import asyncio
+import sys
+from typing import Dict, Callable, Union, Awaitable, Set, Optional, List, Tuple
+
+import aio_pika
+from aio_pika.abc import AbstractIncomingMessage, AbstractRobustConnection, AbstractChannel
+
+from src.data_collection.webscraper import change_tor_identity, pop_host_status_messages, response_cache, \
+    create_batch_message
+from src.mq.message_queue import MessageQueue, create_message_codec, get_deferred_queue_name, \
+    get_deferred_queue_arguments, split_batch_results, log_batch_results
+from src.mq.work_message import PageValidators, parse_work_message, create_batch_work_message
+from src.utils.enums import ScrapingResult
+from src.utils.general import dict_has_necessary_keys, get_config_value
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class AsyncMessageQueue:
+    """
+    Asynchronous counterpart of `MessageQueue`.
+
+    Instead of handling one URL at a time, it keeps up to `max_concurrent_requests` URLs in flight at once, which is
+    what makes the slow onion round-trips bearable.
+
+    """
+
+    # keys to look for on the connection parameter dictionary
+    # the names of the queues are the same as the ones used by `MessageQueue`, keep them in sync!
+    __connection_keys = ["mq_host", "mq_port", "mq_worker_queue", "mq_processor_queue"]
+
+    # number of request after which new TOR identity should be requested
+    __NUM_OF_REQ_BEFORE_NEW_IDENT = 10
+
+    def __init__(self,
+                 param_dict: Dict,
+                 function_to_execute: Callable[..., Awaitable[Union[ScrapingResult, Dict]]],
+                 prefetch_count: int,
+                 max_concurrent_requests: int):
+        """
+        Initializer method.
+
+        :param param_dict: Dictionary containing the connection parameters for the MQ.
+        :param function_to_execute: Coroutine function to execute in response for the data received from the MQ,
+                                    called with the URL, the validators of the page and the `host_wait` keyword
+                                    argument.
+        :param prefetch_count: Number of unacknowledged messages the MQ is allowed to deliver to this worker.
+        :param max_concurrent_requests: Maximum number of URLs being scraped at the same time.
+
+        """
+
+        # check if the dictionary has all the necessary keys to get a connection
+        if not dict_has_necessary_keys(dict_to_check=param_dict, needed_keys=AsyncMessageQueue.__connection_keys):
+            logger.error("Couldn't connect to the MQ!")
+            sys.exit(1)
+
+        # init request counter
+        self.request_counter = 0
+
+        # saving param dict
+        self.param_dict = param_dict
+
+        # save the function for later
+        self.function_to_execute = function_to_execute
+
+        # codec used for encoding the results sent to the processors
+        self.message_codec = create_message_codec(param_dict=param_dict)
+
+        # URLs of busy hosts wait this many seconds in the deferred queue before they are delivered again, at most
+        # `max_defers` times, after which they are dropped until the next scheduling
+        self.defer_delay = get_config_value(param_dict=param_dict, key="defer_delay", default_value=30.0,
+                                            value_type=float)
+        self.max_defers = get_config_value(param_dict=param_dict, key="max_defers", default_value=10, value_type=int)
+
+        # the URLs of a batch are fetched one after the other, so a URL waits this many seconds for the interval after
+        # the previous request to its host to pass before it is deferred
+        self.batch_host_wait = get_config_value(param_dict=param_dict, key="batch_host_wait", default_value=5.0,
+                                                value_type=float)
+
+        # there is no point in having more requests in flight than messages delivered
+        self.prefetch_count = max(prefetch_count, 1)
+        self.max_concurrent_requests = min(max(max_concurrent_requests, 1), self.prefetch_count)
+
+        self.connection: Optional[AbstractRobustConnection] = None
+        self.channel: Optional[AbstractChannel] = None
+
+        # these have to be created from within the event loop, see `start_working`
+        self._request_semaphore: Optional[asyncio.Semaphore] = None
+        self._stop_event: Optional[asyncio.Event] = None
+
+        # keeping references to the running tasks, otherwise they might get garbage collected mid-execution
+        self._tasks: Set[asyncio.Task] = set()
+
+    def stop(self):
+        """
+        Method which signals the worker to stop consuming messages.
+        Messages already being processed are finished before the connection is closed.
+
+        """
+
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    async def start_working(self):
+        """
+        Coroutine which reads data from the MQ, executes the tasks received and sends back the results until `stop` is
+        called.
+
+        """
+
+        self._request_semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        self._stop_event = asyncio.Event()
+
+        # trying to establish connection to the MQ
+        if not await self._connect():
+            logger.error("Couldn't connect to the MQ!")
+            sys.exit(1)
+
+        logger.info(f"Start working with prefetch count {self.prefetch_count} and at most "
+                    f"{self.max_concurrent_requests} concurrent requests...")
+
+        try:
+            # declare the worker queue
+            # making it durable for persistence purposes
+            queue = await self.channel.declare_queue(name=AsyncMessageQueue.__connection_keys[2], durable=True)
+
+            # start consuming when data is available on the queue
+            # the connection is a robust one, meaning that it will re-establish itself and the consumer if the MQ goes
+            # down, so there is no need for a retry loop like in the synchronous version
+            consumer_tag = await queue.consume(self._on_message)
+        except Exception as e:
+            logger.error(f"Exception when trying to start consuming messages: {e}")
+            await self.close_connection()
+            return
+
+        await self._stop_event.wait()
+
+        logger.info("Stopping...")
+
+        # stop receiving new messages, then wait for the ones in flight to finish
+        try:
+            await queue.cancel(consumer_tag)
+        except Exception as e:
+            logger.warning(f"Exception when cancelling consumer: {e}")
+
+        if len(self._tasks) > 0:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+        await self.close_connection()
+
+    async def close_connection(self):
+        """
+        Coroutine which closes the connection to the MQ.
+        DO NOT USE ANY METHOD AFTER CALLING THIS METHOD!!!
+
+        """
+
+        if self.connection is not None and not self.connection.is_closed:
+            await self.connection.close()
+
+    async def _connect(self) -> bool:
+        """
+        Coroutine which establishes a connection to the MQ.
+
+        :return: True if a connection could be established to the MQ, otherwise False.
+
+        """
+
+        try:
+            host = self.param_dict[AsyncMessageQueue.__connection_keys[0]]
+            port = int(self.param_dict[AsyncMessageQueue.__connection_keys[1]])
+
+            self.connection = await aio_pika.connect_robust(host=host, port=port, heartbeat=600)
+        except Exception as e:
+            logger.warning(f"Error creating connection object to MQ: {e}")
+            return False
+
+        try:
+            self.channel = await self.connection.channel()
+
+            # setting basic_qos for fair dispatching
+            await self.channel.set_qos(prefetch_count=self.prefetch_count)
+
+            # declare the scheduler/processor queue
+            # Change index for connection keys list if the ordering changes!
+            # making it durable for persistence purposes
+            await self.channel.declare_queue(name=AsyncMessageQueue.__connection_keys[3], durable=True)
+
+            # declare the queue of the deferred URLs; expired messages are moved back to the worker queue
+            await self.channel.declare_queue(
+                name=get_deferred_queue_name(worker_queue=AsyncMessageQueue.__connection_keys[2]),
+                durable=True,
+                arguments=get_deferred_queue_arguments(worker_queue=AsyncMessageQueue.__connection_keys[2]))
+        except Exception as e:
+            logger.warning(f"Exception when setting up the MQ channel: {e}")
+            return False
+
+        return True
+
+    async def _on_message(self, message: AbstractIncomingMessage):
+        """
+        Callback for the messages received from the MQ. Each message is processed in its own task so the consumer is
+        free to receive the next one.
+
+        :param message: Message received from the MQ.
+
+        """
+
+        task = asyncio.create_task(self._process_message(message=message))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process_message(self, message: AbstractIncomingMessage):
+        """
+        Coroutine which scrapes the URL received in a message and acknowledges the message accordingly.
+
+        :param message: Message received from the MQ.
+
+        """
+
+        # get the urls and the validators of the pages from the previous scraping
+        pages = parse_work_message(body=message.body)
+
+        # a malformed message would never be processed, so we remove it from the queue
+        if len(pages) == 0:
+            await message.ack()
+            return
+
+        # the URLs of the same host, to be fetched over the same warm connection and circuit
+        if len(pages) > 1:
+            await self._process_batch(message=message, pages=pages)
+            return
+
+        url, validators = pages[0]
+
+        # limit the number of URLs being scraped at the same time
+        async with self._request_semaphore:
+            logger.info(f"URL to work with: '{url}'...")
+
+            try:
+                # run the job with the url
+                result = await self.function_to_execute(url, validators)
+            except Exception as e:
+                logger.error(f"Unexpected exception when scraping url '{url}': {e}")
+                result = ScrapingResult.SCRAPING_FAILED
+
+        # check the result and acknowledge the message accordingly
+        if type(result) is ScrapingResult:
+            if result == ScrapingResult.INVALID_URL:
+                # if the url is invalid, we acknowledge it to be removed from the queue
+                await message.ack()
+            if result == ScrapingResult.SCRAPING_FAILED:
+                # count request and increment the request counter
+                await self._get_new_tor_ident()
+
+                # if the scraping failed, we are still going to acknowledge it, as we don't want other
+                # scrapers to have to deal with it right now
+                await message.ack()
+            if result in (ScrapingResult.CONTENT_TOO_LARGE, ScrapingResult.UNSUPPORTED_CONTENT_TYPE):
+                logger.info(f"URL '{url}' skipped: {result.name}.")
+
+                # count request and increment the request counter
+                await self._get_new_tor_ident()
+
+                # the page is not something we can process, retrying it wouldn't change anything
+                await message.ack()
+            if result == ScrapingResult.DEFERRED:
+                # the host is busy, the URL is put back to be scraped later
+                if await self._defer_message(message=message):
+                    await message.ack()
+                else:
+                    await message.nack()
+            if result == ScrapingResult.HOST_DOWN:
+                # the host is down, the URL is dropped until the host is scheduled again
+                await message.ack()
+            if result == ScrapingResult.BLACKLISTED:
+                # the page must not be scraped at all, the URL is dropped for good
+                await message.ack()
+        else:
+            logger.info("Sending message...")
+            if await self._send_message(data=result):
+                # acknowledge that the task is done only when the response has been sent back successfully
+                await message.ack()
+                logger.info(f"URL '{url}' processed.")
+
+                # the page won't be needed again by this message
+                await asyncio.get_running_loop().run_in_executor(None, response_cache.discard, url)
+            else:
+                logger.warning(f"Couldn't send back result for url: '{url}'!")
+                await message.nack()
+
+            # count request and increment the request counter
+            await self._get_new_tor_ident()
+
+        # let the scheduler know about the hosts that went down or came back up
+        await self._send_host_status_messages()
+
+    async def _process_batch(self, message: AbstractIncomingMessage, pages: List[Tuple[str, Optional[PageValidators]]]):
+        """
+        Coroutine which scrapes the URLs of a batch one after the other, sends back their results in a single message,
+        puts the deferred URLs back as a smaller batch, and acknowledges the batch as a whole.
+
+        If the results can't be sent, the whole batch is delivered again; the pages already downloaded are served from
+        the response cache then.
+
+        :param message: Message received from the MQ.
+        :param pages: URLs of the batch and the validators of their pages.
+
+        """
+
+        logger.info(f"URLs to work with: batch of {len(pages)} URLs starting with '{pages[0][0]}'...")
+
+        results = []
+        for index, (url, validators) in enumerate(pages):
+            # every URL takes its own slot, the other messages aren't held up for the whole batch
+            async with self._request_semaphore:
+                try:
+                    result = await self.function_to_execute(url, validators,
+                                                            host_wait=self.batch_host_wait if index > 0 else 0.0)
+                except Exception as e:
+                    logger.error(f"Unexpected exception when scraping url '{url}': {e}")
+                    result = ScrapingResult.SCRAPING_FAILED
+
+            results.append((url, validators, result))
+
+        page_results, failed_urls, deferred_pages = split_batch_results(results=results)
+
+        if len(page_results) > 0:
+            logger.info("Sending message...")
+            if not await self._send_message(data=create_batch_message(results=page_results, failed_urls=failed_urls)):
+                logger.warning(f"Couldn't send back results of a batch of {len(results)} URLs!")
+                await message.nack()
+                return
+
+        # the results are already sent, so the batch is acknowledged even if the deferred URLs are lost; they are
+        # scheduled again on the next run
+        if len(deferred_pages) > 0 and not await self._defer_message(
+                message=message, body=create_batch_work_message(pages=deferred_pages).encode("UTF-8")):
+            logger.warning(f"Couldn't defer {len(deferred_pages)} URLs of a batch, dropping them.")
+
+        await message.ack()
+        log_batch_results(results=results, page_results=page_results, failed_urls=failed_urls,
+                          deferred_pages=deferred_pages)
+
+        # the pages won't be needed again by this message
+        for page_result in page_results:
+            await asyncio.get_running_loop().run_in_executor(None, response_cache.discard, page_result["url"])
+
+        # the identity isn't changed in the middle of a batch, its URLs count as a single request
+        await self._get_new_tor_ident()
+
+        # let the scheduler know about the hosts that went down or came back up
+        await self._send_host_status_messages()
+
+    async def _send_message(self, data: Dict) -> bool:
+        """
+        Coroutine which sends a message to the scheduler/processor.
+
+        :param data: Data dictionary to be sent.
+        :return: True if the message was sent, False if and error occurred.
+
+        """
+
+        # serialize and compress the dict
+        if (message := self.message_codec.encode(data=data)) is None:
+            return False
+
+        # send the message
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    content_type=message.content_type,
+                    content_encoding=message.content_encoding,
+                    headers=message.headers,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT  # persisting message
+                ),
+                routing_key=AsyncMessageQueue.__connection_keys[3]  # send the message to the scheduler/processor
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't send message: {e}")
+            return False
+
+        return True
+
+    async def _send_host_status_messages(self):
+        """
+        Coroutine which sends the status changes of the hosts to the processors.
+
+        """
+
+        for message in pop_host_status_messages():
+            if not await self._send_message(data=message):
+                # the scheduler only skips the host for a while, so losing the message is not a big deal
+                logger.warning(f"Couldn't send status of host '{message['host']}'!")
+
+    async def _defer_message(self, message: AbstractIncomingMessage, body: Optional[bytes] = None) -> bool:
+        """
+        Coroutine which puts a message in the deferred queue, from where it gets back to the worker queue after the
+        defer delay. Messages deferred too many times are dropped.
+
+        :param message: Message to be deferred.
+        :param body: Body the message is deferred with (e.g. the deferred URLs of a batch), or None for its own body.
+        :return: True if the message was deferred or dropped, False if an error occurred.
+
+        """
+
+        headers = dict(message.headers or {})
+        headers[MessageQueue.DEFER_COUNT_HEADER] = headers.get(MessageQueue.DEFER_COUNT_HEADER, 0) + 1
+
+        if headers[MessageQueue.DEFER_COUNT_HEADER] > self.max_defers:
+            logger.warning(f"Message deferred more than {self.max_defers} times, dropping it.")
+            return True
+
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body if body is None else body,
+                    content_type=message.content_type,
+                    headers=headers,
+                    expiration=self.defer_delay,  # in seconds
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT  # persisting message
+                ),
+                routing_key=get_deferred_queue_name(worker_queue=AsyncMessageQueue.__connection_keys[2])
+            )
+        except Exception as e:
+            logger.warning(f"Couldn't defer message: {e}")
+            return False
+
+        return True
+
+    async def _get_new_tor_ident(self):
+        """
+        Coroutine which tries to change the TOR identity after a certain number of requests have been sent.
+
+        """
+
+        if self.request_counter >= self.__NUM_OF_REQ_BEFORE_NEW_IDENT:
+            logger.info("Requesting new TOR identity...")
+
+            # the controller connection is blocking, so we don't run it in the event loop
+            if await asyncio.get_running_loop().run_in_executor(None, change_tor_identity):
+                self.request_counter = 0
+        else:
+            # increment request counter
+            self.request_counter += 1
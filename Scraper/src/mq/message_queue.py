@@ -1,20 +1,28 @@
-import json
 import sys
+import threading
 import time
 import traceback
-from typing import Dict, Optional, List, Callable, Union
+from collections import Counter
+from concurrent.futures import Future
+from typing import Dict, Optional, List, Callable, Union, Tuple
 
 from pika import BlockingConnection, ConnectionParameters, BasicProperties
 from pika.spec import PERSISTENT_DELIVERY_MODE
 
-from src.data_collection.webscraper import change_tor_identity
+from src.data_collection.webscraper import change_tor_identity, pop_host_status_messages, response_cache, \
+    create_batch_message
+from src.mq.message_codec import MessageCodec
+from src.mq.work_message import PageValidators, parse_work_message, create_batch_work_message
 from src.utils.enums import ScrapingResult
-from src.utils.general import dict_has_necessary_keys, strip_quotes
+from src.utils.general import dict_has_necessary_keys, get_config_value
 from src.utils.logger import get_logger
 
 # get logger
 logger = get_logger()
 
+# URL, validators and result of the scraping of the pages of a batch
+BatchResults = List[Tuple[str, Optional[PageValidators], Union[ScrapingResult, Dict]]]
+
 
 class MessageQueue:
     # keys to look for on the connection parameter dictionary
@@ -23,12 +31,23 @@ class MessageQueue:
     # number of request after which new TOR identity should be requested
     __NUM_OF_REQ_BEFORE_NEW_IDENT = 10
 
-    def __init__(self, param_dict: Dict, function_to_execute: Callable[[str], Union[ScrapingResult, Dict]]):
+    # header counting how many times a message has been deferred
+    DEFER_COUNT_HEADER = "x-defer-count"
+
+    def __init__(self,
+                 param_dict: Dict,
+                 function_to_execute: Callable[..., Union[ScrapingResult, Dict, Future]],
+                 prefetch_count: int = 1):
         """
         Initializer method.
 
         :param param_dict: Dictionary containing the connection parameters for the MQ.
-        :param function_to_execute: Function to execute in response for the data received from the MQ.
+        :param function_to_execute: Function to execute in response for the data received from the MQ, called with the
+                                    URL, the validators of the page and the `host_wait` keyword argument. If it returns
+                                    a Future, the result is sent back once the Future is done, and the next message can
+                                    be processed in the meantime.
+        :param prefetch_count: Number of unacknowledged messages the MQ delivers at once; with a function returning
+                               Futures, this is the number of pages being processed at the same time.
 
         """
 
@@ -41,6 +60,22 @@ class MessageQueue:
         # save the function for later
         self.function_to_execute = function_to_execute
 
+        self.prefetch_count = max(prefetch_count, 1)
+
+        # codec used for encoding the results sent to the processors
+        self.message_codec = create_message_codec(param_dict=param_dict)
+
+        # URLs of busy hosts wait this many seconds in the deferred queue before they are delivered again, at most
+        # `max_defers` times, after which they are dropped until the next scheduling
+        self.defer_delay = get_config_value(param_dict=param_dict, key="defer_delay", default_value=30.0,
+                                            value_type=float)
+        self.max_defers = get_config_value(param_dict=param_dict, key="max_defers", default_value=10, value_type=int)
+
+        # the URLs of a batch are fetched one after the other, so a URL waits this many seconds for the interval after
+        # the previous request to its host to pass before it is deferred
+        self.batch_host_wait = get_config_value(param_dict=param_dict, key="batch_host_wait", default_value=5.0,
+                                                value_type=float)
+
         # trying to establish connection to the MQ
         if not self._connect(param_dict=self.param_dict):
             logger.error(f"Couldn't connect to the MQ!")
@@ -84,7 +119,7 @@ class MessageQueue:
 
             # setting basic_qos for fair dispatching
             try:
-                self.channel.basic_qos(prefetch_count=1)
+                self.channel.basic_qos(prefetch_count=self.prefetch_count)
             except Exception as e:
                 logger.warning(f"Exception when defining basic_qos: {e}")
                 # if this is the first time reaching this point, exit
@@ -146,6 +181,12 @@ class MessageQueue:
             # Change index for connection keys list if the ordering changes!
             # making it durable for persistence purposes
             self.channel.queue_declare(queue=MessageQueue.__connection_keys[3], durable=True)
+
+            # declare the queue of the deferred URLs; expired messages are moved back to the worker queue
+            self.channel.queue_declare(queue=get_deferred_queue_name(worker_queue=MessageQueue.__connection_keys[2]),
+                                       durable=True,
+                                       arguments=get_deferred_queue_arguments(
+                                           worker_queue=MessageQueue.__connection_keys[2]))
         except Exception:
             return False
 
@@ -159,43 +200,228 @@ class MessageQueue:
 
         def callback(ch, method, properties, body):  # Taken from documentation, not defining param types.
 
-            # get the url
-            url = body.decode()
+            # get the urls and the validators of the pages from the previous scraping
+            pages = parse_work_message(body=body)
+
+            # a malformed message would never be processed, so we remove it from the queue
+            if len(pages) == 0:
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                return
+
+            # the URLs of the same host, to be fetched over the same warm connection and circuit
+            if len(pages) > 1:
+                self._process_batch(ch=ch, method=method, properties=properties, body=body, pages=pages)
+                return
 
-            # strip the quotes from the url
-            url = strip_quotes(string=url)
+            url, validators = pages[0]
 
             logger.info(f"URL to work with: '{url}'...")
 
             # run the job with the url
-            result = self.function_to_execute(url)
+            result = self.function_to_execute(url, validators)
 
-            # check the result and acknowledge the message accordingly
-            if type(result) is ScrapingResult:
-                if result == ScrapingResult.INVALID_URL:
-                    # if the url is invalid, we acknowledge it to be removed from the queue
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-                if result == ScrapingResult.SCRAPING_FAILED:
-                    # count request and increment the request counter
-                    self._get_new_tor_ident()
+            # the page is being processed in another process, its result is handled once it is ready, so the next
+            # message can be received in the meantime
+            if isinstance(result, Future):
+                self._handle_result_when_done(ch=ch, method=method, properties=properties, body=body, url=url,
+                                              future=result)
+                return
 
-                    # if the scraping failed, we are still going to acknowledge it, as we don't want other
-                    # scrapers to have to deal with it right now
-                    ch.basic_ack(delivery_tag=method.delivery_tag)
-            else:
-                logger.info("Sending message...")
-                if self._send_message(data=result):
-                    # acknowledge that the task is done only when the response has been sent back successfully
+            self._handle_result(ch=ch, method=method, properties=properties, body=body, url=url, result=result)
+
+        return callback
+
+    def _process_batch(self, ch, method, properties, body: bytes, pages: List[Tuple[str, Optional[PageValidators]]]):
+        """
+        Function which scrapes the URLs of a batch one after the other, and handles their results together once all of
+        them are ready.
+
+        :param ch: Channel the message was received on.
+        :param method: Delivery method of the message.
+        :param properties: Properties of the message.
+        :param body: Body of the message.
+        :param pages: URLs of the batch and the validators of their pages.
+
+        """
+
+        description = f"batch of {len(pages)} URLs starting with '{pages[0][0]}'"
+        logger.info(f"URLs to work with: {description}...")
+
+        results = []
+        for index, (url, validators) in enumerate(pages):
+            # the extraction of a page is offloaded, so it runs while the next page of the batch is being fetched
+            results.append(self.function_to_execute(url, validators,
+                                                    host_wait=self.batch_host_wait if index > 0 else 0.0))
+
+        future = gather_batch_results(pages=pages, results=results)
+
+        if future.done():
+            self._handle_result(ch=ch, method=method, properties=properties, body=body, url=description,
+                                result=future.result())
+        else:
+            self._handle_result_when_done(ch=ch, method=method, properties=properties, body=body, url=description,
+                                          future=future)
+
+    def _handle_result_when_done(self, ch, method, properties, body: bytes, url: str, future: Future):
+        """
+        Function which handles the result of a message once the processing of the page is done.
+
+        The connection can only be used from its own thread, so the result is handed over to it; it is handled between
+        two deliveries (or heartbeats) of the connection.
+
+        :param ch: Channel the message was received on.
+        :param method: Delivery method of the message.
+        :param properties: Properties of the message.
+        :param body: Body of the message.
+        :param url: URL of the message.
+        :param future: Future of the result of the processing.
+
+        """
+
+        connection = self.connection
+
+        def handle_result():
+            try:
+                result = future.result()
+            except Exception as e:
+                # e.g. the process of the extraction crashed
+                logger.error(f"Processing failed for url '{url}': {e}")
+                result = ScrapingResult.SCRAPING_FAILED
+
+            # the broker delivers the unacknowledged messages of a closed channel again
+            if not ch.is_open:
+                logger.warning(f"Channel closed before url '{url}' was processed, it will be delivered again.")
+                return
+
+            self._handle_result(ch=ch, method=method, properties=properties, body=body, url=url, result=result)
+
+        def on_done(_):
+            try:
+                connection.add_callback_threadsafe(handle_result)
+            except Exception as e:
+                logger.warning(f"Couldn't hand over the result of url '{url}': {e}")
+
+        future.add_done_callback(on_done)
+
+    def _handle_result(self, ch, method, properties, body: bytes, url: str,
+                       result: Union[ScrapingResult, Dict, BatchResults]):
+        """
+        Function which sends back the result of a message and acknowledges the message accordingly.
+
+        :param ch: Channel the message was received on.
+        :param method: Delivery method of the message.
+        :param properties: Properties of the message.
+        :param body: Body of the message.
+        :param url: URL of the message.
+        :param result: Result of the scraping, or the results of the URLs of a batch.
+
+        """
+
+        # check the result and acknowledge the message accordingly
+        if type(result) is list:
+            self._handle_batch_results(ch=ch, method=method, properties=properties, results=result)
+        elif type(result) is ScrapingResult:
+            if result == ScrapingResult.INVALID_URL:
+                # if the url is invalid, we acknowledge it to be removed from the queue
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+            if result == ScrapingResult.SCRAPING_FAILED:
+                # count request and increment the request counter
+                self._get_new_tor_ident()
+
+                # if the scraping failed, we are still going to acknowledge it, as we don't want other
+                # scrapers to have to deal with it right now
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+            if result in (ScrapingResult.CONTENT_TOO_LARGE, ScrapingResult.UNSUPPORTED_CONTENT_TYPE):
+                logger.info(f"URL '{url}' skipped: {result.name}.")
+
+                # count request and increment the request counter
+                self._get_new_tor_ident()
+
+                # the page is not something we can process, retrying it wouldn't change anything
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+            if result == ScrapingResult.DEFERRED:
+                # the host is busy, the URL is put back to be scraped later
+                if self._defer_message(body=body, properties=properties):
                     ch.basic_ack(delivery_tag=method.delivery_tag)
-                    logger.info(f"URL '{url}' processed.")
                 else:
-                    logger.warning(f"Couldn't send back result for url: '{url}'!")
                     ch.basic_nack(delivery_tag=method.delivery_tag)
+            if result == ScrapingResult.HOST_DOWN:
+                # the host is down, the URL is dropped until the host is scheduled again
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+            if result == ScrapingResult.BLACKLISTED:
+                # the page must not be scraped at all, the URL is dropped for good
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+        else:
+            logger.info("Sending message...")
+            if self._send_message(data=result):
+                # acknowledge that the task is done only when the response has been sent back successfully
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                logger.info(f"URL '{url}' processed.")
+
+                # the page won't be needed again by this message
+                response_cache.discard(url=url)
+            else:
+                logger.warning(f"Couldn't send back result for url: '{url}'!")
+                ch.basic_nack(delivery_tag=method.delivery_tag)
 
-                # count request and increment the request counter
-                self._get_new_tor_ident()
+            # count request and increment the request counter
+            self._get_new_tor_ident()
 
-        return callback
+        # let the scheduler know about the hosts that went down or came back up
+        self._send_host_status_messages()
+
+    def _handle_batch_results(self, ch, method, properties, results: BatchResults):
+        """
+        Function which sends back the results of the URLs of a batch in a single message, puts the deferred URLs back
+        as a smaller batch, and acknowledges the batch as a whole.
+
+        If the results can't be sent, the whole batch is delivered again; the pages already downloaded are served from
+        the response cache then.
+
+        :param ch: Channel the message was received on.
+        :param method: Delivery method of the message.
+        :param properties: Properties of the message.
+        :param results: URLs, validators and results of the scraping of the pages of the batch.
+
+        """
+
+        page_results, failed_urls, deferred_pages = split_batch_results(results=results)
+
+        if len(page_results) > 0:
+            logger.info("Sending message...")
+            if not self._send_message(data=create_batch_message(results=page_results, failed_urls=failed_urls)):
+                logger.warning(f"Couldn't send back results of a batch of {len(results)} URLs!")
+                ch.basic_nack(delivery_tag=method.delivery_tag)
+                return
+
+        # the results are already sent, so the batch is acknowledged even if the deferred URLs are lost; they are
+        # scheduled again on the next run
+        if len(deferred_pages) > 0 and not self._defer_message(
+                body=create_batch_work_message(pages=deferred_pages).encode("UTF-8"), properties=properties):
+            logger.warning(f"Couldn't defer {len(deferred_pages)} URLs of a batch, dropping them.")
+
+        ch.basic_ack(delivery_tag=method.delivery_tag)
+        log_batch_results(results=results, page_results=page_results, failed_urls=failed_urls,
+                          deferred_pages=deferred_pages)
+
+        # the pages won't be needed again by this message
+        for page_result in page_results:
+            response_cache.discard(url=page_result["url"])
+
+        # the identity isn't changed in the middle of a batch, its URLs count as a single request
+        self._get_new_tor_ident()
+
+    def send_result(self, data: Dict) -> bool:
+        """
+        Method which sends a result to the processors outside of the scraping of the worker queue (e.g. the results of a
+        re-extraction).
+
+        :param data: Data dictionary to be sent.
+        :return: True if the message was sent, False if and error occurred.
+
+        """
+
+        return self._send_message(data=data)
 
     def _send_message(self, data: Dict) -> bool:
         """
@@ -206,11 +432,8 @@ class MessageQueue:
 
         """
 
-        # convert dict to bytes
-        try:
-            message = bytes(json.dumps(data, ensure_ascii=False).encode('UTF-8'))
-        except Exception as e:
-            logger.warning(f"Couldn't convert data dict to bytes: {e}")
+        # serialize and compress the dict
+        if (message := self.message_codec.encode(data=data)) is None:
             return False
 
         # send the message
@@ -225,8 +448,11 @@ class MessageQueue:
                 self.channel.basic_publish(
                     exchange='',
                     routing_key=MessageQueue.__connection_keys[3],  # send the message to the scheduler/processor
-                    body=message,
+                    body=message.body,
                     properties=BasicProperties(
+                        content_type=message.content_type,
+                        content_encoding=message.content_encoding,
+                        headers=message.headers,
                         delivery_mode=PERSISTENT_DELIVERY_MODE  # persisting message
                     ))
                 break
@@ -237,6 +463,52 @@ class MessageQueue:
 
         return True
 
+    def _send_host_status_messages(self):
+        """
+        Function which sends the status changes of the hosts to the processors.
+
+        """
+
+        for message in pop_host_status_messages():
+            if not self._send_message(data=message):
+                # the scheduler only skips the host for a while, so losing the message is not a big deal
+                logger.warning(f"Couldn't send status of host '{message['host']}'!")
+
+    def _defer_message(self, body: bytes, properties: BasicProperties) -> bool:
+        """
+        Function which puts a message in the deferred queue, from where it gets back to the worker queue after the
+        defer delay. Messages deferred too many times are dropped.
+
+        :param body: Body of the message.
+        :param properties: Properties of the message.
+        :return: True if the message was deferred or dropped, False if an error occurred.
+
+        """
+
+        headers = dict(properties.headers or {})
+        headers[MessageQueue.DEFER_COUNT_HEADER] = headers.get(MessageQueue.DEFER_COUNT_HEADER, 0) + 1
+
+        if headers[MessageQueue.DEFER_COUNT_HEADER] > self.max_defers:
+            logger.warning(f"Message deferred more than {self.max_defers} times, dropping it.")
+            return True
+
+        try:
+            self.channel.basic_publish(
+                exchange='',
+                routing_key=get_deferred_queue_name(worker_queue=MessageQueue.__connection_keys[2]),
+                body=body,
+                properties=BasicProperties(
+                    content_type=properties.content_type,
+                    headers=headers,
+                    expiration=str(int(self.defer_delay * 1000)),  # in milliseconds
+                    delivery_mode=PERSISTENT_DELIVERY_MODE  # persisting message
+                ))
+        except Exception as e:
+            logger.warning(f"Couldn't defer message: {e}")
+            return False
+
+        return True
+
     def _get_new_tor_ident(self):
         """
         Method which tries to change the TOR identity after a certain number of requests have been sent.
@@ -292,3 +564,141 @@ class MessageQueue:
 
         return MessageQueue._get_connection(host=param_dict[needed_keys[0]],
                                             port=param_dict[needed_keys[1]])
+
+
+def create_message_codec(param_dict: Dict) -> MessageCodec:
+    """
+    Function which creates the codec for the messages sent to the processors, based on the connection parameters of
+    the MQ.
+
+    :param param_dict: Dictionary containing the connection parameters for the MQ.
+    :return: MessageCodec object.
+
+    """
+
+    return MessageCodec.from_names(
+        serialization=get_config_value(param_dict=param_dict, key="message_serialization", default_value="msgpack"),
+        compression=get_config_value(param_dict=param_dict, key="message_compression", default_value="zstd"),
+        compression_level=get_config_value(param_dict=param_dict, key="message_compression_level", default_value=3,
+                                           value_type=int))
+
+
+def gather_batch_results(pages: List[Tuple[str, Optional[PageValidators]]],
+                         results: List[Union[ScrapingResult, Dict, Future]]) -> Future:
+    """
+    Function which combines the results of the URLs of a batch, some of which might still be processed in other
+    processes, into a single Future.
+
+    :param pages: URLs of the batch and the validators of their pages.
+    :param results: Results of the URLs, in the same order; the results being processed are Futures.
+    :return: Future of the URLs, validators and results of the pages of the batch; the pages whose processing failed
+             get `ScrapingResult.SCRAPING_FAILED`.
+
+    """
+
+    gathered = Future()
+    pending = [result for result in results if isinstance(result, Future)]
+    remaining = [len(pending)]
+    lock = threading.Lock()
+
+    def get_result(url: str, result: Union[ScrapingResult, Dict, Future]) -> Union[ScrapingResult, Dict]:
+        if not isinstance(result, Future):
+            return result
+
+        try:
+            return result.result()
+        except Exception as e:
+            # e.g. the process of the extraction crashed
+            logger.error(f"Processing failed for url '{url}': {e}")
+            return ScrapingResult.SCRAPING_FAILED
+
+    def complete():
+        gathered.set_result([(url, validators, get_result(url=url, result=result))
+                             for (url, validators), result in zip(pages, results)])
+
+    def on_done(_):
+        # the last Future to finish completes the batch
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] > 0:
+                return
+
+        complete()
+
+    if len(pending) == 0:
+        complete()
+
+    for future in pending:
+        future.add_done_callback(on_done)
+
+    return gathered
+
+
+def split_batch_results(results: BatchResults) \
+        -> Tuple[List[Dict], Dict[str, str], List[Tuple[str, Optional[PageValidators]]]]:
+    """
+    Function which sorts the results of the URLs of a batch: the messages sent to the processors, the URLs which didn't
+    yield a page, and the URLs to be deferred because their host was busy.
+
+    :param results: URLs, validators and results of the scraping of the pages of the batch.
+    :return: Tuple of the messages of the pages, the names of the results of the failed URLs by URL, and the deferred
+             URLs with their validators.
+
+    """
+
+    page_results, failed_urls, deferred_pages = [], {}, []
+
+    for url, validators, result in results:
+        if type(result) is not ScrapingResult:
+            page_results.append(result)
+        elif result == ScrapingResult.DEFERRED:
+            deferred_pages.append((url, validators))
+        else:
+            failed_urls[url] = result.name
+
+    return page_results, failed_urls, deferred_pages
+
+
+def log_batch_results(results: BatchResults, page_results: List[Dict], failed_urls: Dict[str, str],
+                      deferred_pages: List[Tuple[str, Optional[PageValidators]]]):
+    """
+    Function which logs how the URLs of a batch fared.
+
+    :param results: URLs, validators and results of the scraping of the pages of the batch.
+    :param page_results: Messages of the pages sent to the processors.
+    :param failed_urls: Names of the results of the failed URLs by URL.
+    :param deferred_pages: Deferred URLs with their validators.
+
+    """
+
+    reasons = ", ".join(f"{name}: {count}" for name, count in Counter(failed_urls.values()).most_common())
+    logger.info(f"Batch of {len(results)} URLs processed: {len(page_results)} pages sent, {len(failed_urls)} failed"
+                f"{f' ({reasons})' if len(reasons) > 0 else ''}, {len(deferred_pages)} deferred.")
+
+
+def get_deferred_queue_name(worker_queue: str) -> str:
+    """
+    Function which returns the name of the queue the deferred URLs wait in.
+
+    :param worker_queue: Name of the worker queue.
+    :return: Name of the deferred queue.
+
+    """
+
+    return f"{worker_queue}_deferred"
+
+
+def get_deferred_queue_arguments(worker_queue: str) -> Dict:
+    """
+    Function which returns the arguments of the deferred queue: the messages expiring in it are dead-lettered back to
+    the worker queue.
+
+    :param worker_queue: Name of the worker queue.
+    :return: Dictionary of the queue arguments.
+
+    """
+
+    return {
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": worker_queue
+    }
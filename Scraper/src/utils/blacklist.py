@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from functools import lru_cache
+
+import tld
+
+from src.utils.general import read_config_file, get_config_file_location, running_in_docker
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+# location of the manifest if it isn't set in the config file; in Docker, the `Blacklist` directory of the repository is
+# mounted there, natively the applications are run from their own directory
+DOCKER_MANIFEST_LOCATION = "/app/blacklist/manifest.json"
+LOCAL_MANIFEST_LOCATION = "../Blacklist/manifest.json"
+
+# scheme and network location of a URL; the first level domain only depends on this part, so it is computed only once
+# for all the URLs of a site
+URL_ORIGIN_REGEX = re.compile(r"[^:/?#]+://[^/?#]*")
+
+
+class Blacklist:
+    """
+    Class which is responsible for holding the blacklisted URLs and for checking if URLs are present within the
+    blacklist.
+
+    The blacklist is loaded through its manifest (see `Blacklist/create_manifest.py`), which gives the version of the
+    list and the checksum it is verified with, so the scheduler, the scrapers and the processors all filter with the
+    same list. The module is the same in the Scheduler and the Scraper.
+
+    """
+
+    def __init__(self, manifest_path: str):
+        """
+        Init method.
+
+        IMPORTANT: if this step fails, the application should and is being shut down! The application should not operate
+        without a populated blacklist for ethical reason!!!
+
+        :param manifest_path: Path of the manifest of the blacklist; the blacklist file is in the same directory.
+
+        """
+        try:
+            with open(manifest_path, "r", encoding="UTF-8") as file:
+                manifest = json.load(file)
+
+            with open(os.path.join(os.path.dirname(manifest_path), manifest["file"]), "rb") as file:
+                file_contents = file.read()
+        except Exception as e:
+            logger.error(f"Couldn't read blacklist file: {e}")
+            # we are exiting with code 0 because of the docker restart policy which should be set for "on-failure"
+            # if we are exiting with code 0, that won't register as failure and docker will not restart the container
+            # this is needed because without a blacklist the application should not operate!
+            sys.exit(0)
+
+        # a damaged or half-updated list could let blacklisted pages through
+        if hashlib.sha256(file_contents).hexdigest() != manifest.get("sha256"):
+            logger.error(f"The checksum of the blacklist file doesn't match its manifest '{manifest_path}'!")
+            sys.exit(0)
+
+        if manifest.get("hash_algorithm") != "md5":
+            logger.error(f"Unsupported hash algorithm of the blacklist: {manifest.get('hash_algorithm')}!")
+            sys.exit(0)
+
+        elements = file_contents.decode("ascii").split()
+        if len(elements) == 0:
+            logger.error("The blacklist file contents is empty!")
+            sys.exit(0)
+
+        self.blacklist = {element for element in elements}
+        self.version = str(manifest.get("version"))
+
+        logger.info(f"Blacklist version '{self.version}' loaded. {len(self.blacklist)} elements are within the "
+                    f"blacklist.")
+
+    def is_url_blacklisted(self, url: str) -> bool:
+        """
+        Function which checks whether a URL is present within the blacklist or not.
+
+        :param url: URL to be checked.
+        :return: True if the URL is present in the blacklist, otherwise False.
+
+        """
+
+        # hashing the url
+        if hashlib.md5(url.encode("UTF-8")).hexdigest() in self.blacklist:
+            return True
+
+        # hash the stripped url
+        origin = url_origin.group() if (url_origin := URL_ORIGIN_REGEX.match(url)) is not None else url
+
+        return get_stripped_url_hash(origin=origin) in self.blacklist
+
+
+@lru_cache(maxsize=4096)
+def get_stripped_url_hash(origin: str) -> str:
+    """
+    Function which hashes the first level domain of a URL (or an empty string if it has none).
+
+    :param origin: Scheme and network location of the URL, or the whole URL if it doesn't have them.
+    :return: Hex digest of the MD5 hash.
+
+    """
+
+    # we are pretty much extracting the fld
+    if (fld := tld.get_fld(origin, fail_silently=True)) is None:
+        # we hash an empty string, less hassle
+        fld = ""
+
+    return hashlib.md5(fld.encode("UTF-8")).hexdigest()
+
+
+def get_blacklist_manifest_location() -> str:
+    """
+    Function which returns the location of the manifest of the blacklist, from the `BLACKLIST` section of the config
+    file, or the default location of the environment the application is running in.
+
+    :return: Path of the manifest.
+
+    """
+
+    blacklist_params = read_config_file(config_file=get_config_file_location(), section="BLACKLIST")
+    if blacklist_params is not None and len(manifest_path := blacklist_params.get("blacklist_manifest", "")) > 0:
+        return manifest_path
+
+    return DOCKER_MANIFEST_LOCATION if running_in_docker() else LOCAL_MANIFEST_LOCATION
@@ -9,3 +9,124 @@ class ScrapingResult(int, Enum):
 
     INVALID_URL = 1
     SCRAPING_FAILED = 2
+    CONTENT_TOO_LARGE = 3
+    UNSUPPORTED_CONTENT_TYPE = 4
+    DEFERRED = 5
+    NOT_MODIFIED = 6
+    HOST_DOWN = 7
+    HOST_UNREACHABLE = 8
+    BLACKLISTED = 9
+
+
+class ParserBackend(str, Enum):
+    """
+    Class describing the available backends for parsing the HTML content of pages.
+
+    """
+
+    BEAUTIFULSOUP = "bs4"
+    LXML = "lxml"
+    STREAMING = "streaming"
+
+
+class TextExtractor(str, Enum):
+    """
+    Class describing the available ways of extracting the visible text of pages.
+
+    """
+
+    HTML2TEXT = "html2text"
+    FAST = "fast"
+
+
+class LinkType(int, Enum):
+    """
+    Class describing the possible types of the links extracted from a page.
+
+    """
+
+    ONION = 0
+    NON_ONION = 1
+    RESOURCE = 2
+    FRAGMENT = 3
+    JAVASCRIPT = 4
+    UNSUPPORTED_SCHEME = 5
+    INVALID = 6
+
+
+class MessageSerialization(str, Enum):
+    """
+    Class describing the formats the messages between the scrapers and the processors can be serialized with. The
+    values are the content types of the messages.
+
+    """
+
+    JSON = "application/json"
+    MSGPACK = "application/msgpack"
+
+
+class MessageCompression(str, Enum):
+    """
+    Class describing the algorithms the messages between the scrapers and the processors can be compressed with. The
+    values are the content encodings of the messages.
+
+    """
+
+    IDENTITY = "identity"
+    GZIP = "gzip"
+    ZSTD = "zstd"
+
+
+class ProxyMode(str, Enum):
+    """
+    Class describing the ways the requests can reach Tor.
+
+    """
+
+    PRIVOXY = "privoxy"
+    SOCKS = "socks"
+
+
+class MessageType(str, Enum):
+    """
+    Class describing the types of the messages sent from the scrapers to the processors.
+
+    """
+
+    PAGE = "page"
+    UNCHANGED = "unchanged"
+    HOST_STATUS = "host_status"
+    BATCH = "batch"
+
+
+class HostState(int, Enum):
+    """
+    Class describing the possible states of the circuit breaker of a host.
+
+    """
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class FetchOutcome(int, Enum):
+    """
+    Class describing what the concurrency controller learns from a request it let through.
+
+    """
+
+    SKIPPED = 0
+    SUCCESS = 1
+    CONGESTION = 2
+
+
+class BlockClass(int, Enum):
+    """
+    Class describing the possible classes of the blocks of the text of a page when removing the boilerplate.
+
+    """
+
+    CONTENT = 0
+    BOILERPLATE = 1
+    SHORT = 2
@@ -1,6 +1,6 @@
 import re
 from sys import stderr
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Any, Callable
 from configparser import ConfigParser
 
 from environs import Env
@@ -107,3 +107,38 @@ def remove_duplicates(list_of_strings: List[str]) -> List[str]:
     """
 
     return list(set(list_of_strings))
+
+
+def str_to_bool(string: str) -> bool:
+    """
+    Function which converts a string read from a configuration file to a boolean value.
+
+    :param string: String to be converted.
+    :return: True if the string represents a truthy value, otherwise False.
+
+    """
+
+    return string.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def get_config_value(param_dict: Optional[Dict], key: str, default_value: Any,
+                     value_type: Callable[[str], Any] = str) -> Any:
+    """
+    Function which returns a value from a dictionary of configuration parameters converted to the specified type.
+
+    :param param_dict: Dictionary containing the configuration parameters read from the config file.
+    :param key: Key of the configuration parameter.
+    :param default_value: The default value if the parameter is not present or cannot be converted.
+    :param value_type: Function used for converting the string value of the parameter.
+    :return: Value of the configuration parameter.
+
+    """
+
+    if param_dict is None or key not in param_dict or len(param_dict[key]) == 0:
+        return default_value
+
+    try:
+        return value_type(param_dict[key])
+    except Exception as e:
+        logger.warning(f"Couldn't convert configuration parameter '{key}': {e}. Using default value: {default_value}")
+        return default_value
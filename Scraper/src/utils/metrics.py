@@ -0,0 +1,146 @@
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, Callable, Optional
+
+from src.utils.general import read_config_file, get_config_file_location, get_config_value
+from src.utils.logger import get_logger
+
+# get logger
+logger = get_logger()
+
+
+class MetricsExporter:
+    """
+    Class which collects the metrics of the scraper from the components registered with it, and periodically writes
+    them as a JSON snapshot to a file, so they can be inspected (or picked up by a monitoring agent) while the scraper
+    is running.
+
+    """
+
+    def __init__(self, file_path: Optional[str], interval: float):
+        """
+        Initializer method.
+
+        :param file_path: Path of the snapshot file; `{hostname}` is replaced by the host name, so the replicas sharing
+                          a volume don't overwrite each other's snapshot. None or an empty string disables the export.
+        :param interval: Number of seconds between two snapshots.
+
+        """
+
+        self.file_path = file_path.format(hostname=socket.gethostname()) \
+            if file_path is not None and len(file_path) > 0 else None
+        self.interval = max(interval, 1.0)
+
+        self._providers: Dict[str, Callable[[], Dict]] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, provider: Callable[[], Dict]):
+        """
+        Method which registers a component whose metrics are part of the snapshot.
+
+        :param name: Name of the section of the snapshot the metrics are put in.
+        :param provider: Function returning the metrics of the component as a JSON serializable dictionary.
+
+        """
+
+        with self._lock:
+            self._providers[name] = provider
+
+    def get_snapshot(self) -> Dict:
+        """
+        Method which collects the current metrics of every registered component.
+
+        :return: Dictionary containing the metrics by component.
+
+        """
+
+        with self._lock:
+            providers = list(self._providers.items())
+
+        snapshot = {"timestamp": time.time(), "pid": os.getpid()}
+        for name, provider in providers:
+            try:
+                snapshot[name] = provider()
+            except Exception as e:
+                logger.warning(f"Couldn't collect metrics '{name}': {e}")
+
+        return snapshot
+
+    def export(self) -> bool:
+        """
+        Method which writes the current snapshot to the snapshot file. The file is replaced atomically, so readers never
+        see a partially written snapshot.
+
+        :return: True if the snapshot was written, otherwise False.
+
+        """
+
+        if self.file_path is None:
+            return False
+
+        temporary_path = f"{self.file_path}.tmp"
+        try:
+            if len(directory := os.path.dirname(self.file_path)) > 0:
+                os.makedirs(directory, exist_ok=True)
+
+            with open(temporary_path, "w", encoding="UTF-8") as file:
+                json.dump(self.get_snapshot(), file)
+            os.replace(temporary_path, self.file_path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Couldn't export metrics to '{self.file_path}': {e}")
+            return False
+
+        return True
+
+    def start(self):
+        """
+        Method which starts exporting the snapshots periodically in a background thread.
+
+        """
+
+        if self.file_path is None or self._thread is not None:
+            return
+
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+        logger.info(f"Exporting metrics to '{self.file_path}' every {self.interval:.0f} seconds.")
+
+    def stop(self):
+        """
+        Method which stops the periodic export, writing a last snapshot.
+
+        """
+
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join(timeout=self.interval)
+        self._thread = None
+
+        self.export()
+
+    def _run(self):
+        """
+        Method which exports the snapshots until the exporter is stopped.
+
+        """
+
+        while not self._stop_event.wait(timeout=self.interval):
+            self.export()
+
+
+# the parameters are read from the scraper section; if they are missing, the defaults are used
+_scraper_params = read_config_file(config_file=get_config_file_location(), section="SCRAPER")
+
+# exporter shared by every component of the scraper
+metrics_exporter = MetricsExporter(file_path=get_config_value(param_dict=_scraper_params, key="metrics_file",
+                                                              default_value=""),
+                                   interval=get_config_value(param_dict=_scraper_params, key="metrics_export_interval",
+                                                             default_value=30.0, value_type=float))
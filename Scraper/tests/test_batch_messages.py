@@ -0,0 +1,178 @@
+"""
+Checks that the results of the URLs of a batch work message are sent back to the processors in a single batch message,
+by both the synchronous and the asynchronous message queue, and that the deferred URLs are put back as a smaller batch.
+
+Usage (from the Scraper directory):
+
+    python -m pytest tests
+
+"""
+import asyncio
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from pika import BasicProperties
+
+from src.data_collection.page_extractor import create_unchanged_message
+from src.mq.async_message_queue import AsyncMessageQueue
+from src.mq.message_queue import MessageQueue
+from src.mq.work_message import PageValidators, parse_work_message
+from src.utils.enums import ScrapingResult, MessageType
+
+# connection parameters of the queues; nothing is connected to
+PARAM_DICT = {"mq_host": "localhost", "mq_port": 5672, "mq_worker_queue": "scraper_worker",
+              "mq_processor_queue": "scraper_processor"}
+
+PAGE_URL = "http://2efame4t6vznct3iolkc764r5qgvfisx2efame4t6vznct3iolkc764d.onion/forum/"
+UNCHANGED_URL = "http://2efame4t6vznct3iolkc764r5qgvfisx2efame4t6vznct3iolkc764d.onion/forum/rules"
+FAILED_URL = "http://2efame4t6vznct3iolkc764r5qgvfisx2efame4t6vznct3iolkc764d.onion/forum/missing"
+DEFERRED_URL = "http://2efame4t6vznct3iolkc764r5qgvfisx2efame4t6vznct3iolkc764d.onion/forum/search"
+
+VALIDATORS = PageValidators(etag='"abc"', last_modified=None, content_hash=None)
+
+PAGE_MESSAGE = {"message_type": MessageType.PAGE.value, "url": PAGE_URL, "title": "Forum", "body": "Threads"}
+
+# results of the URLs of the batch, in the order they are in the work message
+BATCH_RESULTS = {PAGE_URL: PAGE_MESSAGE,
+                 UNCHANGED_URL: create_unchanged_message(url=UNCHANGED_URL, validators=VALIDATORS),
+                 FAILED_URL: ScrapingResult.SCRAPING_FAILED,
+                 DEFERRED_URL: ScrapingResult.DEFERRED}
+
+BATCH_PAGES = [(PAGE_URL, None), (UNCHANGED_URL, VALIDATORS), (FAILED_URL, None), (DEFERRED_URL, None)]
+
+
+class FakeChannel:
+    """
+    Class which records what is published and acknowledged on a pika channel.
+
+    """
+
+    def __init__(self):
+        self.is_open = True
+        self.published: List[SimpleNamespace] = []
+        self.acked: List[int] = []
+        self.nacked: List[int] = []
+
+    def basic_publish(self, exchange: str, routing_key: str, body: bytes, properties: BasicProperties):
+        self.published.append(SimpleNamespace(routing_key=routing_key, body=body, content_type=properties.content_type,
+                                              content_encoding=properties.content_encoding,
+                                              headers=properties.headers))
+
+    def basic_ack(self, delivery_tag: int):
+        self.acked.append(delivery_tag)
+
+    def basic_nack(self, delivery_tag: int):
+        self.nacked.append(delivery_tag)
+
+
+class FakeExchange:
+    """
+    Class which records the messages published on the default exchange of an aio-pika channel.
+
+    """
+
+    def __init__(self):
+        self.published: List[SimpleNamespace] = []
+
+    async def publish(self, message, routing_key: str):
+        self.published.append(SimpleNamespace(routing_key=routing_key, body=message.body,
+                                              content_type=message.content_type,
+                                              content_encoding=message.content_encoding, headers=message.headers))
+
+
+class FakeIncomingMessage:
+    """
+    Class which stands for a message delivered by aio-pika, recording whether it was acknowledged.
+
+    """
+
+    def __init__(self, body: bytes):
+        self.body = body
+        self.content_type = None
+        self.headers: Dict = {}
+        self.acked = False
+        self.nacked = False
+
+    async def ack(self):
+        self.acked = True
+
+    async def nack(self):
+        self.nacked = True
+
+
+def decode_batch_reply(message_codec, published: List[SimpleNamespace]) -> Optional[Dict]:
+    """
+    Function which decodes the batch message among the published messages, the way the processors do.
+
+    :param message_codec: Codec of the message queue which sent the messages.
+    :param published: Messages published by the message queue.
+    :return: Data dictionary of the batch message, or None if there is none.
+
+    """
+
+    for message in published:
+        data = message_codec.decode(body=message.body, content_type=message.content_type,
+                                    content_encoding=message.content_encoding, headers=message.headers)
+        if data is not None and data.get("message_type") == MessageType.BATCH.value:
+            return data
+
+    return None
+
+
+def assert_batch_reply(data: Optional[Dict]):
+    assert data is not None
+    assert data["results"] == [BATCH_RESULTS[PAGE_URL], BATCH_RESULTS[UNCHANGED_URL]]
+    assert data["failed_urls"] == {FAILED_URL: ScrapingResult.SCRAPING_FAILED.name}
+
+
+def assert_deferred_batch(published: List[SimpleNamespace]):
+    deferred = [message for message in published if message.routing_key.endswith("_deferred")]
+
+    assert len(deferred) == 1
+    assert parse_work_message(body=deferred[0].body) == [(DEFERRED_URL, None)]
+
+
+def test_batch_results_are_sent_in_one_message(monkeypatch):
+    channel = FakeChannel()
+
+    def connect(self, param_dict: Dict) -> bool:
+        self.channel = channel
+        return True
+
+    monkeypatch.setattr(MessageQueue, "_connect", connect)
+    message_queue = MessageQueue(param_dict=PARAM_DICT, function_to_execute=lambda *args, **kwargs: None)
+
+    message_queue._handle_batch_results(ch=channel, method=SimpleNamespace(delivery_tag=7),
+                                        properties=BasicProperties(content_type=None, headers={}),
+                                        results=[(url, validators, BATCH_RESULTS[url])
+                                                 for url, validators in BATCH_PAGES])
+
+    assert channel.acked == [7] and channel.nacked == []
+    assert len(channel.published) == 2
+    assert_batch_reply(data=decode_batch_reply(message_codec=message_queue.message_codec,
+                                               published=channel.published))
+    assert_deferred_batch(published=channel.published)
+
+
+def test_async_batch_results_are_sent_in_one_message():
+    async def scrape(url: str, validators: Optional[PageValidators], host_wait: float = 0.0):
+        return BATCH_RESULTS[url]
+
+    message_queue = AsyncMessageQueue(param_dict=PARAM_DICT, function_to_execute=scrape, prefetch_count=4,
+                                      max_concurrent_requests=2)
+    exchange = FakeExchange()
+    message_queue.channel = SimpleNamespace(default_exchange=exchange)
+    message = FakeIncomingMessage(body=b"")
+
+    async def process_batch():
+        # created here, as they have to belong to the event loop
+        message_queue._request_semaphore = asyncio.Semaphore(message_queue.max_concurrent_requests)
+        await message_queue._process_batch(message=message, pages=BATCH_PAGES)
+
+    asyncio.run(process_batch())
+
+    assert message.acked and not message.nacked
+    assert len(exchange.published) == 2
+    assert_batch_reply(data=decode_batch_reply(message_codec=message_queue.message_codec,
+                                               published=exchange.published))
+    assert_deferred_batch(published=exchange.published)
@@ -0,0 +1,44 @@
+"""
+Checks that the lxml and BeautifulSoup parser backends extract exactly the same data from the pages of the benchmark
+corpus (see `benchmarks/parser_parity.py` for the timing of the backends), and that the streaming backend extracts the
+same text as the BeautifulSoup one. The corpus has pages which aren't encoded in an ASCII-compatible way, or whose
+encoding is declared by an XML declaration, as all backends have to decode the pages the same way.
+
+Usage (from the Scraper directory):
+
+    python -m pytest tests
+
+"""
+import pytest
+
+from benchmarks.corpus_utils import load_corpus
+from benchmarks.parser_parity import normalize
+from src.data_collection.html_parsers import LXML_AVAILABLE, parse_page
+from src.data_collection.page_extractor import get_page_extractor
+from src.utils.enums import ParserBackend
+
+
+@pytest.mark.skipif(not LXML_AVAILABLE, reason="lxml is not installed")
+@pytest.mark.parametrize("url, content", [pytest.param(url, content, id=url) for url, content in load_corpus()])
+def test_backends_extract_the_same_data(url: str, content: bytes):
+    page_extractor = get_page_extractor()
+
+    bs4_result = page_extractor.process_page_content(url=url, content=content,
+                                                     parser_backend=ParserBackend.BEAUTIFULSOUP)
+    lxml_result = page_extractor.process_page_content(url=url, content=content, parser_backend=ParserBackend.LXML)
+
+    assert type(bs4_result) is dict and type(lxml_result) is dict
+
+    # html2text emits different runs of whitespace around elements lxml closes implicitly (e.g. table cells), thus the
+    # page content is compared with the whitespace collapsed
+    assert {key: normalize(key=key, value=value) for key, value in lxml_result.items()} == \
+           {key: normalize(key=key, value=value) for key, value in bs4_result.items()}
+
+
+@pytest.mark.parametrize("url, content", [pytest.param(url, content, id=url) for url, content in load_corpus()])
+def test_streaming_backend_extracts_the_same_text(url: str, content: bytes):
+    streaming_page = parse_page(content=content, backend=ParserBackend.STREAMING)
+    bs4_page = parse_page(content=content, backend=ParserBackend.BEAUTIFULSOUP, extract_text=True)
+
+    assert (streaming_page.title_text, streaming_page.body_text, streaming_page.links, streaming_page.meta_tags) == \
+           (bs4_page.title_text, bs4_page.body_text, bs4_page.links, bs4_page.meta_tags)
@@ -0,0 +1,30 @@
+"""
+Checks that `normalize_text` gives the same results as the chain of `remove_line_formatters`, `remove_multiple_spaces`
+and `remove_html_tags_from_string` it replaced (see `benchmarks/bench_text_normalizer.py` for the timings).
+
+Usage (from the Scraper directory):
+
+    python -m pytest tests
+
+"""
+import pytest
+
+from benchmarks.bench_text_normalizer import legacy_normalize, load_inputs
+from src.data_collection.scraper_utils import normalize_text
+
+# hand-written inputs covering the corner cases of the chain
+EDGE_CASES = ["", " ", "  ", "\n", "\r\n", " \n ", "a", " a ", "a  b", "a\n\nb", "a <b> c", "a\n<b>\nc",
+              "<a href=\"x > y\">link</a>", "<'unterminated", "2 < 3 and 4 > 1", "<p\nclass='x'>text</p>",
+              "\t tab \t", "non breaking  space"]
+
+
+@pytest.mark.parametrize("strip_html_tags", [False, True])
+@pytest.mark.parametrize("string", EDGE_CASES)
+def test_edge_cases(string: str, strip_html_tags: bool):
+    assert normalize_text(string=string, strip_html_tags=strip_html_tags) == legacy_normalize(string, strip_html_tags)
+
+
+@pytest.mark.parametrize("text, strip_html_tags", [pytest.param(text, strip_html_tags, id=name)
+                                                   for name, text, strip_html_tags in load_inputs()])
+def test_corpus(text: str, strip_html_tags: bool):
+    assert normalize_text(string=text, strip_html_tags=strip_html_tags) == legacy_normalize(text, strip_html_tags)